@@ -1,4 +1,4 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from enum import Enum
 
 from drum.util.error import Result
@@ -17,11 +17,58 @@ Argument = ImmediateArgument | RegisterArgument | LabelReferenceArgument
 START_LABEL = '_start'
 
 
+# Source location of words starting from the address (up to the next entry):
+# address, file index, line, column (1-based)
+SourceMapEntry = tuple[int, int, int, int]
+
+
 @dataclass
 class Executable:
     """Executable representation"""
     start: int
     program: Program
+    # Debug information (used for reports only, empty if unknown, not compared):
+    # labels -> addresses, source files & source map (sorted by address)
+    symbols: dict[str, int] = field(default_factory=dict, compare=False)
+    files: list[str] = field(default_factory=list, compare=False)
+    source_map: list[SourceMapEntry] = field(default_factory=list, compare=False)
+
+
+# Label reference: word address, argument index (in the word), label
+Fixup = tuple[int, int, str]
+
+# Reference to a local address: word address, argument index (in the word)
+Relocation = tuple[int, int]
+
+# Range of words that are data (literals) rather than instructions: start, end (exclusive)
+DataRange = tuple[int, int]
+
+
+@dataclass
+class ObjectFile:
+    """
+    Relocatable object representation.
+
+    Program is placed at address 0: referenced addresses of local labels are shifted
+    by the object base address (see `relocations`) at link time, labels exported
+    by other objects are patched in (see `imports`).
+    """
+    program: Program
+    # Defined labels -> local address
+    symbols: dict[str, int]
+    # Arguments that hold local addresses
+    relocations: list[Relocation]
+    # Arguments that reference labels defined in other objects
+    imports: list[Fixup]
+    # Ranges of literal words, in the order of addresses
+    data: list[DataRange]
+    instruction_count: int
+    # Source files (file names without directories)
+    files: list[str] = field(default_factory=list)
+    # Source locations of words, sorted by address (empty if unknown)
+    source_map: list[SourceMapEntry] = field(default_factory=list)
+    # Labels visible to other objects (the rest are local to the object)
+    exports: list[str] = field(default_factory=list)
 
 
 _register_iota = Iota()
@@ -48,23 +95,27 @@ class Register(Enum):
     @staticmethod
     def get_by_name(name: str) -> Result['Register']:
         """Returns register with provided name. Error if it doesn't exist."""
-        sanitized_name = name.upper()
-
-        for reg in Register:
-            if reg.value.name == sanitized_name:
-                return reg, None
+        reg = REGISTERS_BY_NAME.get(name.upper())
+        if reg is not None:
+            return reg, None
 
         return Register.R0, f"register with name {name} doesn\'t exist"
 
     @staticmethod
     def get_by_code(code: int) -> Result['Register']:
         """Returns register with provided code. Error if it doesn't exist."""
-        for reg in Register:
-            if reg.value.code == code:
-                return reg, None
+        reg = REGISTERS_BY_CODE.get(code)
+        if reg is not None:
+            return reg, None
         return Register.R0, f"register with code {code} doesn\'t exist"
 
 
+# Register lookup tables (code -> register, name -> register)
+REGISTERS_BY_CODE = {reg.value.code: reg for reg in Register}
+REGISTERS_BY_NAME = {reg.value.name: reg for reg in Register}
+REGISTER_COUNT = len(REGISTERS_BY_CODE)
+
+
 class ArgsType(Enum):
     """Type of command argument list."""
     ZERO = ''
@@ -114,24 +165,27 @@ class Op(Enum):
     @staticmethod
     def get_by_name(name: str) -> Result['Op']:
         """Returns op with provided name. Error if it doesn't exist."""
-        sanitized_name = name.upper()
-
-        for op in Op:
-            if op.value.name == sanitized_name:
-                return op, None
+        op = OPS_BY_NAME.get(name.upper())
+        if op is not None:
+            return op, None
 
         return Op.HLT, f"op with name {name} doesn\'t exist"
 
     @staticmethod
     def get_by_code(code: int) -> Result['Op']:
         """Returns op with provided code. Error if it doesn't exist."""
-        for op in Op:
-            if op.value.code == code:
-                return op, None
+        op = OPS_BY_CODE.get(code)
+        if op is not None:
+            return op, None
 
         return Op.HLT, f"op with code {code} doesn\'t exist"
 
 
+# Op lookup tables (code -> op, name -> op)
+OPS_BY_CODE = {op.value.code: op for op in Op}
+OPS_BY_NAME = {op.value.name: op for op in Op}
+
+
 CALC_RRR_OPS = (
     Op.ADD,
     Op.SUB,
@@ -168,3 +222,9 @@ BRANCH_OPS = (
 )
 
 HALT_OP = Op.HLT
+
+# Identifies the instruction set (op & register tables): compiled programs are valid for it only
+ISA_FINGERPRINT = ' '.join([
+    *(f'{op.value.name}:{op.value.code}:{op.value.args_type.name}' for op in Op),
+    *(f'{reg.value.name}:{reg.value.code}' for reg in Register),
+])
@@ -0,0 +1,197 @@
+import gc
+import sys
+from array import array
+from json import dumps, loads
+from mmap import ACCESS_READ, mmap
+from struct import Struct
+from typing import Any, Literal, Optional
+
+from drum.common.arch import Executable, Program
+from drum.util.error import Result
+
+# Binary executable magic & format version
+BINARY_MAGIC = b'DRCB'
+BINARY_VERSION = 1
+
+# Header: magic, version, value size (bytes), start, word count, symbol section size
+BINARY_HEADER = Struct('<4sHHqQQ')
+
+# Every word takes the same number of value slots (opcode + up to 3 arguments)
+WORD_SLOTS = 4
+
+# Value size (bytes) -> array typecode
+VALUE_TYPECODES: dict[int, Literal['i', 'q']] = {
+    4: 'i',
+    8: 'q',
+}
+
+# Values are stored little-endian, arrays use native byte order
+_BIG_ENDIAN = sys.byteorder == 'big'
+
+
+def _value_size(program: Program) -> Result[int]:
+    """Returns the smallest value size that fits every number of the program."""
+    values = [value for word in program for value in word]
+    low, high = min(values, default=0), max(values, default=0)
+    for size in VALUE_TYPECODES:
+        bound = 1 << (size * 8 - 1)
+        if -bound <= low and high < bound:
+            return size, None
+
+    return 0, "value doesn't fit into 64 bits"
+
+
+def _padding(offset: int, align: int) -> int:
+    return (align - offset % align) % align
+
+
+def encode_binary(exe: Executable, disassembly: Optional[list[str]] = None) -> Result[bytes]:
+    """
+    Encodes executable into binary form.
+
+    Layout: header, word lengths (a byte per word, padded to value size),
+    word values (`WORD_SLOTS` per word, unused slots are 0s), optional symbol section
+    (JSON: disassembly, labels & source map).
+    """
+    program = exe.program
+    for word in program:
+        if not 0 < len(word) <= WORD_SLOTS:
+            return b'', f'invalid word: {word}'
+
+    size, err = _value_size(program)
+    if err is not None:
+        return b'', err
+
+    symbols = b''
+    if disassembly is not None:
+        symbols = dumps(dict(
+            disassembly=disassembly,
+            symbols=exe.symbols,
+            files=exe.files,
+            source_map=exe.source_map,
+        )).encode('utf-8')
+
+    values: list[int] = []
+    for word in program:
+        values += word
+        values += [0] * (WORD_SLOTS - len(word))
+
+    words = array(VALUE_TYPECODES[size], values)
+    if _BIG_ENDIAN:
+        words.byteswap()
+
+    lengths = bytes(len(word) for word in program)
+    padding = bytes(_padding(BINARY_HEADER.size + len(lengths), size))
+
+    header = BINARY_HEADER.pack(
+        BINARY_MAGIC,
+        BINARY_VERSION,
+        size,
+        exe.start,
+        len(program),
+        len(symbols),
+    )
+    return header + lengths + padding + words.tobytes() + symbols, None
+
+
+def is_binary(file: str) -> bool:
+    """Checks whether the compiled file is binary (by its magic)."""
+    with open(file, 'rb') as f:
+        return f.read(len(BINARY_MAGIC)) == BINARY_MAGIC
+
+
+def _read_header(file: str, buffer: mmap) -> tuple[int, int, int, int]:
+    """Returns value size, start, word count & symbol section size."""
+    if len(buffer) < BINARY_HEADER.size:
+        raise ValueError(f'{file} is not a binary drum executable')
+
+    magic, version, size, start, count, symbols_size = BINARY_HEADER.unpack_from(buffer)
+    if magic != BINARY_MAGIC:
+        raise ValueError(f'{file} is not a binary drum executable')
+    if version != BINARY_VERSION:
+        raise ValueError(f'unsupported binary executable version: {version}')
+    if size not in VALUE_TYPECODES:
+        raise ValueError(f'unsupported value size: {size}')
+
+    return size, start, count, symbols_size
+
+
+def _words_offset(size: int, count: int) -> int:
+    lengths_end = BINARY_HEADER.size + count
+    return lengths_end + _padding(lengths_end, size)
+
+
+def read_binary(file: str) -> Executable:
+    """
+    Reads binary executable.
+
+    The file is memory-mapped, values are converted by a single cast of the mapping
+    (no per-value unpacking), then sliced into words.
+    Symbol section isn't read (see `load_binary_debug()`).
+    """
+    with open(file, 'rb') as f, mmap(f.fileno(), 0, access=ACCESS_READ) as buffer:
+        size, start, count, _ = _read_header(file, buffer)
+        offset = _words_offset(size, count)
+        end = offset + count * WORD_SLOTS * size
+        if len(buffer) < end:
+            raise ValueError(f'{file} is truncated')
+
+        lengths = buffer[BINARY_HEADER.size:BINARY_HEADER.size + count]
+        with memoryview(buffer) as view, view[offset:end] as words:
+            if _BIG_ENDIAN:
+                swapped = array(VALUE_TYPECODES[size])
+                swapped.frombytes(words)
+                swapped.byteswap()
+                values = swapped.tolist()
+            else:
+                with words.cast(VALUE_TYPECODES[size]) as typed:
+                    values = typed.tolist()
+
+    # words can't form reference cycles, collector passes over millions of new lists are wasted
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        program = [
+            values[i:i + length]
+            for i, length in zip(range(0, len(values), WORD_SLOTS), lengths)
+        ]
+    finally:
+        if gc_enabled:
+            gc.enable()
+
+    return Executable(start, program)
+
+
+def _read_symbol_section(file: str) -> Optional[dict[str, Any]]:
+    with open(file, 'rb') as f, mmap(f.fileno(), 0, access=ACCESS_READ) as buffer:
+        size, _, count, symbols_size = _read_header(file, buffer)
+        if symbols_size == 0:
+            return None
+
+        offset = _words_offset(size, count) + count * WORD_SLOTS * size
+        section: dict[str, Any] = loads(buffer[offset:offset + symbols_size].decode('utf-8'))
+        return section
+
+
+def read_binary_disassembly(file: str) -> Optional[list[str]]:
+    """Reads disassembly from the symbol section (None if there is no section)."""
+    section = _read_symbol_section(file)
+    if section is None:
+        return None
+
+    disassembly: Optional[list[str]] = section.get('disassembly')
+    return disassembly
+
+
+def load_binary_debug(file: str, exe: Executable) -> None:
+    """Loads labels & source map from the symbol section into `exe` (if there is the section)."""
+    section = _read_symbol_section(file)
+    if section is None:
+        return
+
+    exe.symbols = section.get('symbols', dict())
+    exe.files = section.get('files', [])
+    exe.source_map = [
+        (addr, file_index, line, column)
+        for addr, file_index, line, column in section.get('source_map', [])
+    ]
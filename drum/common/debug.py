@@ -0,0 +1,141 @@
+from bisect import bisect_right
+from typing import Optional
+
+from drum.common.arch import Executable, SourceMapEntry
+from drum.common.binary import is_binary, load_binary_debug
+
+# Source location: file index, line, column
+_Location = tuple[int, int, int]
+
+
+def line_starts(text: str) -> list[int]:
+    """Returns positions the lines of the text start at."""
+    starts = [0]
+    position = text.find('\n')
+    while position != -1:
+        starts.append(position + 1)
+        position = text.find('\n', position + 1)
+    return starts
+
+
+def line_column(starts: list[int], position: int) -> tuple[int, int]:
+    """Returns line & column (1-based) of the text position (see `line_starts()`)."""
+    line = bisect_right(starts, position)
+    return line, position - starts[line - 1] + 1
+
+
+def remap_source_map(
+    source_map: list[SourceMapEntry],
+    old_addresses: list[Optional[int]],
+) -> list[SourceMapEntry]:
+    """
+    Returns source map of the rewritten program.
+
+    `old_addresses` - original address of every word of the new program
+    (None - the word was added, it gets location of the previous one).
+    """
+    addresses = [entry[0] for entry in source_map]
+    result: list[SourceMapEntry] = []
+    location: Optional[_Location] = None
+
+    for addr, old_addr in enumerate(old_addresses):
+        if old_addr is not None:
+            i = bisect_right(addresses, old_addr)
+            location = source_map[i - 1][1:] if i > 0 else None
+        if location is not None and (not result or result[-1][1:] != location):
+            result.append((addr, *location))
+
+    return result
+
+
+class Symbolizer:
+    """
+    Resolves addresses into `file:line label+offset`.
+
+    Labels & source map are kept in sorted arrays, every lookup is a binary search,
+    so that millions of trace records could be symbolized. Debug information of a binary
+    executable is loaded from `compiled_file` on the first lookup (see `load_binary_debug()`).
+    """
+    # Program (its debug information)
+    exe: Executable
+    # Binary executable to load debug information from (None - it's loaded)
+    compiled_file: Optional[str]
+    # Label addresses (sorted) & names
+    label_addresses: list[int]
+    label_names: list[str]
+    # Source map addresses (sorted) & locations
+    map_addresses: list[int]
+    map_locations: list[_Location]
+
+    def __init__(self, exe: Executable, compiled_file: Optional[str] = None) -> None:
+        self.exe = exe
+        self.compiled_file = compiled_file
+        self.label_addresses = []
+        self.label_names = []
+        self.map_addresses = []
+        self.map_locations = []
+        if compiled_file is None:
+            self._index()
+
+    def _index(self) -> None:
+        if self.compiled_file is not None:
+            if is_binary(self.compiled_file):
+                load_binary_debug(self.compiled_file, self.exe)
+            self.compiled_file = None
+
+        # sort is stable: of labels at the same address the last defined one is found
+        labels = sorted(self.exe.symbols.items(), key=lambda item: item[1])
+        self.label_addresses = [addr for _, addr in labels]
+        self.label_names = [label for label, _ in labels]
+
+        self.map_addresses = [entry[0] for entry in self.exe.source_map]
+        self.map_locations = [entry[1:] for entry in self.exe.source_map]
+
+    def label(self, addr: int) -> Optional[tuple[str, int]]:
+        """Returns the enclosing label (the last one at or before the address) & offset."""
+        if self.compiled_file is not None:
+            self._index()
+
+        i = bisect_right(self.label_addresses, addr)
+        if i == 0:
+            return None
+        return self.label_names[i - 1], addr - self.label_addresses[i - 1]
+
+    def source(self, addr: int) -> Optional[tuple[str, int, int]]:
+        """Returns source file, line & column of the word. None if it's unknown."""
+        if self.compiled_file is not None:
+            self._index()
+
+        i = bisect_right(self.map_addresses, addr)
+        if i == 0 or addr >= len(self.exe.program):
+            return None
+
+        file_index, line, column = self.map_locations[i - 1]
+        files = self.exe.files
+        return files[file_index] if file_index < len(files) else '', line, column
+
+    def describe(self, addr: int) -> Optional[str]:
+        """Returns `file:line label+offset`. None if neither is known."""
+        parts = []
+
+        source = self.source(addr)
+        if source is not None:
+            file, line, _ = source
+            parts.append(f'{file}:{line}')
+
+        label = self.label(addr)
+        if label is not None:
+            name, offset = label
+            parts.append(f'{name}+{offset}' if offset else name)
+
+        return ' '.join(parts) if parts else None
+
+    def location(self, addr: int) -> str:
+        """Returns `file:line label+offset` (the address if neither is known)."""
+        location = self.describe(addr)
+        return location if location is not None else f'{addr}'
+
+    def annotate(self, state: str, addr: int) -> str:
+        """Appends location to the trace line (if it's known)."""
+        location = self.describe(addr)
+        return f'{state} ; {location}' if location is not None else state
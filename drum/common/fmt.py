@@ -77,3 +77,29 @@ def fmt_instruction(raw: Command) -> Result[str]:
 def fmt_const(const: list[int]) -> Result[str]:
     """Returns a formatted cosnt."""
     return f'Const value: {const[0]}', None
+
+
+def fmt_state(
+    tick: int,
+    instruction_pointer: int,
+    data_address: int,
+    memory_value: int,
+    registers: list[int],
+    instruction: Command,
+) -> Result[str]:
+    """
+    Returns a formatted machine state (as in execution trace).
+
+    If instruction can't be formatted, returns state without it and an error.
+    """
+    s = f'TICK={tick:4} '
+    s += f'IP={instruction_pointer:3} '
+    s += f'ADDR={data_address:3} '
+    s += f'MEM={memory_value:6} '
+
+    for reg in Register:
+        s += f'{reg.value.name}={registers[reg.value.code]:4} '
+
+    formatted_instruction, err = fmt_instruction(instruction)
+
+    return s + formatted_instruction, err
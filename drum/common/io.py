@@ -1,41 +1,93 @@
-
-
 from json import dumps, loads
 
-from drum.common.arch import Executable
+from drum.common.arch import Executable, ObjectFile, Program, SourceMapEntry
+from drum.common.binary import encode_binary, is_binary, load_binary_debug, read_binary
 from drum.common.fmt import fmt_const, fmt_instruction
+from drum.util.error import Error
 from drum.util.io import read_from_file, write_to_file
 
 
 def read_src(file: str) -> str:
-    """Reads source (.dr) file."""
-    return read_from_file(file)
+    """Reads source (.dr) file (as is, so that source positions are kept)."""
+    with open(file, 'r', encoding='utf-8') as f:
+        return f.read()
 
 
-def write_compiled(file: str, exe: Executable) -> None:
-    """Writes compiled (.drc) file."""
-    start = exe.start
-    program = exe.program
-
+def disassemble(program: Program) -> list[str]:
+    """Returns formatted words of the program."""
     formatted_program = []
     for word in program:
         formatted_word, _ = fmt_const(word) if len(word) == 1 else fmt_instruction(word)
+        formatted_program.append(formatted_word)
+
+    return formatted_program
+
+
+def write_compiled(
+    file: str,
+    exe: Executable,
+    binary: bool = False,
+    symbols: bool = False,
+) -> Error:
+    """
+    Writes compiled (.drc) file.
+
+    JSON by default, `binary` - binary executable (see `drum.common.binary`).
+    Debug information (labels & source map, disassembly section of binary executable)
+    is written only if `symbols` is True.
+    """
+    disassembly = disassemble(exe.program) if symbols or not binary else None
+
+    if binary:
+        data, err = encode_binary(exe, disassembly)
+        if err is not None:
+            return err
+
+        with open(file, 'wb') as out:
+            out.write(data)
+        return None
+
+    assert disassembly is not None
+    formatted_program = []
+    for word, formatted_word in zip(exe.program, disassembly):
         f = dict(
             raw=word,
             formatted=formatted_word,
         )
         formatted_program.append(f)
 
-    result = dict(
-        start=start,
+    result: dict[str, object] = dict(
+        start=exe.start,
         program=formatted_program,
     )
+    if symbols:
+        result.update(
+            symbols=exe.symbols,
+            files=exe.files,
+            source_map=exe.source_map,
+        )
 
     write_to_file(file, dumps(result, indent=2))
+    return None
+
 
+def _source_map(raw: list[list[int]]) -> list[SourceMapEntry]:
+    return [(addr, file_index, line, column) for addr, file_index, line, column in raw]
+
+
+def read_compiled(file: str, symbols: bool = False) -> Executable:
+    """
+    Reads compiled (.drc) file. Format (JSON or binary) is detected by the file contents.
+
+    Debug information (labels & source map) of binary executable is read only
+    if `symbols` is True.
+    """
+    if is_binary(file):
+        exe = read_binary(file)
+        if symbols:
+            load_binary_debug(file, exe)
+        return exe
 
-def read_compiled(file: str) -> Executable:
-    """Reads compiled (.drc) file."""
     raw_data = read_from_file(file)
     data = loads(raw_data)
 
@@ -49,4 +101,49 @@ def read_compiled(file: str) -> Executable:
     return Executable(
         start,
         simplified_program,
+        data.get('symbols', dict()),
+        data.get('files', []),
+        _source_map(data.get('source_map', [])),
     )
+
+
+def dumps_object(obj: ObjectFile) -> str:
+    """Serializes relocatable object (JSON)."""
+    return dumps(dict(
+        program=obj.program,
+        symbols=obj.symbols,
+        relocations=obj.relocations,
+        imports=obj.imports,
+        data=obj.data,
+        instruction_count=obj.instruction_count,
+        files=obj.files,
+        source_map=obj.source_map,
+        exports=obj.exports,
+    ))
+
+
+def loads_object(text: str) -> ObjectFile:
+    """Deserializes relocatable object (see `dumps_object()`)."""
+    data = loads(text)
+
+    return ObjectFile(
+        data['program'],
+        data['symbols'],
+        [(addr, index) for addr, index in data['relocations']],
+        [(addr, index, label) for addr, index, label in data['imports']],
+        [(start, end) for start, end in data['data']],
+        data['instruction_count'],
+        data['files'],
+        _source_map(data['source_map']),
+        data['exports'],
+    )
+
+
+def write_object(file: str, obj: ObjectFile) -> None:
+    """Writes relocatable object (.dro) file."""
+    write_to_file(file, dumps_object(obj))
+
+
+def read_object(file: str) -> ObjectFile:
+    """Reads relocatable object (.dro) file."""
+    return loads_object(read_from_file(file))
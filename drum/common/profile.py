@@ -0,0 +1,62 @@
+from dataclasses import dataclass
+from json import dumps, loads
+
+from drum.common.arch import Executable
+from drum.util.cache import hash_key
+from drum.util.io import read_from_file, write_to_file
+
+
+@dataclass
+class Profile:
+    """
+    Execution profile of a program (counts by word address).
+
+    Collected by `drumr.py --profile`, used by `drumc.py --profile-use`
+    (see `drum.compiler.layout`).
+    """
+    # Identifies the profiled program (see `program_hash()`)
+    program_hash: str
+    # Number of executions of every word
+    executions: list[int]
+    # Number of ticks spent executing every word
+    ticks: list[int]
+    # Number of executions after which control didn't go to the next word (taken branches)
+    taken: list[int]
+
+
+def program_hash(exe: Executable) -> str:
+    """Returns a hex digest that identifies the program."""
+    return hash_key(dumps([exe.start, exe.program]).encode())
+
+
+def new_profile(exe: Executable) -> Profile:
+    """Returns empty profile of the program."""
+    size = len(exe.program)
+    return Profile(program_hash(exe), [0] * size, [0] * size, [0] * size)
+
+
+def dumps_profile(profile: Profile) -> str:
+    """Serializes profile (JSON)."""
+    return dumps(dict(
+        program_hash=profile.program_hash,
+        executions=profile.executions,
+        ticks=profile.ticks,
+        taken=profile.taken,
+    ))
+
+
+def loads_profile(text: str) -> Profile:
+    """Deserializes profile (see `dumps_profile()`)."""
+    data = loads(text)
+
+    return Profile(data['program_hash'], data['executions'], data['ticks'], data['taken'])
+
+
+def write_profile(file: str, profile: Profile) -> None:
+    """Writes profile file."""
+    write_to_file(file, dumps_profile(profile))
+
+
+def read_profile(file: str) -> Profile:
+    """Reads profile file."""
+    return loads_profile(read_from_file(file))
@@ -1,22 +1,112 @@
-from sys import argv
+from argparse import ArgumentParser
 
-from drum.compiler.compile import run
+from drum.compiler.compile import OBJECT_EXTENSION, run, run_link, run_object
+from drum.util.cache import default_cache_dir
 from drum.util.io import eprint
 
 
+def get_parser() -> ArgumentParser:
+    parser = ArgumentParser(description='Compiles drum source code')
+
+    parser.add_argument(
+        'src_files',
+        type=str,
+        nargs='+',
+        help=f'Source (.dr) or object ({OBJECT_EXTENSION}) files, linked in the given order',
+    )
+    parser.add_argument(
+        'output_file',
+        type=str,
+        help=f'Compiled (.drc) or object ({OBJECT_EXTENSION}) file',
+    )
+    parser.add_argument(
+        '-c',
+        '--object',
+        action='store_true',
+        help=f'Compile a single source into relocatable object ({OBJECT_EXTENSION}) file',
+    )
+    parser.add_argument(
+        '-O',
+        '--optimize',
+        action='store_true',
+        help=(
+            'Optimize program (constant propagation, branch folding, dead code removal), '
+            'code must not be modified or read as data'
+        ),
+    )
+    parser.add_argument(
+        '--profile-use',
+        type=str,
+        default=None,
+        help='Reorder blocks by the profile (see drumr.py --profile) of the same program',
+    )
+    parser.add_argument(
+        '-b',
+        '--binary',
+        action='store_true',
+        help='Write binary executable instead of JSON',
+    )
+    parser.add_argument(
+        '-g',
+        '--symbols',
+        action='store_true',
+        help='Write debug information (labels, source map, disassembly of binary executable)',
+    )
+
+    parser.add_argument(
+        '--cache-dir',
+        type=str,
+        default=default_cache_dir(),
+        help='Directory to cache translated programs in',
+    )
+    parser.add_argument(
+        '--no-cache',
+        action='store_true',
+        help="Don't use translation cache",
+    )
+
+    return parser
+
+
 def cli() -> None:
-    if len(argv) != 3:
-        print(f'usage: {argv[0]} src_file[.dr] output_file[.drc]')
-        return
+    parser = get_parser()
 
-    src_file = argv[1].strip()
-    output_file = argv[2].strip()
+    args = parser.parse_args()
 
-    if src_file == output_file:
+    src_files = [src_file.strip() for src_file in args.src_files]
+    output_file = args.output_file.strip()
+
+    if output_file in src_files:
         eprint("src file and output file shouldn't be equal")
         return
 
-    error = run(src_file, output_file)
+    cache_dir = None if args.no_cache else args.cache_dir
+
+    if args.object:
+        if len(src_files) != 1:
+            eprint('exactly one src file should be compiled into object')
+            return
+        error = run_object(src_files[0], output_file, cache_dir)
+    elif len(src_files) == 1 and not src_files[0].endswith(OBJECT_EXTENSION):
+        error = run(
+            src_files[0],
+            output_file,
+            args.binary,
+            args.symbols,
+            cache_dir=cache_dir,
+            optimize=args.optimize,
+            profile_file=args.profile_use,
+        )
+    else:
+        error = run_link(
+            src_files,
+            output_file,
+            args.binary,
+            args.symbols,
+            cache_dir,
+            args.optimize,
+            args.profile_use,
+        )
 
     if error is not None:
         eprint(error)
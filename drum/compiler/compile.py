@@ -1,35 +1,236 @@
-from drum.common.io import read_src, write_compiled
-from drum.compiler.lexer import Lexer, lex_top
-from drum.compiler.tokens import TokenType
-from drum.compiler.translator import Translator
-from drum.util.error import Error
+import os
+from dataclasses import replace
+from typing import Optional
 
+from drum.common.arch import ISA_FINGERPRINT, ObjectFile
+from drum.common.io import (
+    dumps_object,
+    loads_object,
+    read_object,
+    read_src,
+    write_compiled,
+    write_object,
+)
+from drum.common.profile import Profile, program_hash, read_profile
+from drum.compiler.layout import layout
+from drum.compiler.lexer import tokenize
+from drum.compiler.linker import DUMMY_OBJECT, merge, to_executable
+from drum.compiler.optimizer import optimize as optimize_object
+from drum.compiler.translator import DUMMY_TRANSLATION_RESULT, TranslationResult, Translator
+from drum.util.cache import DEFAULT_CACHE_SIZE, hash_key, read_cached, write_cached
+from drum.util.error import Error, Result
 
-def run(src_file: str, output_file: str) -> Error:
+# Bump whenever translation changes, so stale cache entries are ignored
+COMPILER_VERSION = 5
+
+# Relocatable object file extension (see `run_link()`)
+OBJECT_EXTENSION = '.dro'
+
+# Source file name of the source map if it isn't provided
+SOURCE_NAME = '<source>'
+
+
+def _cache_file(cache_dir: str, text: str) -> str:
+    key = hash_key(
+        f'{COMPILER_VERSION}'.encode(),
+        ISA_FINGERPRINT.encode(),
+        text.encode(),
+    )
+    return os.path.join(cache_dir, 'compiled', f'{key}.json')
+
+
+def _read_cached_object(cache_file: str) -> Optional[ObjectFile]:
+    cached = read_cached(cache_file)
+    if cached is None:
+        return None
+
+    try:
+        return loads_object(cached.decode())
+    except (ValueError, KeyError, TypeError):
+        # corrupted entry is recompiled & overwritten
+        return None
+
+
+def _write_cached_object(cache_file: str, obj: ObjectFile) -> None:
+    try:
+        write_cached(cache_file, dumps_object(obj).encode(), DEFAULT_CACHE_SIZE)
+    except OSError:
+        # cache is an optimization only
+        pass
+
+
+def compile_object(
+    text: str,
+    cache_dir: Optional[str] = None,
+    file: str = SOURCE_NAME,
+) -> Result[ObjectFile]:
+    """
+    Translates source text into relocatable object (nothing is printed or written,
+    except for the cache). `file` - source file name for the source map.
+
+    If `cache_dir` is provided, successful translations are cached there
+    (keyed by hash of the source text, compiler version and instruction set),
+    so unchanged sources aren't translated again.
+    """
+    cache_file = _cache_file(cache_dir, text) if cache_dir is not None else None
+    if cache_file is not None:
+        cached = _read_cached_object(cache_file)
+        if cached is not None:
+            return replace(cached, files=[file]), None
+
+    translator = Translator(tokenize(text), text, file)
+    obj, error = translator.translate_object()
+
+    # lexer error takes precedence, even if it's further than translator error
+    translator.drain()
+    if translator.lexer_error is not None:
+        return DUMMY_OBJECT, f'lexer error: {translator.lexer_error}'
+
+    if error is not None:
+        return DUMMY_OBJECT, f'translator error: {error}'
+
+    if cache_file is not None:
+        _write_cached_object(cache_file, obj)
+
+    return obj, None
+
+
+def _link(
+    objects: list[ObjectFile],
+    optimize: bool,
+    profile: Optional[Profile] = None,
+) -> Result[TranslationResult]:
+    merged, error = merge(objects)
+    if error is not None:
+        return DUMMY_TRANSLATION_RESULT, error
+
+    if optimize:
+        merged = optimize_object(merged)
+
+    if profile is not None:
+        if profile.program_hash != program_hash(to_executable(merged)):
+            return DUMMY_TRANSLATION_RESULT, "profile doesn't match the program"
+        merged = layout(merged, profile)
+
+    return TranslationResult(to_executable(merged), merged.instruction_count), None
+
+
+def compile_source(
+    text: str,
+    cache_dir: Optional[str] = None,
+    optimize: bool = False,
+    profile: Optional[Profile] = None,
+    file: str = SOURCE_NAME,
+) -> Result[TranslationResult]:
+    """
+    Translates source text into executable (see `compile_object()`).
+
+    `optimize` - run optimizer (see `drum.compiler.optimizer`), `profile` - reorder blocks
+    by the profile (see `drum.compiler.layout`), it should be collected on the program
+    compiled from the same source with the same options.
+    """
+    obj, error = compile_object(text, cache_dir, file)
+    if error is not None:
+        return DUMMY_TRANSLATION_RESULT, error
+
+    translation_result, error = _link([obj], optimize, profile)
+    if error is not None:
+        return DUMMY_TRANSLATION_RESULT, f'translator error: {error}'
+
+    return translation_result, None
+
+
+def run(
+    src_file: str,
+    output_file: str,
+    binary: bool = False,
+    symbols: bool = False,
+    cache_dir: Optional[str] = None,
+    optimize: bool = False,
+    profile_file: Optional[str] = None,
+) -> Error:
     """
     Compiles code from `src_file` and writes the result to `output_file`.
 
-    If error is encountered, prints it and returns immediately.
+    `binary` - write binary executable instead of JSON, `symbols` - write debug information
+    (see `write_compiled()`).
+    `cache_dir` - translation cache, `optimize` - run optimizer, `profile_file` - reorder
+    blocks by the profile (see `compile_source()`).
+
+    If error is encountered, returns it immediately.
     """
     text = read_src(src_file)
 
-    lexer = Lexer(text, lex_top)
-    tokens = lexer.lex()
+    profile = read_profile(profile_file) if profile_file is not None else None
 
-    for token in tokens:
-        if token.type == TokenType.ERROR:
-            return f'lexer error: {token.value}'
+    translation_result, error = compile_source(
+        text,
+        cache_dir,
+        optimize,
+        profile,
+        os.path.basename(src_file),
+    )
+    if error is not None:
+        return error
 
-    translator = Translator(tokens)
-    translation_result, error = translator.translate()
+    print(f'instructions: {translation_result.instruction_count}')
 
-    exe = translation_result.exe
+    error = write_compiled(output_file, translation_result.exe, binary, symbols)
+    if error is not None:
+        return f'output error: {error}'
 
-    print(f'instructions: {translation_result.instruction_count}')
+    return None
+
+
+def run_object(src_file: str, output_file: str, cache_dir: Optional[str] = None) -> Error:
+    """Compiles code from `src_file` into relocatable object, writes it to `output_file`."""
+    obj, error = compile_object(read_src(src_file), cache_dir, os.path.basename(src_file))
+    if error is not None:
+        return error
+
+    print(f'instructions: {obj.instruction_count}')
+
+    write_object(output_file, obj)
+
+    return None
+
+
+def run_link(
+    input_files: list[str],
+    output_file: str,
+    binary: bool = False,
+    symbols: bool = False,
+    cache_dir: Optional[str] = None,
+    optimize: bool = False,
+    profile_file: Optional[str] = None,
+) -> Error:
+    """
+    Links objects (`OBJECT_EXTENSION`) & sources (compiled on the fly) into executable.
 
+    Objects are placed in the order of files. With `cache_dir` only changed sources
+    are translated again. `optimize` & `profile_file` - see `run()`.
+    """
+    objects = []
+    for file in input_files:
+        if file.endswith(OBJECT_EXTENSION):
+            objects.append(read_object(file))
+            continue
+
+        obj, error = compile_object(read_src(file), cache_dir, os.path.basename(file))
+        if error is not None:
+            return f'{file}: {error}'
+        objects.append(obj)
+
+    profile = read_profile(profile_file) if profile_file is not None else None
+
+    translation_result, error = _link(objects, optimize, profile)
     if error is not None:
-        return f'translator error: {error}'
+        return f'linker error: {error}'
 
-    write_compiled(output_file, exe)
+    print(f'instructions: {translation_result.instruction_count}')
+
+    error = write_compiled(output_file, translation_result.exe, binary, symbols)
+    if error is not None:
+        return f'output error: {error}'
 
     return None
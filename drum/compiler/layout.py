@@ -0,0 +1,327 @@
+from dataclasses import dataclass
+from typing import Optional
+
+from drum.common.arch import (
+    BRANCH_OPS,
+    HALT_OP,
+    ObjectFile,
+    Op,
+    Program,
+    Register,
+    Relocation,
+    Word,
+)
+from drum.common.debug import remap_source_map
+from drum.common.profile import Profile
+from drum.machine.decode import decode_word
+
+# Branches taken when both registers are the same
+_REFLEXIVE_BRANCH_OPS = (Op.BEQ, Op.BLE, Op.BGE)
+
+# Branch with the opposite condition
+INVERTED_BRANCH_OPS = {
+    Op.BEQ: Op.BNE,
+    Op.BNE: Op.BEQ,
+    Op.BLT: Op.BGE,
+    Op.BGE: Op.BLT,
+    Op.BLE: Op.BGT,
+    Op.BGT: Op.BLE,
+}
+
+# Emitted word: its original address (None - added jump), the word (None - removed)
+_Entry = tuple[Optional[int], Optional[Word]]
+
+
+@dataclass
+class Block:
+    """Basic block: words `start`..`end` (exclusive), control enters at `start` only."""
+    start: int
+    end: int
+    # Address the last word jumps to (None - it isn't a branch)
+    target: Optional[int]
+    # Address control falls through to (None - it never does)
+    fallthrough: Optional[int]
+    # How many times control went to `target` / `fallthrough` (by profile)
+    taken: int
+    not_taken: int
+
+
+@dataclass
+class Cost:
+    """Cost of the block order: added minus removed executed instructions, taken branches."""
+    instructions: int = 0
+    taken: int = 0
+
+    def key(self) -> tuple[int, int]:
+        return self.instructions, self.taken
+
+
+def _jump(target: int) -> Word:
+    reg = Register.R0.value.code
+    return [Op.BEQ.value.code, reg, reg, target]
+
+
+class Layout:
+    """
+    Profile-guided block layout of a merged (fully linked) object.
+
+    Every code segment (words between literals) is split into basic blocks, blocks are
+    chained along the most frequent control transfers (greedily, the hottest first),
+    so that the hot path falls through:
+
+    - branch is inverted if its target is placed next (`BLT` <-> `BGE` etc.)
+    - jump to the next block is removed
+    - jump is added where the fall through block isn't placed next
+
+    New order is used only if it executes fewer instructions (or takes fewer branches)
+    on the profiled run than the original one. Label references (relocations) are remapped.
+    Code is assumed not to be modified or read as data.
+    """
+    # Object being laid out
+    obj: ObjectFile
+    # Execution counts (by address)
+    profile: Profile
+    # Arguments that hold addresses
+    relocated: set[Relocation]
+    # Addresses that can be entered not by fall through (labels & referenced addresses)
+    entries: set[int]
+
+    def __init__(self, obj: ObjectFile, profile: Profile) -> None:
+        self.obj = obj
+        self.profile = profile
+        self.relocated = set(obj.relocations)
+        self.entries = set(obj.symbols.values())
+        self.entries.update(obj.program[addr][index] for addr, index in obj.relocations)
+
+    def _segments(self) -> list[tuple[int, int]]:
+        """Returns code segments (start, end) - ranges between literals."""
+        segments = []
+        start = 0
+        for data_start, data_end in [*self.obj.data, (len(self.obj.program),) * 2]:
+            if start < data_start:
+                segments.append((start, data_start))
+            start = max(start, data_end)
+        return segments
+
+    def _block(self, start: int, end: int) -> Block:
+        last = end - 1
+        executions, taken = self.profile.executions[last], self.profile.taken[last]
+
+        instruction, err = decode_word(self.obj.program[last])
+        if err is not None or instruction.op == HALT_OP:
+            return Block(start, end, None, None, 0, 0)
+
+        if instruction.op not in BRANCH_OPS or instruction.a == instruction.b:
+            if instruction.op in _REFLEXIVE_BRANCH_OPS:
+                return Block(start, end, instruction.c, None, executions, 0)
+            return Block(start, end, None, end, 0, executions)
+
+        return Block(start, end, instruction.c, end, taken, executions - taken)
+
+    def blocks(self, start: int, end: int) -> Optional[list[Block]]:
+        """Splits code segment into blocks. None if control falls out of the segment."""
+        leaders = {start}
+        for addr in range(start, end):
+            if addr in self.entries:
+                leaders.add(addr)
+            instruction, err = decode_word(self.obj.program[addr])
+            if err is not None or instruction.op in BRANCH_OPS or instruction.op == HALT_OP:
+                leaders.add(addr + 1)
+
+        starts = sorted(leader for leader in leaders if leader < end)
+        blocks = [
+            self._block(block_start, block_end)
+            for block_start, block_end in zip(starts, [*starts[1:], end])
+        ]
+        if blocks[-1].fallthrough is not None:
+            return None
+        return blocks
+
+    @staticmethod
+    def _rotate(blocks: list[Block], index: dict[int, int], chain: list[int]) -> list[int]:
+        """Rotates looped chain, so that the block with the most frequent exit is the last."""
+        in_chain = set(chain)
+
+        def exits(i: int) -> int:
+            block = blocks[i]
+            weight = 0
+            if block.fallthrough is not None and index[block.fallthrough] not in in_chain:
+                weight += block.not_taken
+            if block.target is not None and index.get(block.target) not in in_chain:
+                weight += block.taken
+            return weight
+
+        last = max(range(len(chain)), key=lambda k: exits(chain[k]))
+        if exits(chain[last]) <= exits(chain[-1]):
+            return chain
+        return chain[last + 1:] + chain[:last + 1]
+
+    @staticmethod
+    def order(blocks: list[Block]) -> list[Block]:
+        """Chains blocks along the most frequent transfers, chains keep the original order."""
+        index = {block.start: i for i, block in enumerate(blocks)}
+        edges = []
+        for i, block in enumerate(blocks):
+            if block.fallthrough is not None:
+                edges.append((block.not_taken, False, i, index[block.fallthrough]))
+            if block.target is not None and block.target in index:
+                edges.append((block.taken, True, i, index[block.target]))
+        # hottest first, original fall through on ties
+        edges.sort(key=lambda edge: (-edge[0], edge[1], edge[2]))
+
+        chains = [[i] for i in range(len(blocks))]
+        chain_of = list(range(len(blocks)))
+        for _, _, src, dst in edges:
+            src_chain, dst_chain = chain_of[src], chain_of[dst]
+            if src_chain == dst_chain:
+                chain = chains[src_chain]
+                if chain[-1] == src and chain[0] == dst:
+                    # loop is closed: rotate it, so that it's left by falling through
+                    chains[src_chain] = Layout._rotate(blocks, index, chain)
+                continue
+            if chains[src_chain][-1] != src or chains[dst_chain][0] != dst:
+                continue
+            for i in chains[dst_chain]:
+                chain_of[i] = src_chain
+            chains[src_chain] += chains[dst_chain]
+            chains[dst_chain] = []
+
+        ordered = sorted((chain for chain in chains if chain), key=min)
+        return [blocks[i] for chain in ordered for i in chain]
+
+    def emit(self, blocks: list[Block]) -> tuple[list[_Entry], Cost]:
+        """Emits blocks in the given order. Returns words & cost of the order."""
+        entries: list[_Entry] = []
+        cost = Cost()
+        program = self.obj.program
+
+        for i, block in enumerate(blocks):
+            next_start = blocks[i + 1].start if i + 1 < len(blocks) else None
+            last = block.end - 1
+            entries += [(addr, program[addr]) for addr in range(block.start, last)]
+
+            is_jump = block.fallthrough is None and block.target is not None
+            if is_jump and block.target == next_start:
+                # jump to the next block
+                entries.append((last, None))
+                cost.instructions -= block.taken
+                cost.taken -= block.taken
+                continue
+
+            if block.target is not None and block.fallthrough is not None:
+                if block.fallthrough != next_start and block.target == next_start:
+                    word = program[last]
+                    instruction, _ = decode_word(word)
+                    inverted = INVERTED_BRANCH_OPS[instruction.op].value.code
+                    entries.append((last, [inverted, word[1], word[2], block.fallthrough]))
+                    cost.taken += block.not_taken - block.taken
+                    continue
+
+            entries.append((last, program[last]))
+            if block.fallthrough is not None and block.fallthrough != next_start:
+                entries.append((None, _jump(block.fallthrough)))
+                cost.instructions += block.not_taken
+                cost.taken += block.not_taken
+
+        return entries, cost
+
+    def _segment(self, start: int, end: int) -> list[_Entry]:
+        blocks = self.blocks(start, end)
+        if blocks is None:
+            return [(addr, self.obj.program[addr]) for addr in range(start, end)]
+
+        original, original_cost = self.emit(blocks)
+        ordered, cost = self.emit(self.order(blocks))
+        return ordered if cost.key() < original_cost.key() else original
+
+    def result(self) -> ObjectFile:
+        """Returns object with blocks reordered (addresses are remapped)."""
+        program = self.obj.program
+
+        entries: list[_Entry] = []
+        addr = 0
+        for start, end in self._segments():
+            entries += [(data_addr, program[data_addr]) for data_addr in range(addr, start)]
+            entries += self._segment(start, end)
+            addr = end
+        entries += [(data_addr, program[data_addr]) for data_addr in range(addr, len(program))]
+
+        # removed word is mapped to the word placed after it
+        remap = [0] * (len(program) + 1)
+        removed = []
+        new_program: Program = []
+        old_addresses: list[Optional[int]] = []
+        relocations: list[Relocation] = []
+        for old_addr, word in entries:
+            if word is None:
+                assert old_addr is not None
+                removed.append(old_addr)
+                continue
+            old_addresses.append(old_addr)
+
+            for removed_addr in removed:
+                remap[removed_addr] = len(new_program)
+            removed = []
+
+            if old_addr is None:
+                indexes = [3]
+            else:
+                remap[old_addr] = len(new_program)
+                indexes = [
+                    index for index in range(1, len(word)) if (old_addr, index) in self.relocated
+                ]
+            relocations += [(len(new_program), index) for index in indexes]
+            new_program.append(word)
+
+        for removed_addr in removed:
+            remap[removed_addr] = len(new_program)
+        remap[len(program)] = len(new_program)
+
+        for addr, index in relocations:
+            word = new_program[addr]
+            if 0 <= word[index] < len(remap):
+                new_program[addr] = word = word.copy()
+                word[index] = remap[word[index]]
+
+        symbols = {
+            label: remap[addr] if 0 <= addr < len(remap) else addr
+            for label, addr in self.obj.symbols.items()
+        }
+        data = [(remap[start], remap[start] + end - start) for start, end in self.obj.data]
+
+        return ObjectFile(
+            new_program,
+            symbols,
+            relocations,
+            [],
+            data,
+            self.obj.instruction_count + len(new_program) - len(program),
+            self.obj.files,
+            remap_source_map(self.obj.source_map, old_addresses),
+            self.obj.exports,
+        )
+
+
+def layout(obj: ObjectFile, profile: Profile) -> ObjectFile:
+    """
+    Reorders blocks of merged object by profile (see `Layout`).
+
+    Object is returned as is if its control flow can't be remapped
+    (e.g. branch target is a number rather than a label).
+    """
+    if obj.imports or len(profile.executions) != len(obj.program):
+        return obj
+
+    is_data = bytearray(len(obj.program))
+    for start, end in obj.data:
+        is_data[start:end] = b'\x01' * (end - start)
+
+    relocated = set(obj.relocations)
+    for addr, word in enumerate(obj.program):
+        if is_data[addr]:
+            continue
+        instruction, err = decode_word(word)
+        if err is None and instruction.op in BRANCH_OPS and (addr, 3) not in relocated:
+            return obj
+
+    return Layout(obj, profile).result()
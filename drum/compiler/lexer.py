@@ -1,6 +1,6 @@
 import re
 from string import ascii_letters, digits
-from typing import Callable
+from typing import Callable, Iterator
 
 from drum.compiler.tokens import Token, TokenType
 
@@ -124,6 +124,7 @@ class Lexer:
         self.tokens.append(Token(
             self.text[self.token_start:self.position],
             token_type,
+            self.token_start,
         ))
         self.token_start = self.position
 
@@ -156,8 +157,11 @@ def lex_label(lexer: Lexer) -> StateFunction:
 
     if lexer.next() == ':':
         lexer.go_back()
-        lexer.save_token(TokenType.LABEL)
+        exported = lexer.text.startswith('::', lexer.position)
+        lexer.save_token(TokenType.LABEL_EXPORT if exported else TokenType.LABEL)
         lexer.next()
+        if exported:
+            lexer.next()
         return lex_top
 
     return lexer.error('invalid end of label (: expected)')
@@ -314,3 +318,103 @@ def lex_top(lexer: Lexer) -> StateFunction:
         return None
 
     return lexer.error('unexpected symbol while lexing top-level')
+
+
+# Linear-time lexer (`tokenize()`).
+# Produces the same tokens as the state-function lexer above (which is kept as the reference),
+# but matches the whole token at once with a compiled regex at the current position.
+
+_IDENTIFIER = rf'[{START_SYMBOLS}][{SYMBOLS}]*'
+
+# Top level: whitespace, then a comment, a label, an instruction or a literal
+# (nothing is matched after whitespace - end of text or unexpected symbol)
+TOP_REGEX = re.compile(rf"""
+    [ \t\n]*
+    (?:
+        (?P<comment>;[^\n\0]*)
+        | (?P<label_export>{_IDENTIFIER})::
+        | (?P<label>{_IDENTIFIER}):
+        | (?P<instruction>{_IDENTIFIER})[ \t]*
+        | "(?P<literal_string>[^"\0]*)"
+        | (?P<unterminated_string>"[^"\0]*\0?)
+        | \#(?P<literal_number>[+-]?[0-9]*)
+    )?
+""", re.VERBOSE)
+
+# Instruction argument (with the following comma)
+ARGUMENT_REGEX = re.compile(rf"""
+    (?:
+        (?P<argument_number>(?=[0-9+-])[+-]?[0-9]*)
+        | (?P<argument_label>{_IDENTIFIER})
+        | %(?P<argument_register>{_IDENTIFIER})
+        | (?P<invalid_register>%)
+        | "(?P<argument_string>[^"\0]*)"
+        | (?P<unterminated_string>"[^"\0]*\0?)
+    )
+    [ \t]*,?[ \t]*
+""", re.VERBOSE)
+
+# Regex group -> type of the token
+_GROUP_TOKEN_TYPES = {
+    'label': TokenType.LABEL,
+    'label_export': TokenType.LABEL_EXPORT,
+    'instruction': TokenType.INSTRUCTION,
+    'literal_string': TokenType.LITERAL_STRING,
+    'literal_number': TokenType.LITERAL_NUMBER,
+    'argument_number': TokenType.ARGUMENT_NUMBER,
+    'argument_label': TokenType.ARGUMENT_LABEL,
+    'argument_register': TokenType.ARGUMENT_REGISTER,
+    'argument_string': TokenType.ARGUMENT_STRING,
+}
+
+
+def _error_token(text: str, message: str, position: int) -> Token:
+    """Error token (formatted the same way as `Lexer.error()` does)."""
+    symbol = text[position] if position < len(text) else EOF
+    return Token(f'{message}: {symbol} (position {position})', TokenType.ERROR)
+
+
+def tokenize(text: str) -> Iterator[Token]:
+    """
+    Lexes text in a single pass. Yields tokens one by one.
+
+    As with `Lexer`, lexing stops after an error token.
+    """
+    top_match = TOP_REGEX.match
+    argument_match = ARGUMENT_REGEX.match
+    text_len = len(text)
+    position = 0
+    arguments = False
+
+    while True:
+        if arguments:
+            m = argument_match(text, position)
+            if m is None:
+                arguments = False
+                continue
+        else:
+            m = top_match(text, position)
+            assert m is not None
+            if m.lastgroup is None:
+                position = m.end()
+                if position < text_len and text[position] != EOF:
+                    yield _error_token(text, 'unexpected symbol while lexing top-level', position)
+                return
+
+        group = m.lastgroup
+        assert group is not None
+        if group == 'invalid_register':
+            # position right after the symbol that can't start a register name
+            position = min(m.start() + 2, text_len)
+            yield _error_token(text, 'invalid symbol while lexing register', position)
+            return
+
+        token_type = _GROUP_TOKEN_TYPES.get(group)
+        if token_type is not None:
+            yield Token(m.group(group), token_type, m.start(group))
+
+        arguments = arguments or group == 'instruction'
+        position = m.end()
+
+        if position >= text_len and not arguments:
+            return
@@ -0,0 +1,136 @@
+from collections import ChainMap
+from typing import Container
+
+from drum.common.arch import (
+    START_LABEL,
+    DataRange,
+    Executable,
+    ObjectFile,
+    Program,
+    Relocation,
+    SourceMapEntry,
+)
+from drum.util.error import Result
+
+DUMMY_OBJECT = ObjectFile([], dict(), [], [], [], 0)
+
+
+def _local_name(label: str, obj: ObjectFile, index: int, taken: Container[str]) -> str:
+    """
+    Returns name of a local label of the `index`-th object that isn't `taken`:
+    the label itself, `label@file` or `label@index`.
+    """
+    for name in (label, f'{label}@{obj.files[0]}' if obj.files else label):
+        if name not in taken:
+            return name
+    return f'{label}@{index}'
+
+
+def merge(objects: list[ObjectFile]) -> Result[ObjectFile]:
+    """
+    Merges objects (in the given order) into a single one in a single pass.
+
+    Every object is placed right after the previous one: its local addresses are shifted
+    by its base address, references to labels exported by other objects are resolved
+    through the merged table of exports (and become relocations).
+    Patched words are copied, objects aren't modified.
+
+    Local labels stay in the merged symbols (for debug information), the ones that
+    clash with another label are renamed (see `_local_name()`).
+    """
+    program: Program = []
+    exports: dict[str, int] = dict()
+    bases = []
+
+    for obj in objects:
+        base = len(program)
+        bases.append(base)
+
+        for label in obj.exports:
+            if label in exports:
+                return DUMMY_OBJECT, f'label redefinition: {label}'
+            exports[label] = base + obj.symbols[label]
+
+        program.extend(obj.program)
+
+    symbols: dict[str, int] = dict()
+    taken = ChainMap(symbols, exports)
+    for index, (obj, base) in enumerate(zip(objects, bases)):
+        exported = set(obj.exports)
+        for label, addr in obj.symbols.items():
+            if label in exported:
+                symbols[label] = base + addr
+                continue
+            symbols[_local_name(label, obj, index, taken)] = base + addr
+
+    if START_LABEL not in exports:
+        return DUMMY_OBJECT, f'start label ({START_LABEL}) not found'
+
+    relocations: list[Relocation] = []
+    copied: set[int] = set()
+
+    def patch(addr: int, index: int, value: int) -> None:
+        if addr not in copied:
+            program[addr] = program[addr].copy()
+            copied.add(addr)
+        program[addr][index] = value
+
+    for obj, base in zip(objects, bases):
+        for addr, index in obj.relocations:
+            if base != 0:
+                patch(base + addr, index, program[base + addr][index] + base)
+            relocations.append((base + addr, index))
+
+        for addr, index, label in obj.imports:
+            if label not in exports:
+                return DUMMY_OBJECT, f'label resolution error: undefined label: {label}'
+            patch(base + addr, index, exports[label])
+            relocations.append((base + addr, index))
+
+    data: list[DataRange] = [
+        (base + start, base + end)
+        for obj, base in zip(objects, bases)
+        for start, end in obj.data
+    ]
+    instruction_count = sum(obj.instruction_count for obj in objects)
+
+    files: list[str] = []
+    source_map: list[SourceMapEntry] = []
+    for obj, base in zip(objects, bases):
+        source_map += [
+            (base + addr, len(files) + file_index, line, column)
+            for addr, file_index, line, column in obj.source_map
+        ]
+        files += obj.files
+
+    return ObjectFile(
+        program,
+        symbols,
+        relocations,
+        [],
+        data,
+        instruction_count,
+        files,
+        source_map,
+        list(exports),
+    ), None
+
+
+def to_executable(obj: ObjectFile) -> Executable:
+    """Returns executable of a merged object (see `merge()`)."""
+    return Executable(
+        obj.symbols[START_LABEL],
+        obj.program,
+        obj.symbols,
+        obj.files,
+        obj.source_map,
+    )
+
+
+def link(objects: list[ObjectFile]) -> Result[Executable]:
+    """Merges objects into an executable (see `merge()`)."""
+    merged, error = merge(objects)
+    if error is not None:
+        return Executable(0, []), error
+
+    return to_executable(merged), None
@@ -0,0 +1,465 @@
+from dataclasses import dataclass
+from typing import Iterator, Optional
+
+from drum.common.arch import (
+    BRANCH_OPS,
+    CALC_OPS,
+    CALC_RRI_OPS,
+    HALT_OP,
+    REGISTER_COUNT,
+    START_LABEL,
+    ObjectFile,
+    Op,
+    Program,
+    Relocation,
+    Word,
+)
+from drum.common.debug import remap_source_map
+from drum.machine.decode import DecodedInstruction, decode_word
+
+# Folded constants are kept within 32 bits, so that folding doesn't depend on word width
+CONST_MIN = -(1 << 31)
+CONST_MAX = (1 << 31) - 1
+
+# Branches taken when both registers are the same
+_REFLEXIVE_BRANCH_OPS = (Op.BEQ, Op.BLE, Op.BGE)
+
+# All registers (liveness bit mask)
+_ALL_REGISTERS = (1 << REGISTER_COUNT) - 1
+
+
+@dataclass(frozen=True, slots=True)
+class Address:
+    """Register value that is an address of the word (relocated with the program)."""
+    addr: int
+
+
+# Known register value: number, address or None (unknown)
+Value = int | Address | None
+State = tuple[Value, ...]
+
+
+def _meet(left: State, right: State) -> State:
+    return tuple(a if a == b else None for a, b in zip(left, right))
+
+
+def _with(state: State, reg: int, value: Value) -> State:
+    return state[:reg] + (value,) + state[reg + 1:]
+
+
+def _fold(op: Op, left: int, right: int) -> Value:
+    """Computes ALU operation on constants. None if the result isn't a (32-bit) constant."""
+    match op:
+        case Op.ADD | Op.ADDI:
+            result = left + right
+        case Op.SUB | Op.SUBI:
+            result = left - right
+        case Op.SHR | Op.SHRI:
+            if right < 0:
+                return None
+            result = left >> right
+        case Op.XOR | Op.XORI:
+            result = left ^ right
+        case _:
+            return None
+
+    return result if CONST_MIN <= result <= CONST_MAX else None
+
+
+class Optimizer:
+    """
+    Optimizer of a merged (fully linked) object.
+
+    Words reachable from `_start` are analysed with conditional constant propagation
+    (register values are tracked through the control flow graph, only feasible
+    branch outcomes are followed). Then:
+
+    - branches with known outcome are folded (never taken are removed,
+      always taken become `BEQ %R, %R, target`)
+    - ALU instructions that don't change the destination are removed, the ones
+      with constant result are rewritten to `ADDI` from a zero register
+    - ALU instructions whose result is never read are removed
+    - branches to always taken branches are threaded, branches to the next word are removed
+    - unreachable instructions are removed
+
+    Label references (relocations) are remapped to the new addresses, the program is padded
+    with zero words to its original size. Data words (literals) are kept, code is assumed
+    not to be modified or read as data.
+    """
+    # Object being optimized
+    obj: ObjectFile
+    # Arguments that hold addresses
+    relocated: set[Relocation]
+    # Data word flags (by address)
+    is_data: bytearray
+    # Decoded reachable instructions (None - invalid, machine faults there)
+    decoded: dict[int, Optional[DecodedInstruction]]
+    # Register values before reachable words
+    states: dict[int, State]
+    # Resulting words (None - removed)
+    words: list[Optional[Word]]
+
+    def __init__(self, obj: ObjectFile) -> None:
+        self.obj = obj
+        self.relocated = set(obj.relocations)
+        self.is_data = bytearray(len(obj.program))
+        for start, end in obj.data:
+            self.is_data[start:end] = b'\x01' * (end - start)
+        self.decoded = dict()
+        self.states = dict()
+        self.words = list(obj.program)
+
+    def _decode(self, addr: int) -> Optional[DecodedInstruction]:
+        if addr not in self.decoded:
+            instruction = None
+            if 0 <= addr < len(self.obj.program):
+                instruction, err = decode_word(self.obj.program[addr])
+                if err is not None:
+                    instruction = None
+            self.decoded[addr] = instruction
+        return self.decoded[addr]
+
+    def _transfer(self, addr: int, instruction: DecodedInstruction, state: State) -> State:
+        """Returns register values after the instruction."""
+        op = instruction.op
+        if op in CALC_OPS:
+            return _with(state, instruction.a, self._result(addr, instruction, state))
+        if op in (Op.LD, Op.IN):
+            return _with(state, instruction.a, None)
+        return state
+
+    def _result(self, addr: int, instruction: DecodedInstruction, state: State) -> Value:
+        """Returns the value ALU instruction writes."""
+        op, b, c = instruction.op, instruction.b, instruction.c
+
+        if op in CALC_RRI_OPS:
+            left = state[b]
+            if (addr, 3) in self.relocated:
+                return Address(c) if op == Op.ADDI and left == 0 else None
+            if isinstance(left, Address):
+                return left if op in (Op.ADDI, Op.SUBI) and c == 0 else None
+            return _fold(op, left, c) if left is not None else None
+
+        if op in (Op.XOR, Op.SUB) and b == c:
+            return 0
+
+        left, right = state[b], state[c]
+        if isinstance(left, int) and isinstance(right, int):
+            return _fold(op, left, right)
+        return None
+
+    @staticmethod
+    def _outcome(instruction: DecodedInstruction, state: State) -> Optional[bool]:
+        """Returns whether the branch is taken. None if it isn't known."""
+        op = instruction.op
+        if instruction.a == instruction.b:
+            return op in _REFLEXIVE_BRANCH_OPS
+
+        left, right = state[instruction.a], state[instruction.b]
+        if not isinstance(left, int) or not isinstance(right, int):
+            return None
+
+        match op:
+            case Op.BEQ:
+                return left == right
+            case Op.BNE:
+                return left != right
+            case Op.BLT:
+                return left < right
+            case Op.BLE:
+                return left <= right
+            case Op.BGT:
+                return left > right
+            case _:
+                return left >= right
+
+    def _successors(self, addr: int, instruction: DecodedInstruction, state: State) -> list[int]:
+        op = instruction.op
+        if op == HALT_OP:
+            return []
+        if op in BRANCH_OPS:
+            match self._outcome(instruction, state):
+                case True:
+                    return [instruction.c]
+                case False:
+                    return [addr + 1]
+                case _:
+                    return [instruction.c, addr + 1]
+        return [addr + 1]
+
+    def analyze(self) -> bool:
+        """Propagates constants from `_start`. False if control flow can't be analysed."""
+        start = self.obj.symbols[START_LABEL]
+        self.states = {start: (0,) * REGISTER_COUNT}
+        work = [start]
+
+        while work:
+            addr = work.pop()
+            instruction = self._decode(addr)
+            if instruction is None:
+                continue
+
+            if instruction.op in BRANCH_OPS and (addr, 3) not in self.relocated:
+                # jump to a numeric address: it can't be remapped
+                return False
+
+            state = self.states[addr]
+            after = self._transfer(addr, instruction, state)
+            for successor in self._successors(addr, instruction, state):
+                before = self.states.get(successor)
+                merged = after if before is None else _meet(before, after)
+                if merged != before:
+                    self.states[successor] = merged
+                    work.append(successor)
+
+        return True
+
+    def _reachable(self) -> Iterator[tuple[int, DecodedInstruction, State]]:
+        for addr, state in sorted(self.states.items()):
+            instruction = self.decoded.get(addr)
+            if instruction is not None and self.words[addr] is not None:
+                yield addr, instruction, state
+
+    def _zero_register(self, state: State) -> Optional[int]:
+        return next((reg for reg, value in enumerate(state) if value == 0), None)
+
+    def fold(self) -> None:
+        """Folds branches & ALU instructions with known results, removes unreachable code."""
+        for addr in range(len(self.words)):
+            if addr not in self.states and not self.is_data[addr]:
+                self.words[addr] = None
+
+        for addr, instruction, state in list(self._reachable()):
+            op = instruction.op
+            if op in BRANCH_OPS:
+                match self._outcome(instruction, state):
+                    case True:
+                        a = instruction.a
+                        self.words[addr] = [Op.BEQ.value.code, a, a, instruction.c]
+                    case False:
+                        self.words[addr] = None
+                continue
+
+            if op not in CALC_OPS:
+                continue
+
+            value = self._result(addr, instruction, state)
+            if value is None:
+                continue
+            if value == state[instruction.a]:
+                self.words[addr] = None
+                continue
+
+            zero = self._zero_register(state)
+            self_zeroing = op in (Op.XOR, Op.SUB) and instruction.b == instruction.c
+            if zero is None or self_zeroing:
+                continue
+
+            imm = value.addr if isinstance(value, Address) else value
+            self.words[addr] = [Op.ADDI.value.code, instruction.a, zero, imm]
+            if isinstance(value, Address):
+                self.relocated.add((addr, 3))
+            else:
+                self.relocated.discard((addr, 3))
+
+    def _next_word(self, addr: int) -> int:
+        """Returns address of the first kept word starting from `addr`."""
+        while 0 <= addr < len(self.words) and self.words[addr] is None:
+            addr += 1
+        return addr
+
+    def _current(self, addr: int) -> Optional[DecodedInstruction]:
+        word = self.words[addr]
+        if word is None:
+            return None
+        instruction, err = decode_word(word)
+        return instruction if err is None else None
+
+    def _liveness(self) -> dict[int, int]:
+        """Returns registers (bit mask) live after every reachable instruction."""
+        reachable = [addr for addr, _, _ in self._reachable()]
+        live_in = {addr: 0 for addr in reachable}
+        live_out = {addr: 0 for addr in reachable}
+
+        changed = True
+        while changed:
+            changed = False
+            for addr in reversed(reachable):
+                instruction = self._current(addr)
+                if instruction is None:
+                    continue
+
+                out = 0
+                for successor in self._current_successors(addr, instruction):
+                    out |= live_in.get(successor, _ALL_REGISTERS)
+
+                used, defined = _uses(instruction), _defines(instruction)
+                live = used | (out & ~defined)
+                if live_in[addr] != live or live_out[addr] != out:
+                    live_in[addr] = live
+                    live_out[addr] = out
+                    changed = True
+
+        return live_out
+
+    def _current_successors(self, addr: int, instruction: DecodedInstruction) -> list[int]:
+        """Returns successors of the kept instruction (-1 - control leaves analysed code)."""
+        op = instruction.op
+        if op == HALT_OP:
+            return []
+
+        successors = [self._next_word(addr + 1)]
+        if op in BRANCH_OPS:
+            target = self._next_word(instruction.c)
+            if instruction.a != instruction.b:
+                successors.append(target)
+            elif op in _REFLEXIVE_BRANCH_OPS:
+                successors = [target]
+
+        return [successor if successor in self.states else -1 for successor in successors]
+
+    def remove_dead_stores(self) -> None:
+        """Removes ALU instructions whose results are never read."""
+        removed = True
+        while removed:
+            removed = False
+            live_out = self._liveness()
+            for addr, out in live_out.items():
+                instruction = self._current(addr)
+                if instruction is None or instruction.op not in CALC_OPS:
+                    continue
+                if not out & (1 << instruction.a):
+                    self.words[addr] = None
+                    removed = True
+
+    def _jump_target(self, addr: int) -> Optional[int]:
+        """Returns target of always taken branch at `addr` (None if it isn't one)."""
+        instruction = self._current(addr) if 0 <= addr < len(self.words) else None
+        if instruction is None or instruction.op not in _REFLEXIVE_BRANCH_OPS:
+            return None
+        return instruction.c if instruction.a == instruction.b else None
+
+    def thread_jumps(self) -> None:
+        """Threads branches through always taken branches, removes branches to the next word."""
+        removed = True
+        while removed:
+            removed = False
+            for addr, _, _ in list(self._reachable()):
+                instruction = self._current(addr)
+                if instruction is None or instruction.op not in BRANCH_OPS:
+                    continue
+
+                target = self._next_word(instruction.c)
+                visited = {addr}
+                while target not in visited:
+                    visited.add(target)
+                    next_target = self._jump_target(target)
+                    if next_target is None:
+                        break
+                    target = self._next_word(next_target)
+
+                if target == self._next_word(addr + 1):
+                    self.words[addr] = None
+                    removed = True
+                elif target != instruction.c:
+                    word = self.words[addr]
+                    assert word is not None
+                    self.words[addr] = word[:3] + [target]
+
+    def result(self) -> ObjectFile:
+        """Returns optimized object (addresses are remapped)."""
+        remap = []
+        new_addr = 0
+        for word in self.words:
+            remap.append(new_addr)
+            if word is not None:
+                new_addr += 1
+        remap.append(new_addr)
+
+        program: Program = []
+        relocations: list[Relocation] = []
+        for addr, word in enumerate(self.words):
+            if word is None:
+                continue
+
+            indexes = [index for index in range(1, len(word)) if (addr, index) in self.relocated]
+            if indexes:
+                word = word.copy()
+                for index in indexes:
+                    if 0 <= word[index] < len(remap):
+                        word[index] = remap[word[index]]
+                    relocations.append((len(program), index))
+            program.append(word)
+
+        symbols = {
+            label: remap[addr] if 0 <= addr < len(remap) else addr
+            for label, addr in self.obj.symbols.items()
+        }
+        data = [(remap[start], remap[end]) for start, end in self.obj.data]
+        removed = len(self.words) - len(program)
+        kept: list[Optional[int]] = [
+            addr for addr, word in enumerate(self.words) if word is not None
+        ]
+
+        # removed words are replaced by zero data words at the end, the program isn't shrunk:
+        # default memory capacity is a multiple of its size (see `make_control_unit()`)
+        if removed:
+            data.append((len(program), len(self.words)))
+            program += [[0] for _ in range(removed)]
+
+        return ObjectFile(
+            program,
+            symbols,
+            relocations,
+            [],
+            data,
+            self.obj.instruction_count - removed,
+            self.obj.files,
+            remap_source_map(self.obj.source_map, kept),
+            self.obj.exports,
+        )
+
+
+def _uses(instruction: DecodedInstruction) -> int:
+    """Returns registers (bit mask) the instruction reads."""
+    op = instruction.op
+    if op in CALC_RRI_OPS:
+        return 1 << instruction.b
+    if op in CALC_OPS:
+        if op in (Op.XOR, Op.SUB) and instruction.b == instruction.c:
+            return 0
+        return (1 << instruction.b) | (1 << instruction.c)
+    if op in BRANCH_OPS and instruction.a == instruction.b:
+        return 0
+    if op in BRANCH_OPS or op == Op.ST:
+        return (1 << instruction.a) | (1 << instruction.b)
+    if op == Op.LD:
+        return 1 << instruction.b
+    if op == Op.OUT:
+        return 1 << instruction.a
+    return 0
+
+
+def _defines(instruction: DecodedInstruction) -> int:
+    """Returns registers (bit mask) the instruction writes."""
+    if instruction.op in CALC_OPS or instruction.op in (Op.LD, Op.IN):
+        return 1 << instruction.a
+    return 0
+
+
+def optimize(obj: ObjectFile) -> ObjectFile:
+    """
+    Optimizes merged object (see `Optimizer`).
+
+    Object is returned as is if its control flow can't be analysed
+    (e.g. branch target is a number rather than a label).
+    """
+    optimizer = Optimizer(obj)
+    if obj.imports or START_LABEL not in obj.symbols or not optimizer.analyze():
+        return obj
+
+    optimizer.fold()
+    optimizer.remove_dead_stores()
+    optimizer.thread_jumps()
+
+    return optimizer.result()
@@ -1,10 +1,11 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from enum import Enum
 
 
 class TokenType(Enum):
     """Type of lexed token."""
     LABEL = 'Label'
+    LABEL_EXPORT = 'Exported label'
     LITERAL_STRING = 'String literal'
     LITERAL_NUMBER = 'Number literal'
     INSTRUCTION = 'Instruction'
@@ -15,8 +16,10 @@ class TokenType(Enum):
     ERROR = 'Error'
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Token:
     """Lexed token."""
     value: str
     type: TokenType
+    # Position of the token in the text (not compared)
+    position: int = field(default=0, compare=False)
@@ -1,22 +1,28 @@
 from dataclasses import dataclass
-from typing import Callable, Optional
+from typing import Callable, Iterable, Iterator, Optional
 
 from drum.common.arch import (
     START_LABEL,
     ArgsType,
     Argument,
     Command,
+    DataRange,
     DataWord,
     Executable,
+    Fixup,
+    ObjectFile,
     Op,
     Program,
     Register,
+    Relocation,
+    SourceMapEntry,
 )
+from drum.common.debug import line_column, line_starts
+from drum.compiler.linker import DUMMY_OBJECT, link
 from drum.compiler.tokens import Token, TokenType
-from drum.util.error import Result
+from drum.util.error import Error, Result
 
 RawCommand = list[int | str]
-RawProgram = list[RawCommand | DataWord]
 
 
 @dataclass
@@ -30,75 +36,71 @@ DUMMY_EXECUTABLE = Executable(0, [])
 DUMMY_TRANSLATION_RESULT = TranslationResult(DUMMY_EXECUTABLE, 0)
 
 
-def resolve_labels_in_command(
-    raw_command: RawCommand,
-    labels: dict[str, int],
-) -> Result[Command]:
-    """Returns command with resolved label references."""
-    command = []
-
-    for line in raw_command:
-        if isinstance(line, int):
-            command.append(line)
-            continue
-
-        if line not in labels.keys():
-            return [], f'undefined label: {line}'
-
-        command.append(labels[line])
-
-    return command, None
-
-
-def resolve_labels_in_program(raw: RawProgram, labels: dict[str, int]) -> Result[Program]:
-    """Resolves all label references in raw program - and returns the resulting one."""
-    program: Program = []
-
-    for word in raw:
-        if len(word) == 1:
-            program.append(word)  # type: ignore
-        else:
-            command, error = resolve_labels_in_command(word, labels)  # type: ignore
-            if error is not None:
-                return program, error
-            program.append(command)
-
-    return program, None
+def _add_data(data: list[DataRange], start: int, end: int) -> None:
+    """Adds literal words (adjacent literals are joined into a single range)."""
+    if data and data[-1][1] == start:
+        data[-1] = (data[-1][0], end)
+    else:
+        data.append((start, end))
 
 
 class Translator:
-    """Token to code translator."""
-
-    pos: int
-    tokens: list[Token]
-
-    def __init__(self, tokens: list[Token]) -> None:
-        self.tokens = tokens
-        self.pos = 0
+    """
+    Token to code translator.
+
+    Tokens are pulled from the iterable one by one (with a single token lookahead),
+    so it could be a lexer generator. Labels that are referenced before being defined
+    are patched at the end (see `Fixup`), the ones that aren't defined at all
+    are left to the linker. Labels are local to the object, except for the ones defined
+    with `::` and `_start` (see `ObjectFile.exports`).
+
+    If the source `text` is provided, source map of the words is built (token positions
+    are resolved into lines & columns of `file`).
+    """
+
+    # Tokens
+    tokens: Iterator[Token]
+    # Token, returned by `peek()` (None - not peeked)
+    lookahead: Optional[Token]
+    # Lexer error (error token terminates token stream)
+    lexer_error: Error
+    # Positions of the source lines (None - source map isn't built)
+    lines: Optional[list[int]]
+    # Source file name
+    file: str
+
+    def __init__(self, tokens: Iterable[Token], text: Optional[str] = None, file: str = '') -> None:
+        self.tokens = iter(tokens)
+        self.lookahead = None
+        self.lexer_error = None
+        self.lines = line_starts(text) if text is not None else None
+        self.file = file
 
     def next(self) -> Optional[Token]:
         """Goes to the next token, returns current."""
-        if self.pos >= len(self.tokens):
-            self.position = len(self.tokens) + 1
+        if self.lookahead is not None:
+            peeked = self.lookahead
+            self.lookahead = None
+            return peeked
+
+        token = next(self.tokens, None)
+        if token is not None and token.type == TokenType.ERROR:
+            self.lexer_error = token.value
+            self.tokens = iter(())
             return None
 
-        value = self.tokens[self.pos]
-        self.pos += 1
-        return value
-
-    def go_back(self) -> None:
-        """Goes back by one token."""
-        self.pos -= 1
-
-    def is_end(self) -> bool:
-        """Checks if more tokens are available."""
-        return self.pos < len(self.tokens)
+        return token
 
     def peek(self) -> Optional[Token]:
         """Returns the next token without consumption."""
-        value = self.next()
-        self.go_back()
-        return value
+        if self.lookahead is None:
+            self.lookahead = self.next()
+        return self.lookahead
+
+    def drain(self) -> None:
+        """Consumes the rest of tokens (so that lexer error is found, if there is one)."""
+        while self.next() is not None:
+            pass
 
     def translate_register_argument(self) -> Result[Argument]:
         """Translates register argument."""
@@ -221,66 +223,105 @@ class Translator:
 
         return token.value, None
 
-    def translate(self) -> Result[TranslationResult]:
-        """Returns a program translated from a token list and a program start."""
-        raw_program: RawProgram = []
+    def translate_object(self) -> Result[ObjectFile]:
+        """Returns a relocatable object translated from tokens."""
+        program: Program = []
+        fixups: list[Fixup] = []
+        relocations: list[Relocation] = []
+        data: list[DataRange] = []
 
         labels: dict[str, int] = dict()
-        start = 0
+        exports: list[str] = []
+        source_map: list[SourceMapEntry] = []
 
         instruction_count = 0
 
-        while self.pos < len(self.tokens):
+        while True:
             token = self.peek()
             if token is None:
-                return DUMMY_TRANSLATION_RESULT, 'programming error: unexpected end of tokens'
+                break
+
+            is_label = token.type in (TokenType.LABEL, TokenType.LABEL_EXPORT)
+            if self.lines is not None and not is_label:
+                line, column = line_column(self.lines, token.position)
+                source_map.append((len(program), 0, line, column))
 
             match token.type:
                 case TokenType.INSTRUCTION:
-                    command, error = self.translate_command()
+                    raw_command, error = self.translate_command()
                     if error is not None:
-                        return DUMMY_TRANSLATION_RESULT, f'command parse error: {error}'
-                    raw_program.append(command)
+                        return DUMMY_OBJECT, f'command parse error: {error}'
+
+                    command: Command = []
+                    for index, arg in enumerate(raw_command):
+                        if isinstance(arg, str):
+                            if arg in labels:
+                                relocations.append((len(program), index))
+                            else:
+                                fixups.append((len(program), index, arg))
+                            arg = labels.get(arg, 0)
+                        command.append(arg)
+
+                    program.append(command)
                     instruction_count += 1
-                case TokenType.LABEL:
+                case TokenType.LABEL | TokenType.LABEL_EXPORT:
                     label, error = self.translate_label()
                     if error is not None:
-                        return DUMMY_TRANSLATION_RESULT, error
+                        return DUMMY_OBJECT, error
 
                     if label in labels.keys():
-                        return DUMMY_TRANSLATION_RESULT, f'label redefenition: {label}'
+                        return DUMMY_OBJECT, f'label redefinition: {label}'
 
-                    labels[label] = len(raw_program)
-
-                    if label == START_LABEL:
-                        start = labels[label]
+                    labels[label] = len(program)
+                    if token.type == TokenType.LABEL_EXPORT or label == START_LABEL:
+                        exports.append(label)
                 case TokenType.LITERAL_STRING:
                     string, error = self.translate_string_literal()
                     if error is not None:
-                        return DUMMY_TRANSLATION_RESULT, error
+                        return DUMMY_OBJECT, error
 
-                    raw_program.extend(string)
+                    _add_data(data, len(program), len(program) + len(string))
+                    program.extend(string)
                 case TokenType.LITERAL_NUMBER:
                     number, error = self.translate_number_literal()
                     if error is not None:
-                        return DUMMY_TRANSLATION_RESULT, error
+                        return DUMMY_OBJECT, error
 
-                    raw_program.append(number)
+                    _add_data(data, len(program), len(program) + 1)
+                    program.append(number)
                 case _:
-                    return DUMMY_TRANSLATION_RESULT, f'unexpected token on a top-level: {token}'
-
-        if START_LABEL not in labels.keys():
-            return DUMMY_TRANSLATION_RESULT, f'start label ({START_LABEL}) not found'
+                    return DUMMY_OBJECT, f'unexpected token on a top-level: {token}'
+
+        # forward references to local labels are patched, the rest are imports
+        imports: list[Fixup] = []
+        for addr, index, label in fixups:
+            if label in labels:
+                program[addr][index] = labels[label]
+                relocations.append((addr, index))
+            else:
+                imports.append((addr, index, label))
+
+        files = [self.file] if self.lines is not None else []
+        return ObjectFile(
+            program,
+            labels,
+            relocations,
+            imports,
+            data,
+            instruction_count,
+            files,
+            source_map,
+            exports,
+        ), None
 
-        program, error = resolve_labels_in_program(raw_program, labels)
+    def translate(self) -> Result[TranslationResult]:
+        """Returns a program translated from tokens (a single object, linked)."""
+        obj, error = self.translate_object()
+        if error is not None:
+            return DUMMY_TRANSLATION_RESULT, error
 
+        exe, error = link([obj])
         if error is not None:
-            return DUMMY_TRANSLATION_RESULT, f'label resolution error: {error}'
-
-        return (
-            TranslationResult(
-                Executable(start, program),
-                instruction_count,
-            ),
-            None,
-        )
+            return DUMMY_TRANSLATION_RESULT, error
+
+        return TranslationResult(exe, obj.instruction_count), None
@@ -0,0 +1,199 @@
+import marshal
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from types import CodeType
+from typing import Iterable, Iterator, Optional
+
+from drum.common.arch import Executable
+from drum.machine.blocks import compile_blocks
+from drum.machine.io import OutputFormat
+from drum.machine.machine import (
+    ControlUnit,
+    ExecutionMode,
+    Limits,
+    MachineSnapshot,
+    code_modified,
+    make_control_unit,
+    run_untraced,
+)
+from drum.machine.memory import DEFAULT_COMPACT_WORD_BITS, MemoryKind
+from drum.machine.port import EofPolicy, InputPort, OutputPort, open_input_port
+from drum.util.error import Error
+
+
+@dataclass(frozen=True)
+class BatchOptions:
+    """Machine options, shared by all runs of a batch."""
+    output_format: OutputFormat = OutputFormat.STR
+    mode: ExecutionMode = ExecutionMode.DECODED
+    memory_kind: MemoryKind = MemoryKind.LIST
+    word_bits: Optional[int] = None
+    memory_capacity: Optional[int] = None
+    eof_policy: EofPolicy = EofPolicy.VALUE
+    eof_value: int = 0
+    strip_input: bool = True
+    # Run the input-independent prefix once, start every input from its snapshot
+    snapshot: bool = False
+    # Limits of every run (counters include the prefix, see `Limits`)
+    limits: Optional[Limits] = None
+
+
+@dataclass(frozen=True)
+class BatchResult:
+    """Result of the program run on a single input."""
+    input_file: str
+    output: str
+    instructions: int
+    ticks: int
+    # Error that stopped the machine (or prevented the run)
+    error: Error
+    # Limit that stopped the machine (see `LimitKind`), None - it wasn't stopped by a limit
+    limit: Optional[str] = None
+
+
+@dataclass
+class _BatchWorker:
+    """Per-process state: the program is loaded once and reused for every input."""
+    exe: Executable
+    options: BatchOptions
+    # Compiled blocks (block mode only)
+    blocks_code: Optional[CodeType]
+    # State right before the first `IN` (see `run_prefix()`)
+    snapshot: Optional[MachineSnapshot]
+
+
+# State of the current worker process (see `_init_worker()`)
+_worker: Optional[_BatchWorker] = None
+
+
+def _init_worker(
+    exe: Executable,
+    options: BatchOptions,
+    blocks: Optional[bytes],
+    snapshot: Optional[MachineSnapshot],
+) -> None:
+    global _worker
+    blocks_code = marshal.loads(blocks) if blocks is not None else None
+    _worker = _BatchWorker(exe, options, blocks_code, snapshot)
+
+
+def _make_control_unit(
+    exe: Executable,
+    options: BatchOptions,
+    input_port: InputPort,
+    output_port: OutputPort,
+) -> ControlUnit:
+    return make_control_unit(
+        exe.program,
+        exe.start,
+        input_port,
+        output_port=output_port,
+        memory_kind=options.memory_kind,
+        word_bits=options.word_bits,
+        memory_capacity=options.memory_capacity,
+    )
+
+
+def run_prefix(
+    exe: Executable,
+    options: BatchOptions,
+    blocks_code: Optional[CodeType] = None,
+) -> MachineSnapshot:
+    """
+    Runs the program until the first `IN` and returns machine state at that point.
+
+    Execution is stopped by an input fault (input is empty), which happens before
+    `IN` is executed. If the program stops earlier (halt, fault), the state right before
+    the stop is returned: resuming from it repeats the stop.
+    """
+    control_unit = _make_control_unit(
+        exe,
+        options,
+        InputPort(eof_policy=EofPolicy.FAULT),
+        OutputPort(options.output_format),
+    )
+    run_untraced(control_unit, options.mode, blocks_code, options.limits)
+    return control_unit.snapshot()
+
+
+def _run_input(input_file: str) -> BatchResult:
+    """Runs the worker program on a single input."""
+    assert _worker is not None
+    options = _worker.options
+
+    try:
+        input_port = open_input_port(
+            input_file,
+            options.eof_policy,
+            options.eof_value,
+            strip=options.strip_input,
+        )
+    except OSError as e:
+        return BatchResult(input_file, '', 0, 0, f'failed to open input: {e}')
+
+    output_port = OutputPort(options.output_format)
+    control_unit = _make_control_unit(_worker.exe, options, input_port, output_port)
+    if _worker.snapshot is not None:
+        control_unit.restore(_worker.snapshot)
+
+    run_untraced(control_unit, options.mode, _worker.blocks_code, options.limits)
+
+    input_port.close()
+    output_port.close()
+
+    return BatchResult(
+        input_file,
+        output_port.getvalue(),
+        control_unit.counter(),
+        control_unit.tick(),
+        control_unit.error,
+        control_unit.limit.value if control_unit.limit is not None else None,
+    )
+
+
+def run_batch(
+    exe: Executable,
+    input_files: Iterable[str],
+    options: BatchOptions = BatchOptions(),
+    workers: Optional[int] = None,
+    chunk_size: int = 1,
+    cache_dir: Optional[str] = None,
+) -> Iterator[BatchResult]:
+    """
+    Runs the program on every input. Yields results in the order of inputs.
+
+    Inputs are distributed over a pool of `workers` processes (CPU count by default)
+    by chunks of `chunk_size` inputs. The program is sent to every worker once;
+    in block mode it's compiled once (in the calling process). With a single worker
+    inputs are run in the calling process.
+
+    With `options.snapshot` the input-independent prefix (see `run_prefix()`) is run once,
+    every input is resumed from its snapshot.
+    """
+    blocks_code = None
+    if options.mode == ExecutionMode.BLOCKS:
+        word_bits = options.word_bits
+        if options.memory_kind == MemoryKind.COMPACT and word_bits is None:
+            word_bits = DEFAULT_COMPACT_WORD_BITS
+        blocks_code = compile_blocks(exe.program, exe.start, word_bits, cache_dir)
+
+    snapshot = None
+    if options.snapshot:
+        snapshot = run_prefix(exe, options, blocks_code)
+        if code_modified(exe.program, snapshot):
+            # the rest is run from the pre-decoded table
+            blocks_code = None
+
+    blocks = marshal.dumps(blocks_code) if blocks_code is not None else None
+
+    if workers == 1:
+        _init_worker(exe, options, blocks, snapshot)
+        yield from map(_run_input, input_files)
+        return
+
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_worker,
+        initargs=(exe, options, blocks, snapshot),
+    ) as executor:
+        yield from executor.map(_run_input, input_files, chunksize=chunk_size)
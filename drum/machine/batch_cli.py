@@ -0,0 +1,213 @@
+from argparse import ArgumentParser
+from dataclasses import asdict
+from json import dumps
+from typing import Iterator, Optional
+
+from drum.common.io import read_compiled
+from drum.machine.batch import BatchOptions, run_batch
+from drum.machine.io import OutputFormat
+from drum.machine.machine import ExecutionMode, Limits
+from drum.machine.memory import WORD_TYPECODES, MemoryKind
+from drum.machine.port import EofPolicy
+from drum.util.cache import default_cache_dir
+from drum.util.io import eprint
+
+# `drumr.py` subcommand that runs batch
+BATCH_COMMAND = 'batch'
+
+
+def get_parser() -> ArgumentParser:
+    parser = ArgumentParser(
+        prog=f'drumr.py {BATCH_COMMAND}',
+        description='Runs program on many inputs. Prints a JSON line per input',
+    )
+
+    parser.add_argument(
+        'compiled_file',
+        type=str,
+        help='Compiled (.drc) file',
+    )
+    parser.add_argument(
+        'input_files',
+        type=str,
+        nargs='*',
+        help='Input data files',
+    )
+    parser.add_argument(
+        '--input-list',
+        type=str,
+        default=None,
+        help='File with input file names (one per line)',
+    )
+    parser.add_argument(
+        '-j',
+        '--workers',
+        type=int,
+        default=None,
+        help='Number of worker processes, CPU count by default',
+    )
+    parser.add_argument(
+        '--chunk-size',
+        type=int,
+        default=16,
+        help='Number of inputs sent to a worker at once',
+    )
+    parser.add_argument(
+        '-O',
+        '--output-format',
+        type=str,
+        choices=[of.value.alias for of in OutputFormat],
+        default=OutputFormat.STR.value.alias,
+        help='Output data format',
+    )
+    parser.add_argument(
+        '-M',
+        '--mode',
+        type=str,
+        choices=[mode.value for mode in ExecutionMode],
+        default=ExecutionMode.DECODED.value,
+        help='Execution mode',
+    )
+    parser.add_argument(
+        '--cache-dir',
+        type=str,
+        default=default_cache_dir(),
+        help='Directory to cache compiled blocks in',
+    )
+    parser.add_argument(
+        '--memory',
+        type=str,
+        choices=[kind.value for kind in MemoryKind],
+        default=MemoryKind.LIST.value,
+        help='Memory representation',
+    )
+    parser.add_argument(
+        '--word-bits',
+        type=int,
+        choices=list(WORD_TYPECODES.keys()),
+        default=None,
+        help='Fixed word width (values wrap around), unbounded by default',
+    )
+    parser.add_argument(
+        '--memory-capacity',
+        type=int,
+        default=None,
+        help='Memory capacity (words), 5 program sizes by default',
+    )
+    parser.add_argument(
+        '--eof',
+        type=str,
+        choices=[policy.value for policy in EofPolicy],
+        default=EofPolicy.VALUE.value,
+        help='What IN does after the end of input: read EOF value or fault',
+    )
+    parser.add_argument(
+        '--eof-value',
+        type=int,
+        default=0,
+        help='Value IN reads after the end of input',
+    )
+    parser.add_argument(
+        '--max-instructions',
+        type=int,
+        default=None,
+        help='Stop the machine after that many instructions',
+    )
+    parser.add_argument(
+        '--max-ticks',
+        type=int,
+        default=None,
+        help='Stop the machine after that many ticks',
+    )
+    parser.add_argument(
+        '--timeout',
+        type=float,
+        default=None,
+        help='Stop the machine after that many seconds (wall-clock)',
+    )
+    parser.add_argument(
+        '--raw-input',
+        action='store_true',
+        help="Don't strip whitespace around input",
+    )
+    parser.add_argument(
+        '--snapshot',
+        action='store_true',
+        help='Run the program until the first IN once, start every input from there',
+    )
+
+    return parser
+
+
+def _read_input_list(file: str) -> Iterator[str]:
+    with open(file, 'r', encoding='utf-8') as f:
+        for line in f:
+            name = line.strip()
+            if name:
+                yield name
+
+
+def cli(argv: Optional[list[str]] = None) -> None:
+    parser = get_parser()
+
+    args = parser.parse_args(argv)
+
+    output_format, err = OutputFormat.get_by_alias(args.output_format)
+    if err is not None:
+        eprint('invalid output format')
+        return
+
+    mode, err = ExecutionMode.get_by_alias(args.mode)
+    if err is not None:
+        eprint('invalid execution mode')
+        return
+
+    memory_kind, err = MemoryKind.get_by_alias(args.memory)
+    if err is not None:
+        eprint('invalid memory kind')
+        return
+
+    eof_policy, err = EofPolicy.get_by_alias(args.eof)
+    if err is not None:
+        eprint('invalid EOF policy')
+        return
+
+    exe = read_compiled(args.compiled_file)
+
+    if args.memory_capacity is not None and args.memory_capacity < len(exe.program):
+        eprint(
+            f'memory capacity ({args.memory_capacity}) '
+            f'is less than program size ({len(exe.program)})',
+        )
+        return
+
+    input_files = list(args.input_files)
+    if args.input_list is not None:
+        input_files += _read_input_list(args.input_list)
+
+    options = BatchOptions(
+        output_format=output_format,
+        mode=mode,
+        memory_kind=memory_kind,
+        word_bits=args.word_bits,
+        memory_capacity=args.memory_capacity,
+        eof_policy=eof_policy,
+        eof_value=args.eof_value,
+        strip_input=not args.raw_input,
+        snapshot=args.snapshot,
+        limits=Limits(args.max_instructions, args.max_ticks, args.timeout),
+    )
+
+    for result in run_batch(
+        exe,
+        input_files,
+        options,
+        workers=args.workers,
+        chunk_size=args.chunk_size,
+        cache_dir=args.cache_dir,
+    ):
+        print(dumps(asdict(result)), flush=True)
+
+
+if __name__ == '__main__':
+    cli()
@@ -0,0 +1,366 @@
+import marshal
+import os
+from importlib.util import MAGIC_NUMBER
+from json import dumps
+from logging import getLogger
+from types import CodeType
+from typing import TYPE_CHECKING, Callable, Optional
+
+from drum.common.arch import BRANCH_OPS, CALC_RRI_OPS, CALC_RRR_OPS, HALT_OP, Op, Program
+from drum.machine.decode import DecodedInstruction, decode_program
+from drum.machine.memory import wrap_expression
+from drum.util.cache import DEFAULT_CACHE_SIZE, hash_key, read_cached, write_cached
+from drum.util.error import Result
+
+if TYPE_CHECKING:
+    from drum.machine.machine import ControlUnit, Watchdog
+
+logger = getLogger('machine')
+
+# Bump whenever generated code changes, so stale cache entries are ignored
+CODEGEN_VERSION = 6
+
+# Compiled block. Executes the block and returns the next one
+# (None - leave the block tier, continue with pre-decoded execution).
+Block = Callable[[], Optional['Block']]
+
+ALU_EXPRESSIONS = {
+    Op.ADD: '{} + {}',
+    Op.ADDI: '{} + {}',
+    Op.SUB: '{} - {}',
+    Op.SUBI: '{} - {}',
+    Op.SHR: '{} >> {}',
+    Op.SHRI: '{} >> {}',
+    Op.XOR: '{} ^ {}',
+    Op.XORI: '{} ^ {}',
+}
+
+BRANCH_EXPRESSIONS = {
+    Op.BEQ: '{} == {}',
+    Op.BNE: '{} != {}',
+    Op.BLT: '{} < {}',
+    Op.BLE: '{} <= {}',
+    Op.BGT: '{} > {}',
+    Op.BGE: '{} >= {}',
+}
+
+# Ticks spent on each op (should be in sync with ControlUnit)
+OP_TICKS = {op: 1 for op in Op} | {Op.LD: 2, Op.ST: 2, Op.HLT: 0}
+
+
+def find_leaders(decoded: list[Result[DecodedInstruction]], start: int) -> list[int]:
+    """
+    Returns sorted basic block leaders.
+
+    Leaders are: program start, branch targets and instructions right after branches
+    (unless the branch is always taken: what follows it is either a leader anyway or data).
+    The ISA has no indirect jumps, so this set is complete (unless code modifies itself).
+    """
+    leaders = {start}
+
+    for addr, (instr, err) in enumerate(decoded):
+        if err is not None or instr.op not in BRANCH_OPS:
+            continue
+        leaders.add(instr.c)
+        if instr.a != instr.b or instr.op not in (Op.BEQ, Op.BLE, Op.BGE):
+            leaders.add(addr + 1)
+
+    return sorted(addr for addr in leaders if 0 <= addr < len(decoded))
+
+
+def _reg(index: int) -> str:
+    return f'r{index}'
+
+
+class _BlockWriter:
+    """Generates source code of a single block function."""
+
+    lines: list[str]
+    reads: set[int]
+    writes: set[int]
+    counter: int
+    tick: int
+
+    def __init__(self) -> None:
+        self.lines = []
+        self.reads = set()
+        self.writes = set()
+        self.counter = 0
+        self.tick = 0
+
+    def use(self, index: int) -> str:
+        if index not in self.writes:
+            self.reads.add(index)
+        return _reg(index)
+
+    def define(self, index: int) -> str:
+        self.writes.add(index)
+        return _reg(index)
+
+    def emit(self, line: str) -> None:
+        self.lines.append(line)
+
+    def exit(
+        self,
+        ip: str,
+        next_block: str,
+        indent: str = '',
+        counter: Optional[int] = None,
+        tick: Optional[int] = None,
+    ) -> None:
+        """Emits block exit: syncs registers & counters, moves IP."""
+        for index in sorted(self.writes):
+            self.emit(f'{indent}r[{index}] = {_reg(index)}')
+        self.emit(f'{indent}cu._counter += {self.counter if counter is None else counter}')
+        self.emit(f'{indent}cu._tick += {self.tick if tick is None else tick}')
+        self.emit(f'{indent}cu.instruction_pointer = {ip}')
+        self.emit(f'{indent}return {next_block}')
+
+    def source(self, name: str) -> list[str]:
+        prologue = [f'    {_reg(index)} = r[{index}]' for index in sorted(self.reads)]
+        body = [f'    {line}' for line in self.lines]
+        return [f'  def {name}():'] + [f'  {line}' for line in prologue + body]
+
+
+def _block_name(addr: int) -> str:
+    return f'b{addr}'
+
+
+def generate_source(program: Program, start: int, word_bits: Optional[int] = None) -> str:
+    """
+    Generates Python source of the block compiler output.
+
+    The source defines `make(cu)`, which returns dict (leader address -> block function).
+    Registers are kept in locals inside a block, counters are updated once per block exit.
+    Stores into compiled code drop the modified block (see `run_blocks()`).
+    """
+
+    def alu(expr: str) -> str:
+        return wrap_expression(word_bits, expr) if word_bits is not None else expr
+
+    decoded = decode_program(program)
+    leaders = find_leaders(decoded, start)
+    leader_set = set(leaders)
+
+    def compilable(addr: int) -> bool:
+        if addr >= len(decoded):
+            return False
+        instr, err = decoded[addr]
+        return err is None and instr.op != HALT_OP
+
+    compiled = [addr for addr in leaders if compilable(addr)]
+    compiled_set = set(compiled)
+    # compiled address -> leader of the block it belongs to
+    owners: dict[int, int] = {}
+
+    def next_block(addr: int) -> str:
+        return _block_name(addr) if addr in compiled_set else 'None'
+
+    def fault_check(w: _BlockWriter, addr: int, op: Op) -> None:
+        # leave the block right before faulting instruction,
+        # so fault is reported by pre-decoded execution
+        w.emit('if not 0 <= a < cap:')
+        w.exit(str(addr), 'None', indent='  ', counter=w.counter - 1, tick=w.tick - OP_TICKS[op])
+
+    lines = [
+        'def make(cu):',
+        '  dp = cu.data_path',
+        '  r = dp.registers',
+        '  cap = dp.memory_capacity',
+        '  read = dp.memory.read',
+        '  write = dp.memory.write',
+        '  inp = dp.input_port.read',
+        '  in_fault = dp.input_port.fault_on_eof',
+        '  in_eof = dp.input_port.at_eof',
+        '  out = dp.output_port.write',
+        '  dirty = cu._dirty',
+    ]
+
+    for leader in compiled:
+        w = _BlockWriter()
+        addr = leader
+
+        while True:
+            instr, _ = decoded[addr]
+            op = instr.op
+            owners[addr] = leader
+
+            w.counter += 1
+            w.tick += OP_TICKS[op]
+
+            if op in CALC_RRR_OPS:
+                expr = ALU_EXPRESSIONS[op].format(w.use(instr.b), w.use(instr.c))
+                w.emit(f'{w.define(instr.a)} = {alu(expr)}')
+            elif op in CALC_RRI_OPS:
+                expr = ALU_EXPRESSIONS[op].format(w.use(instr.b), instr.c)
+                w.emit(f'{w.define(instr.a)} = {alu(expr)}')
+            elif op == Op.LD:
+                w.emit(f'a = {w.use(instr.b)}')
+                fault_check(w, addr, op)
+                w.emit('dp.data_address = a')
+                w.emit(f'{w.define(instr.a)} = read(a)')
+            elif op == Op.ST:
+                w.emit(f'a = {w.use(instr.b)}')
+                fault_check(w, addr, op)
+                w.emit('dp.data_address = a')
+                w.emit(f'write(a, {w.use(instr.a)})')
+                w.emit('if a < IMAGE:')
+                # the pre-decoded table is synced when the block tier is left
+                w.emit('  dirty.add(a)')
+                w.emit('  if a in OWNERS:')
+                # self-modifying code: drop the modified block & leave the (maybe stale) block
+                w.emit('    invalidate(a)')
+                w.exit(str(addr + 1), 'None', indent='    ')
+            elif op == Op.IN:
+                # leave the block before reading past the end of input (if it faults)
+                w.emit('if in_fault and in_eof():')
+                w.exit(str(addr), 'None', indent='  ', counter=w.counter - 1, tick=w.tick - 1)
+                w.emit(f'{w.define(instr.a)} = inp()')
+            elif op == Op.OUT:
+                w.emit(f'out({w.use(instr.a)} & 0xff)')
+            elif op in BRANCH_OPS:
+                # comparing register with itself - outcome is known in advance
+                if instr.a == instr.b and op in (Op.BEQ, Op.BLE, Op.BGE):
+                    w.emit('dp._zero = True')
+                    w.exit(str(instr.c), next_block(instr.c))
+                    break
+                if instr.a == instr.b:
+                    w.emit('dp._zero = False')
+                    w.exit(str(addr + 1), next_block(addr + 1))
+                    break
+
+                expr = BRANCH_EXPRESSIONS[op].format(w.use(instr.a), w.use(instr.b))
+                w.emit(f'dp._zero = z = {expr}')
+                w.emit('if z:')
+                w.exit(str(instr.c), next_block(instr.c), indent='  ')
+                w.exit(str(addr + 1), next_block(addr + 1))
+                break
+
+            addr += 1
+            if addr in leader_set or not compilable(addr):
+                w.exit(str(addr), next_block(addr))
+                break
+
+        lines += w.source(_block_name(leader))
+
+    lines += [
+        '  blocks = {' + ', '.join(f'{addr}: {_block_name(addr)}' for addr in compiled) + '}',
+        # blocks chain to each other through closure cells: clearing a cell unlinks the block
+        '  cells = {' + ', '.join(
+            f'{addr}: (lambda: {_block_name(addr)}).__closure__[0]' for addr in compiled
+        ) + '}',
+        '  def invalidate(a):',
+        '    leader = OWNERS.get(a)',
+        '    if leader in blocks:',
+        '      del blocks[leader]',
+        '      cells[leader].cell_contents = None',
+        '  cu._invalidate_blocks = invalidate',
+        '  return blocks',
+    ]
+    lines[:0] = [f'IMAGE = {len(program)}', f'OWNERS = {owners}']
+
+    return '\n'.join(lines) + '\n'
+
+
+def _cache_file(cache_dir: str, program: Program, start: int, word_bits: Optional[int]) -> str:
+    key = hash_key(
+        f'{CODEGEN_VERSION}'.encode(),
+        MAGIC_NUMBER,
+        dumps([start, word_bits, program]).encode(),
+    )
+    return os.path.join(cache_dir, 'blocks', f'{key}.bin')
+
+
+def compile_blocks(
+    program: Program,
+    start: int,
+    word_bits: Optional[int] = None,
+    cache_dir: Optional[str] = None,
+) -> CodeType:
+    """
+    Returns compiled code object of the generated blocks.
+
+    If `cache_dir` is provided, code objects are cached there (keyed by program hash),
+    so repeated runs of the same program skip code generation.
+    """
+    cache_file = None
+    if cache_dir is not None:
+        cache_file = _cache_file(cache_dir, program, start, word_bits)
+        cached = read_cached(cache_file)
+        if cached is not None:
+            try:
+                code = marshal.loads(cached)
+                if isinstance(code, CodeType):
+                    return code
+            except (EOFError, ValueError, TypeError):
+                logger.warning(f'corrupted block cache entry: {cache_file}')
+
+    code = compile(generate_source(program, start, word_bits), '<drum blocks>', 'exec')
+
+    if cache_file is not None:
+        try:
+            write_cached(cache_file, marshal.dumps(code), DEFAULT_CACHE_SIZE)
+        except OSError as e:
+            logger.warning(f'failed to write block cache entry: {e}')
+
+    return code
+
+
+def load_blocks(control_unit: 'ControlUnit', code: CodeType) -> dict[int, Block]:
+    """Instantiates compiled blocks for the control unit."""
+    namespace: dict[str, object] = {}
+    exec(code, namespace)
+    make: Callable[['ControlUnit'], dict[int, Block]] = namespace['make']  # type: ignore
+    return make(control_unit)
+
+
+def run_blocks(
+    control_unit: 'ControlUnit',
+    blocks: dict[int, Block],
+    watchdog: Optional['Watchdog'] = None,
+) -> None:
+    """
+    Executes program block by block until stop.
+
+    Whenever the block tier can't continue (halt, invalid instruction, jump outside
+    compiled code, fault or a dropped block), instructions are executed from the
+    pre-decoded table (see `ControlUnit.predecode()`) until a compiled block is reached again.
+
+    Stores into compiled code drop only the blocks they modify, the rest keep running
+    as compiled.
+
+    With `watchdog` limits are checked at the first block exit after every
+    `watchdog.steps()` instructions (returns with the machine stopped if one is exceeded).
+    """
+    step = control_unit.execute_decoded
+    if not control_unit._decoded:
+        control_unit.predecode()
+
+    # a block leaves the tier right before an instruction it can't execute (even if it's
+    # the block's own leader, e.g. a faulting load), so at least one step follows a chain
+    if watchdog is None:
+        while True:
+            block = blocks.get(control_unit.instruction_pointer)
+            while block is not None:
+                block = block()
+            if control_unit._dirty:
+                control_unit.sync_decoded()
+            if not step():
+                return
+
+    check_at = control_unit._counter + watchdog.steps()
+    while True:
+        block = blocks.get(control_unit.instruction_pointer)
+        while block is not None and control_unit._counter < check_at:
+            block = block()
+        if control_unit._dirty:
+            control_unit.sync_decoded()
+
+        if control_unit._counter >= check_at:
+            if not watchdog.check():
+                return
+            check_at = control_unit._counter + watchdog.steps()
+            # resume from the synced IP (an interrupted chain - from its next block)
+            continue
+        if not step():
+            return
@@ -0,0 +1,354 @@
+import os
+import signal
+import zlib
+from dataclasses import dataclass
+from struct import Struct
+from time import monotonic
+from types import FrameType
+from typing import Optional
+
+from drum.common.arch import REGISTER_COUNT, Executable
+from drum.common.profile import program_hash
+from drum.machine.machine import ControlUnit, MachineSnapshot
+from drum.machine.memory import MemoryKind, make_memory
+
+# Checkpoint file magic & format version
+CHECKPOINT_MAGIC = b'DRCK'
+CHECKPOINT_VERSION = 1
+
+# Header: magic, version (the rest of the file is a zlib-compressed body)
+CHECKPOINT_HEADER = Struct('<4sH')
+
+# Signal that makes the running machine write a checkpoint and continue
+CHECKPOINT_SIGNAL = getattr(signal, 'SIGUSR1', None)
+
+# Signal that makes the running machine write a checkpoint and stop (preemption)
+STOP_SIGNAL = signal.SIGTERM
+
+_MEMORY_KINDS = list(MemoryKind)
+
+
+@dataclass
+class Checkpoint:
+    """
+    Persistent machine state (see `write_checkpoint()`).
+
+    Memory is stored as data words that differ from the loaded program, so the machine
+    is restored by loading the program & replaying these writes (see `restore_snapshot()`).
+    """
+    # Identifies the program (see `program_hash()`)
+    program_hash: str
+    # Machine options the state depends on
+    memory_kind: MemoryKind
+    word_bits: Optional[int]
+    memory_capacity: int
+    # Data words that differ from the loaded program (address, value), sorted by address
+    writes: list[tuple[int, int]]
+    registers: list[int]
+    instruction_pointer: int
+    data_address: int
+    zero: bool
+    counter: int
+    tick: int
+    # Output that hasn't been formatted into the output sink yet
+    output: bytes
+    # Output written at the moment of the checkpoint: size of the output file, number of
+    # formatted bytes if output isn't seekable (None - unknown)
+    output_size: Optional[int]
+    # Number of input bytes read
+    input_position: int
+
+
+def make_checkpoint(
+    exe: Executable,
+    control_unit: ControlUnit,
+    memory_kind: MemoryKind,
+) -> Checkpoint:
+    """Captures machine state (the output file is flushed)."""
+    data_path = control_unit.data_path
+    memory = data_path.memory
+
+    writes = []
+    for addr in memory.addresses():
+        initial = exe.program[addr] if addr < len(exe.program) else [0]
+        if memory.word(addr) != initial:
+            writes.append((addr, memory.read(addr)))
+
+    output_port = data_path.output_port
+    sink = output_port.sink
+    if sink.seekable() and hasattr(sink, 'fileno'):
+        sink.flush()
+        output_size = sink.tell()
+    else:
+        output_size = output_port.written - len(output_port.encoder.pending())
+
+    return Checkpoint(
+        program_hash(exe),
+        memory_kind,
+        data_path.word_bits,
+        data_path.memory_capacity,
+        writes,
+        data_path.registers.copy(),
+        control_unit.instruction_pointer,
+        data_path.data_address,
+        data_path._zero,
+        control_unit.counter(),
+        control_unit.tick(),
+        output_port.unformatted(),
+        output_size,
+        data_path.input_port.consumed,
+    )
+
+
+def restore_snapshot(exe: Executable, checkpoint: Checkpoint) -> MachineSnapshot:
+    """Returns machine state of the checkpoint of the program (see `ControlUnit.restore()`)."""
+    memory = make_memory(
+        checkpoint.memory_kind,
+        checkpoint.memory_capacity,
+        exe.program,
+        checkpoint.word_bits,
+    )
+    for addr, value in checkpoint.writes:
+        memory.write(addr, value)
+
+    return MachineSnapshot(
+        memory=memory,
+        registers=checkpoint.registers.copy(),
+        instruction_pointer=checkpoint.instruction_pointer,
+        data_address=checkpoint.data_address,
+        zero=checkpoint.zero,
+        counter=checkpoint.counter,
+        tick=checkpoint.tick,
+        output=checkpoint.output,
+    )
+
+
+def _put(out: bytearray, value: int) -> None:
+    """Appends unsigned LEB128 number."""
+    while value >= 0x80:
+        out.append(value & 0x7f | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _put_signed(out: bytearray, value: int) -> None:
+    """Appends zigzag-encoded number (values are unbounded)."""
+    _put(out, value << 1 if value >= 0 else (-value << 1) - 1)
+
+
+def _put_bytes(out: bytearray, data: bytes) -> None:
+    _put(out, len(data))
+    out += data
+
+
+def encode_checkpoint(checkpoint: Checkpoint) -> bytes:
+    """
+    Encodes checkpoint into binary form.
+
+    Layout: header, zlib-compressed body of variable-length numbers (LEB128, signed ones
+    are zigzag-encoded): program hash, machine options, registers & pointers, output,
+    input position, memory writes (address deltas & values).
+    """
+    body = bytearray()
+    _put_bytes(body, checkpoint.program_hash.encode())
+    _put(body, _MEMORY_KINDS.index(checkpoint.memory_kind))
+    _put(body, checkpoint.word_bits or 0)
+    _put(body, checkpoint.memory_capacity)
+
+    for value in checkpoint.registers:
+        _put_signed(body, value)
+    _put(body, checkpoint.instruction_pointer)
+    _put_signed(body, checkpoint.data_address)
+    _put(body, checkpoint.zero)
+    _put(body, checkpoint.counter)
+    _put(body, checkpoint.tick)
+
+    _put_bytes(body, checkpoint.output)
+    _put(body, checkpoint.output_size + 1 if checkpoint.output_size is not None else 0)
+    _put(body, checkpoint.input_position)
+
+    _put(body, len(checkpoint.writes))
+    prev = 0
+    for addr, value in checkpoint.writes:
+        _put(body, addr - prev)
+        _put_signed(body, value)
+        prev = addr
+
+    return CHECKPOINT_HEADER.pack(CHECKPOINT_MAGIC, CHECKPOINT_VERSION) + zlib.compress(body)
+
+
+class _Reader:
+    """Reads numbers of checkpoint body (see `encode_checkpoint()`)."""
+    body: bytes
+    pos: int
+
+    def __init__(self, body: bytes) -> None:
+        self.body = body
+        self.pos = 0
+
+    def number(self) -> int:
+        value = shift = 0
+        while True:
+            byte = self.body[self.pos]
+            self.pos += 1
+            value |= (byte & 0x7f) << shift
+            shift += 7
+            if byte < 0x80:
+                return value
+
+    def signed(self) -> int:
+        value = self.number()
+        return value >> 1 if not value & 1 else -((value + 1) >> 1)
+
+    def raw(self) -> bytes:
+        size = self.number()
+        if self.pos + size > len(self.body):
+            raise IndexError()
+        data = self.body[self.pos:self.pos + size]
+        self.pos += size
+        return data
+
+
+def decode_checkpoint(data: bytes) -> Checkpoint:
+    """Decodes checkpoint (see `encode_checkpoint()`). ValueError if it's corrupted."""
+    if len(data) < CHECKPOINT_HEADER.size:
+        raise ValueError('not a checkpoint')
+    magic, version = CHECKPOINT_HEADER.unpack_from(data)
+    if magic != CHECKPOINT_MAGIC:
+        raise ValueError('not a checkpoint')
+    if version != CHECKPOINT_VERSION:
+        raise ValueError(f'unsupported checkpoint version {version}')
+
+    try:
+        r = _Reader(zlib.decompress(data[CHECKPOINT_HEADER.size:]))
+
+        hash_ = r.raw().decode()
+        memory_kind = _MEMORY_KINDS[r.number()]
+        word_bits = r.number() or None
+        memory_capacity = r.number()
+
+        registers = [r.signed() for _ in range(REGISTER_COUNT)]
+        instruction_pointer = r.number()
+        data_address = r.signed()
+        zero = r.number() != 0
+        counter = r.number()
+        tick = r.number()
+
+        output = r.raw()
+        output_size = r.number() - 1
+        input_position = r.number()
+
+        writes = []
+        addr = 0
+        for _ in range(r.number()):
+            addr += r.number()
+            writes.append((addr, r.signed()))
+    except (zlib.error, IndexError, UnicodeDecodeError) as e:
+        raise ValueError('corrupted checkpoint') from e
+
+    return Checkpoint(
+        hash_,
+        memory_kind,
+        word_bits,
+        memory_capacity,
+        writes,
+        registers,
+        instruction_pointer,
+        data_address,
+        zero,
+        counter,
+        tick,
+        output,
+        output_size if output_size >= 0 else None,
+        input_position,
+    )
+
+
+def write_checkpoint(file: str, checkpoint: Checkpoint) -> None:
+    """Writes checkpoint file atomically (the previous checkpoint survives a crash)."""
+    tmp_file = f'{file}.tmp'
+    with open(tmp_file, 'wb') as f:
+        f.write(encode_checkpoint(checkpoint))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_file, file)
+
+
+def read_checkpoint(file: str) -> Checkpoint:
+    """Reads checkpoint file."""
+    with open(file, 'rb') as f:
+        return decode_checkpoint(f.read())
+
+
+class Checkpointer:
+    """
+    Machine monitor (see `Monitor`) that writes checkpoints of the running machine:
+    every `interval` seconds, on `CHECKPOINT_SIGNAL` and on `STOP_SIGNAL`
+    (the machine is stopped then).
+
+    Signals are handled between execution slices, so a machine waiting for input
+    handles them only after the input arrives.
+    """
+    # Checkpoint file
+    file: str
+    # Running program
+    exe: Executable
+    memory_kind: MemoryKind
+    # Seconds between checkpoints (None - only on signals)
+    interval: Optional[float]
+    # Time of the next periodic checkpoint (`monotonic()`)
+    next_time: float
+    # Signal received since the last check (None - none)
+    received: Optional[int]
+    # Machine has been stopped by `STOP_SIGNAL`
+    stopped: bool
+    # Signal handlers replaced by `install()`
+    _handlers: dict[int, object]
+
+    def __init__(
+        self,
+        file: str,
+        exe: Executable,
+        memory_kind: MemoryKind,
+        interval: Optional[float] = None,
+    ) -> None:
+        self.file = file
+        self.exe = exe
+        self.memory_kind = memory_kind
+        self.interval = interval
+        self.next_time = monotonic() + interval if interval is not None else float('inf')
+        self.received = None
+        self.stopped = False
+        self._handlers = {}
+
+    def _handle(self, signum: int, _frame: Optional[FrameType]) -> None:
+        self.received = signum
+
+    def install(self) -> None:
+        """Installs signal handlers."""
+        for signum in (CHECKPOINT_SIGNAL, STOP_SIGNAL):
+            if signum is not None:
+                self._handlers[signum] = signal.signal(signum, self._handle)
+
+    def uninstall(self) -> None:
+        """Restores previous signal handlers."""
+        for signum, handler in self._handlers.items():
+            signal.signal(signum, handler)  # type: ignore
+        self._handlers = {}
+
+    def __call__(self, control_unit: ControlUnit) -> bool:
+        received = self.received
+        if received is None and monotonic() < self.next_time:
+            return True
+
+        self.received = None
+        write_checkpoint(self.file, make_checkpoint(self.exe, control_unit, self.memory_kind))
+        if self.interval is not None:
+            self.next_time = monotonic() + self.interval
+
+        if received == STOP_SIGNAL:
+            self.stopped = True
+            # unformatted output is in the checkpoint, the resumed run writes it
+            control_unit.data_path.output_port.discard()
+            return control_unit.fault(f'stopped by signal, checkpoint written to {self.file}')
+        return True
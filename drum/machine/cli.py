@@ -1,7 +1,14 @@
+import sys
 from argparse import ArgumentParser
 
+from drum.machine import batch_cli
 from drum.machine.io import OutputFormat
+from drum.machine.machine import ExecutionMode, Limits
+from drum.machine.memory import WORD_TYPECODES, MemoryKind
+from drum.machine.port import OUTPUT_BUFFER_SIZE, EofPolicy, FlushPolicy
 from drum.machine.run import run
+from drum.machine.trace import TraceCompression, TraceLevel
+from drum.util.cache import default_cache_dir
 from drum.util.io import eprint
 
 
@@ -16,7 +23,7 @@ def get_parser() -> ArgumentParser:
     parser.add_argument(
         'input_file',
         type=str,
-        help='Input data file',
+        help='Input data file (- for stdin)',
     )
     parser.add_argument(
         '-O',
@@ -26,6 +33,26 @@ def get_parser() -> ArgumentParser:
         default=OutputFormat.STR.value.alias,
         help='Output data format',
     )
+    parser.add_argument(
+        '-o',
+        '--output-file',
+        type=str,
+        default=None,
+        help='File to write output to (stdout by default)',
+    )
+    parser.add_argument(
+        '--flush',
+        type=str,
+        choices=[policy.value for policy in FlushPolicy],
+        default=FlushPolicy.HALT.value,
+        help='When output is written: after halt, when buffer is full or on newline',
+    )
+    parser.add_argument(
+        '--output-buffer-size',
+        type=int,
+        default=OUTPUT_BUFFER_SIZE,
+        help='Output buffer size (bytes)',
+    )
     parser.add_argument(
         '-L',
         '--logfile',
@@ -33,11 +60,130 @@ def get_parser() -> ArgumentParser:
         default=None,
         help='Output data format',
     )
+    parser.add_argument(
+        '-M',
+        '--mode',
+        type=str,
+        choices=[mode.value for mode in ExecutionMode],
+        default=ExecutionMode.INTERPRET.value,
+        help='Execution mode',
+    )
+    parser.add_argument(
+        '--cache-dir',
+        type=str,
+        default=default_cache_dir(),
+        help='Directory to cache compiled blocks in',
+    )
+    parser.add_argument(
+        '--memory',
+        type=str,
+        choices=[kind.value for kind in MemoryKind],
+        default=MemoryKind.LIST.value,
+        help='Memory representation',
+    )
+    parser.add_argument(
+        '--word-bits',
+        type=int,
+        choices=list(WORD_TYPECODES.keys()),
+        default=None,
+        help='Fixed word width (values wrap around), unbounded by default',
+    )
+    parser.add_argument(
+        '--memory-capacity',
+        type=int,
+        default=None,
+        help='Memory capacity (words), 5 program sizes by default',
+    )
+    parser.add_argument(
+        '-T',
+        '--trace',
+        type=str,
+        choices=[level.value for level in TraceLevel],
+        default=None,
+        help='Trace level (written to the log), micro-op by default',
+    )
+    parser.add_argument(
+        '--trace-file',
+        type=str,
+        default=None,
+        help='Binary trace file (see drumt.py)',
+    )
+    parser.add_argument(
+        '--trace-compression',
+        type=str,
+        choices=[compression.value for compression in TraceCompression],
+        default=TraceCompression.NONE.value,
+        help='Binary trace compression',
+    )
+    parser.add_argument(
+        '--eof',
+        type=str,
+        choices=[policy.value for policy in EofPolicy],
+        default=EofPolicy.VALUE.value,
+        help='What IN does after the end of input: read EOF value or fault',
+    )
+    parser.add_argument(
+        '--eof-value',
+        type=int,
+        default=0,
+        help='Value IN reads after the end of input',
+    )
+    parser.add_argument(
+        '--max-instructions',
+        type=int,
+        default=None,
+        help='Stop the machine after that many instructions',
+    )
+    parser.add_argument(
+        '--max-ticks',
+        type=int,
+        default=None,
+        help='Stop the machine after that many ticks',
+    )
+    parser.add_argument(
+        '--timeout',
+        type=float,
+        default=None,
+        help='Stop the machine after that many seconds (wall-clock)',
+    )
+    parser.add_argument(
+        '--checkpoint',
+        type=str,
+        default=None,
+        help='Checkpoint file, written on SIGUSR1 and SIGTERM (the machine stops then)',
+    )
+    parser.add_argument(
+        '--checkpoint-every',
+        type=float,
+        default=None,
+        help='Write checkpoint every that many seconds (wall-clock)',
+    )
+    parser.add_argument(
+        '--resume',
+        type=str,
+        default=None,
+        help='Checkpoint file to resume from (memory options are taken from it)',
+    )
+    parser.add_argument(
+        '--raw-input',
+        action='store_true',
+        help="Don't strip whitespace around input",
+    )
+    parser.add_argument(
+        '--profile',
+        type=str,
+        default=None,
+        help='Profile file to add execution counts to (see drumc.py --profile-use)',
+    )
 
     return parser
 
 
 def cli() -> None:
+    if len(sys.argv) > 1 and sys.argv[1] == batch_cli.BATCH_COMMAND:
+        batch_cli.cli(sys.argv[2:])
+        return
+
     parser = get_parser()
 
     args = parser.parse_args()
@@ -51,9 +197,69 @@ def cli() -> None:
         eprint('invalid output format')
         return
 
+    mode, err = ExecutionMode.get_by_alias(args.mode)
+    if err is not None:
+        eprint('invalid execution mode')
+        return
+
+    memory_kind, err = MemoryKind.get_by_alias(args.memory)
+    if err is not None:
+        eprint('invalid memory kind')
+        return
+
+    trace_level = None
+    if args.trace is not None:
+        trace_level, err = TraceLevel.get_by_alias(args.trace)
+        if err is not None:
+            eprint('invalid trace level')
+            return
+
+    trace_compression, err = TraceCompression.get_by_alias(args.trace_compression)
+    if err is not None:
+        eprint('invalid trace compression')
+        return
+
+    eof_policy, err = EofPolicy.get_by_alias(args.eof)
+    if err is not None:
+        eprint('invalid EOF policy')
+        return
+
+    flush_policy, err = FlushPolicy.get_by_alias(args.flush)
+    if err is not None:
+        eprint('invalid flush policy')
+        return
+
+    if args.checkpoint_every is not None and args.checkpoint is None:
+        eprint('--checkpoint-every requires --checkpoint')
+        return
+
     logfile = args.logfile
 
-    error = run(compiled_file, input_file, output_format, logfile)
+    error = run(
+        compiled_file,
+        input_file,
+        output_format,
+        logfile,
+        mode=mode,
+        cache_dir=args.cache_dir,
+        memory_kind=memory_kind,
+        word_bits=args.word_bits,
+        memory_capacity=args.memory_capacity,
+        trace_level=trace_level,
+        trace_file=args.trace_file,
+        trace_compression=trace_compression,
+        eof_policy=eof_policy,
+        eof_value=args.eof_value,
+        strip_input=not args.raw_input,
+        output_file=args.output_file,
+        flush_policy=flush_policy,
+        output_buffer_size=args.output_buffer_size,
+        profile_file=args.profile,
+        limits=Limits(args.max_instructions, args.max_ticks, args.timeout),
+        checkpoint_file=args.checkpoint,
+        checkpoint_interval=args.checkpoint_every,
+        resume_file=args.resume,
+    )
 
     if error is not None:
         eprint(error)
@@ -0,0 +1,75 @@
+from dataclasses import dataclass
+
+from drum.common.arch import ArgsType, Op, Register, Word
+from drum.util.error import Result
+
+# Number of arguments for each args type
+ARGS_COUNT = {
+    ArgsType.ZERO: 0,
+    ArgsType.R: 1,
+    ArgsType.RR: 2,
+    ArgsType.RRR: 3,
+    ArgsType.RRI: 3,
+}
+
+# Which arguments (by position) are registers for each args type
+ARGS_REGISTER_MASK = {
+    ArgsType.ZERO: (),
+    ArgsType.R: (True,),
+    ArgsType.RR: (True, True),
+    ArgsType.RRR: (True, True, True),
+    ArgsType.RRI: (True, True, False),
+}
+
+
+@dataclass(frozen=True, slots=True)
+class DecodedInstruction:
+    """
+    Pre-resolved instruction.
+
+    Register arguments are stored as register indexes (codes),
+    immediate arguments are stored as is. Unused arguments are 0.
+    """
+    op: Op
+    a: int = 0
+    b: int = 0
+    c: int = 0
+
+
+DUMMY_DECODED_INSTRUCTION = DecodedInstruction(Op.HLT)
+
+
+def decode_word(word: Word) -> Result[DecodedInstruction]:
+    """Decodes a single memory word. Error if it isn't a valid instruction."""
+    op, err = Op.get_by_code(word[0])
+    if err is not None:
+        return DUMMY_DECODED_INSTRUCTION, err
+
+    raw_args = word[1:]
+    args_type = op.value.args_type
+
+    expected_argument_count = ARGS_COUNT[args_type]
+    actual_argument_count = len(raw_args)
+    if actual_argument_count != expected_argument_count:
+        return DUMMY_DECODED_INSTRUCTION, (
+            f'unexpected number of arguments: expected '
+            f'{expected_argument_count}, got {actual_argument_count}'
+        )
+
+    for raw_arg, is_register in zip(raw_args, ARGS_REGISTER_MASK[args_type]):
+        if is_register:
+            _, err = Register.get_by_code(raw_arg)
+            if err is not None:
+                return DUMMY_DECODED_INSTRUCTION, err
+
+    return DecodedInstruction(op, *raw_args), None
+
+
+def decode_program(program: list[Word]) -> list[Result[DecodedInstruction]]:
+    """
+    Decodes every word of the program.
+
+    Data words are decoded too (von Neumann architecture doesn't let us tell them apart),
+    so decoding errors are kept alongside and reported only if the word is ever executed.
+    """
+    return [decode_word(word) for word in program]
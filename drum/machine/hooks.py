@@ -0,0 +1,60 @@
+from dataclasses import dataclass, field
+from enum import Enum
+from typing import TYPE_CHECKING, Callable
+
+if TYPE_CHECKING:
+    from drum.machine.machine import ControlUnit
+
+# Called before an instruction is executed: machine, instruction address
+InstructionHook = Callable[['ControlUnit', int], None]
+# Called after a branch: machine, branch address, target, whether control went to the target
+BranchHook = Callable[['ControlUnit', int, int, bool], None]
+# Called after `LD` / `ST`: machine, memory address, value read / written
+MemoryHook = Callable[['ControlUnit', int, int], None]
+# Called after `IN` / `OUT`: machine, value read / written
+IoHook = Callable[['ControlUnit', int], None]
+# Called once the machine stops (`control_unit.error` tells why)
+HaltHook = Callable[['ControlUnit'], None]
+
+
+class HookKind(Enum):
+    """Kind of machine event hooks are called on (see `Hooks`)."""
+    INSTRUCTION = 'instruction'
+    BRANCH = 'branch'
+    MEMORY_READ = 'memory-read'
+    MEMORY_WRITE = 'memory-write'
+    INPUT = 'input'
+    OUTPUT = 'output'
+    HALT = 'halt'
+
+
+@dataclass
+class Hooks:
+    """
+    Instrumentation hooks (see `ControlUnit.install_hooks()`), called in the order
+    they are added. Hooks must not change machine state.
+    """
+    instruction: list[InstructionHook] = field(default_factory=list)
+    branch: list[BranchHook] = field(default_factory=list)
+    memory_read: list[MemoryHook] = field(default_factory=list)
+    memory_write: list[MemoryHook] = field(default_factory=list)
+    input: list[IoHook] = field(default_factory=list)
+    output: list[IoHook] = field(default_factory=list)
+    halt: list[HaltHook] = field(default_factory=list)
+
+    def kinds(self) -> set[HookKind]:
+        """Returns kinds that have hooks."""
+        registered = {
+            HookKind.INSTRUCTION: self.instruction,
+            HookKind.BRANCH: self.branch,
+            HookKind.MEMORY_READ: self.memory_read,
+            HookKind.MEMORY_WRITE: self.memory_write,
+            HookKind.INPUT: self.input,
+            HookKind.OUTPUT: self.output,
+            HookKind.HALT: self.halt,
+        }
+        return {kind for kind, hooks in registered.items() if hooks}
+
+    def instruments(self) -> bool:
+        """Checks whether there are hooks on execution events (any kind but halt)."""
+        return bool(self.kinds() - {HookKind.HALT})
@@ -5,70 +5,66 @@ from typing import Callable
 from drum.util.error import Result
 
 
-def _normalize_data_to_alignment(data: list[int], align: int) -> list[int]:
+def _normalize_data_to_alignment(data: bytes, align: int) -> bytes:
     """Adds 0s to the end so that its length is divisible by align."""
     tail_len = (align - (len(data) % align)) % align
-    tail = [0] * tail_len
+    tail = bytes(tail_len)
     return data + tail
 
 
 @dataclass
 class OFDef:
-    """Output format defenition."""
+    """
+    Output format defenition.
+
+    Output is formatted by groups of bytes (e.g. 4-byte numbers), so it could be
+    formatted incrementally: `fmt_output_data` formats complete groups only,
+    pieces of formatted output are joined with `separator`.
+    """
     alias: str
-    fmt_output_data: Callable[[list[int]], str]
+    group_size: int
+    separator: str
+    fmt_output_data: Callable[[bytes], str]
 
 
-def _fmt_output_data_as_str(output_data: list[int]) -> str:
+def _fmt_output_data_as_str(output_data: bytes) -> str:
     """Formats output data as string (ASCII)."""
-    return ''.join(chr(c) for c in output_data)
+    return output_data.decode('latin-1')
 
 
-def _fmt_output_data_as_ints(output_data: list[int]) -> str:
+def _fmt_output_data_as_ints(output_data: bytes) -> str:
     """Formats output data as ints (4-byte numbers)."""
-    normalized_output_data = _normalize_data_to_alignment(output_data, 4)
-    result = []
-
-    for i in range(0, len(normalized_output_data), 4):
-        n = 0
-        for j in range(4):
-            n += normalized_output_data[i + j] * (256 ** j)
-        result.append(str(n))
+    return ', '.join(
+        str(int.from_bytes(output_data[i:i + 4], 'little'))
+        for i in range(0, len(output_data), 4)
+    )
 
-    return ', '.join(n for n in result)
 
-
-def _fmt_output_data_as_hex_ints(output_data: list[int]) -> str:
+def _fmt_output_data_as_hex_ints(output_data: bytes) -> str:
     """Formats output data as ints (4-byte numbers) in hex."""
-    normalized_output_data = _normalize_data_to_alignment(output_data, 4)
-    result = []
-
-    for i in range(0, len(normalized_output_data), 4):
-        n = 0
-        for j in range(4):
-            n += normalized_output_data[i + j] * (256 ** j)
-        result.append(hex(n))
+    return ', '.join(
+        hex(int.from_bytes(output_data[i:i + 4], 'little'))
+        for i in range(0, len(output_data), 4)
+    )
 
-    return ', '.join(n for n in result)
 
-
-def _fmt_output_data_as_bytes(output_data: list[int]) -> str:
+def _fmt_output_data_as_bytes(output_data: bytes) -> str:
     """Formats output data as bytes (1-byte numbers)."""
     return ', '.join(str(c) for c in output_data)
 
 
-def _fmt_output_data_as_hex_bytes(output_data: list[int]) -> str:
+def _fmt_output_data_as_hex_bytes(output_data: bytes) -> str:
     """Formats output data as bytes (1-byte numbers) in hex."""
     return ', '.join(hex(c) for c in output_data)
 
 
 class OutputFormat(Enum):
     """Machine output format."""
-    STR = OFDef('str', _fmt_output_data_as_str)
-    INTS = OFDef('ints', _fmt_output_data_as_ints)
-    HEX_INTS = OFDef('hex-ints', _fmt_output_data_as_hex_ints)
-    BYTESS = OFDef('bytes', _fmt_output_data_as_bytes)
-    HEX_BYTES = OFDef('hex-bytes', _fmt_output_data_as_hex_bytes)
+    STR = OFDef('str', 1, '', _fmt_output_data_as_str)
+    INTS = OFDef('ints', 4, ', ', _fmt_output_data_as_ints)
+    HEX_INTS = OFDef('hex-ints', 4, ', ', _fmt_output_data_as_hex_ints)
+    BYTESS = OFDef('bytes', 1, ', ', _fmt_output_data_as_bytes)
+    HEX_BYTES = OFDef('hex-bytes', 1, ', ', _fmt_output_data_as_hex_bytes)
 
     @staticmethod
     def get_by_alias(alias: str) -> Result['OutputFormat']:
@@ -78,3 +74,65 @@ class OutputFormat(Enum):
                 return of, None
 
         return OutputFormat.STR, f"output format {alias} doesn\'t exist"
+
+
+class OutputEncoder:
+    """
+    Incremental output formatter.
+
+    Incomplete group is kept until the next bytes arrive, at the end it's padded with 0s.
+    Concatenation of all the returned pieces is the same as the whole output formatted at once.
+    """
+    # Output format
+    of: OFDef
+    # Bytes of incomplete group
+    _pending: bytes
+    # Nothing has been formatted yet
+    _empty: bool
+
+    def __init__(self, output_format: OutputFormat) -> None:
+        self.of = output_format.value
+        self._pending = b''
+        self._empty = True
+
+    def _fmt(self, data: bytes) -> str:
+        if not data:
+            return ''
+
+        formatted = self.of.fmt_output_data(data)
+        if not self._empty:
+            formatted = self.of.separator + formatted
+        self._empty = False
+        return formatted
+
+    def encode(self, data: bytes) -> str:
+        """Formats complete groups of the data (and of the bytes kept before)."""
+        if self._pending:
+            data = self._pending + data
+        complete = len(data) - len(data) % self.of.group_size
+        self._pending = data[complete:]
+        return self._fmt(data[:complete])
+
+    def pending(self) -> bytes:
+        """Returns bytes of incomplete group (not formatted yet)."""
+        return self._pending
+
+    def discard(self) -> None:
+        """Drops bytes of incomplete group."""
+        self._pending = b''
+
+    def mark_started(self) -> None:
+        """Continues formatted output that is already written (the next piece is separated)."""
+        self._empty = False
+
+    def finish(self) -> str:
+        """Formats the rest of the data."""
+        data = _normalize_data_to_alignment(self._pending, self.of.group_size)
+        self._pending = b''
+        return self._fmt(data)
+
+
+def fmt_output_data(output_format: OutputFormat, output_data: bytes) -> str:
+    """Formats the whole output data."""
+    encoder = OutputEncoder(output_format)
+    return encoder.encode(output_data) + encoder.finish()
@@ -1,6 +1,9 @@
+from dataclasses import dataclass
 from enum import Enum
-from logging import getLogger
-from queue import Queue
+from itertools import repeat
+from logging import DEBUG, getLogger
+from time import monotonic
+from types import CodeType
 from typing import Callable, Iterable, Optional
 
 from drum.common.arch import (
@@ -11,20 +14,73 @@ from drum.common.arch import (
     HALT_OP,
     IO_OPS,
     MEMORY_OPS,
+    REGISTER_COUNT,
+    REGISTERS_BY_CODE,
+    Executable,
     Op,
     Program,
     Register,
     Word,
 )
-from drum.common.fmt import fmt_instruction
+from drum.common.debug import Symbolizer
+from drum.common.fmt import fmt_state
+from drum.common.profile import Profile
+from drum.machine.blocks import compile_blocks, load_blocks, run_blocks
+from drum.machine.decode import decode_word
+from drum.machine.hooks import BranchHook, HookKind, Hooks, InstructionHook, IoHook, MemoryHook
 from drum.machine.io import OutputFormat
-from drum.util.error import Error
+from drum.machine.memory import (
+    DEFAULT_COMPACT_WORD_BITS,
+    Memory,
+    MemoryKind,
+    Wrap,
+    make_memory,
+    make_wrap,
+)
+from drum.machine.port import EofPolicy, InputPort, OutputPort
+from drum.machine.trace import BinaryTraceWriter, TraceLevel
+from drum.util.error import Error, Result
 
 logger = getLogger('machine')
 
+# Default memory capacity (in program sizes)
+DEFAULT_MEMORY_CAPACITY_FACTOR = 5
+
+# Max number of instructions executed between checks of run limits
+LIMIT_CHECK_INTERVAL = 10000
+
 Value = int
 ImmediateValue = int
 
+# Pre-decoded instruction handler. Accepts instruction arguments,
+# returns False if execution should be stopped.
+DecodedHandler = Callable[[int, int, int], bool]
+# Pre-decoded instruction: handler + arguments (register indexes / immediate values)
+DecodedEntry = tuple[DecodedHandler, int, int, int]
+
+# Called between execution slices (see `Watchdog`) with consistent machine state,
+# returns False if execution should be stopped.
+Monitor = Callable[['ControlUnit'], bool]
+
+
+class ExecutionMode(Enum):
+    """Machine execution mode."""
+    # Decode every instruction on every step (reference)
+    INTERPRET = 'interpret'
+    # Decode program once, dispatch from the pre-decoded table
+    DECODED = 'decoded'
+    # Compile program into Python functions (one per basic block)
+    BLOCKS = 'blocks'
+
+    @staticmethod
+    def get_by_alias(alias: str) -> Result['ExecutionMode']:
+        """Returns execution mode with provided alias. Error if it doesn't exist."""
+        for mode in ExecutionMode:
+            if mode.value == alias:
+                return mode, None
+
+        return ExecutionMode.INTERPRET, f"execution mode {alias} doesn\'t exist"
+
 
 class SelRegValueSource(Enum):
     """Select register value source."""
@@ -35,46 +91,61 @@ class SelRegValueSource(Enum):
 
 class DataPath:
     """DataPath."""
-    # Input (io) buffer
-    input_buffer: Queue[int]
-    # Output (io) buffer
-    output_buffer: Queue[int]
+    # Input port
+    input_port: InputPort
+    # Output port
+    output_port: OutputPort
     # Memory address (pseudoregister)
     data_address: int
     # Result of ALU (pseudoregister)
     alu_result: int
     # Memory
-    memory: list[Word]
+    memory: Memory
     # Memory capacity
     memory_capacity: int
-    # General register
-    registers: dict[Register, Value]
+    # Size of the loaded program (words)
+    program_size: int
+    # Word width in bits (None - unbounded)
+    word_bits: Optional[int]
+    # Wraps ALU results into a word (None if word width is unbounded)
+    wrap: Optional[Wrap]
+    # General registers (indexed by register code)
+    registers: list[Value]
     # Zero flag (used for conditional branching)
     _zero: bool
+    # Log memory writes and output (micro-op trace)
+    trace_micro_ops: bool
 
     def __init__(
         self,
         memory_capacity: int,
         program: Program,
-        input_data: Iterable[int] = list(),
+        input_data: Iterable[int] | InputPort = list(),
+        memory_kind: MemoryKind = MemoryKind.LIST,
+        word_bits: Optional[int] = None,
+        output_port: Optional[OutputPort] = None,
     ) -> None:
-        self.input_buffer = Queue()
-        for item in input_data:
-            self.input_buffer.put(item)
-        self.output_buffer = Queue()
+        if isinstance(input_data, InputPort):
+            self.input_port = input_data
+        else:
+            self.input_port = InputPort(list(input_data))
+        self.output_port = output_port if output_port is not None else OutputPort(OutputFormat.STR)
         self.data_address = 0
         self.alu_result = 0
         self.memory_capacity = memory_capacity
-        self.memory = program + [[0]] * (self.memory_capacity - len(program))
-        self.registers = dict((
-            (r, 0)
-            for r in Register
-        ))
+        self.program_size = len(program)
+        if memory_kind == MemoryKind.COMPACT and word_bits is None:
+            word_bits = DEFAULT_COMPACT_WORD_BITS
+        self.word_bits = word_bits
+        self.wrap = make_wrap(word_bits) if word_bits is not None else None
+        self.memory = make_memory(memory_kind, memory_capacity, program, word_bits)
+        self.registers = [0] * REGISTER_COUNT
         self._zero = False
+        self.trace_micro_ops = False
 
     def _reg_value(self, reg: Register) -> int:
         """Get value of register."""
-        return self.registers[reg]
+        return self.registers[reg.value.code]
 
     def _reg_value_or_imm(self, o: Register | ImmediateValue) -> int:
         """Get value of register or immediate value."""
@@ -84,43 +155,63 @@ class DataPath:
 
     def _set_reg_value(self, reg: Register, value: int) -> None:
         """Set value to register."""
-        self.registers[reg] = value
+        self.registers[reg.value.code] = value
 
     def _read_from_memory(self) -> int:
         """Get word from memory."""
-        return self.memory[self.data_address][0]
+        return self.memory.read(self.data_address)
 
     def _write_to_memory(self, value: int) -> None:
         """Set word in memory."""
-        self.memory[self.data_address] = [value]
+        self.memory.write(self.data_address, value)
 
     def _in(self) -> int:
         """Receive byte from input."""
-        return self.input_buffer.get()
+        return self.input_port.read()
 
     def _out(self, value: int) -> None:
         """Send byte to input."""
-        self.output_buffer.put(value)
+        self.output_port.write(value)
 
     def zero(self) -> bool:
         """Get zero value."""
         return self._zero
 
-    def signal_latch_data_address(self, sel: Register) -> None:
-        """Latches data address (based on selector)."""
-        self.data_address = self._reg_value(sel)
+    def check_address(self, addr: int) -> Error:
+        """Checks that address points to memory. Error (memory fault) if it doesn't."""
+        if 0 <= addr < self.memory_capacity:
+            return None
+        return f'memory fault: address {addr} is out of range [0, {self.memory_capacity})'
+
+    def check_input(self) -> Error:
+        """Checks that input can be read. Error (input fault) if it's over and EOF faults."""
+        if self.input_port.fault_on_eof and self.input_port.at_eof():
+            return 'input fault: end of input'
+        return None
+
+    def signal_latch_data_address(self, sel: Register) -> Error:
+        """Latches data address (based on selector). Error if address is out of range."""
+        addr = self._reg_value(sel)
+        err = self.check_address(addr)
+        if err is not None:
+            return err
+
+        self.data_address = addr
+        return None
 
     def signal_latch_mem_wr(self, sel_mem_wr_reg: Register) -> None:
         """Latches memory cell with value from register (chosen by selector)."""
         value = self._reg_value(sel_mem_wr_reg)
         self._write_to_memory(value)
-        logger.debug(f'[{self.data_address}] = {value} ({repr(chr(value))})')
+        if self.trace_micro_ops:
+            logger.debug(f'[{self.data_address}] = {value} ({repr(chr(value))})')
 
     def signal_output(self, sel_out_reg: Register) -> None:
         """Sends byte to output from register (chosen by selector)."""
         value = self._reg_value(sel_out_reg) & 0xff
-        self.output_buffer.put(value)
-        logger.debug(f'sent to output: {value} ({repr(chr(value))})')
+        self.output_port.write(value)
+        if self.trace_micro_ops:
+            logger.debug(f'sent to output: {value} ({repr(chr(value))})')
 
     def signal_latch_register(
         self,
@@ -176,10 +267,12 @@ class DataPath:
 
                 if alu_ctl not in BRANCH_OPS:
                     assert reg is not None
+                    if self.wrap is not None:
+                        result = self.wrap(result)
                     self._set_reg_value(reg, result)
             case SelRegValueSource.INPUT:
                 assert reg is not None
-                value = self.input_buffer.get()
+                value = self.input_port.read()
                 self._set_reg_value(reg, value)
             case SelRegValueSource.MEM:
                 assert reg is not None
@@ -187,25 +280,131 @@ class DataPath:
                 self._set_reg_value(reg, value)
 
 
+@dataclass
+class MachineSnapshot:
+    """Machine state (see `ControlUnit.snapshot()`)."""
+    memory: Memory
+    registers: list[Value]
+    instruction_pointer: int
+    data_address: int
+    zero: bool
+    counter: int
+    tick: int
+    # Output produced so far (that is still buffered in the output port)
+    output: bytes
+
+
+class LimitKind(Enum):
+    """Run limit (see `Limits`)."""
+    INSTRUCTIONS = 'instructions'
+    TICKS = 'ticks'
+    TIME = 'time'
+
+
+@dataclass(frozen=True)
+class Limits:
+    """
+    Run limits (None - unlimited): executed instructions, ticks & wall-clock seconds.
+
+    Limits are checked every `LIMIT_CHECK_INTERVAL` instructions (at block exits in block
+    mode), so ticks & time may slightly exceed the limit. Instruction limit is exact
+    in the interpret & pre-decoded modes.
+    """
+    instructions: Optional[int] = None
+    ticks: Optional[int] = None
+    seconds: Optional[float] = None
+
+    def unlimited(self) -> bool:
+        return self.instructions is None and self.ticks is None and self.seconds is None
+
+
+@dataclass(frozen=True)
+class ExecutionResult:
+    """Result of the program run (see `execute()`)."""
+    # Raw output bytes (see `fmt_output_data()` for formatting)
+    output: bytes
+    instructions: int
+    ticks: int
+    # Error that stopped the machine
+    error: Error
+    # Limit that stopped the machine (None - it wasn't stopped by a limit)
+    limit: Optional[LimitKind] = None
+    # Final machine state (only if stopped by a limit)
+    state: Optional[MachineSnapshot] = None
+
+
+def _no_blocks(_addr: int) -> None:
+    pass
+
+
 class ControlUnit:
     """Control Unit."""
     # Underlying data path
     data_path: DataPath
     # Program memory (should point to the same as data_path.memory)
-    program: Program
+    program: Memory
     # Instruction pointer / program counter
     instruction_pointer: int
     # Inner executed instruction counter
     _counter: int
     # Inner tick
     _tick: int
-
-    def __init__(self, data_path: DataPath, program: Program, start_addr: int = 0) -> None:
+    # Error that stopped execution (None - no error)
+    error: Error
+    # Limit that stopped execution (None - it wasn't stopped by a limit)
+    limit: Optional[LimitKind]
+    # Pre-decoded instruction handlers without hooks
+    _plain_handlers: dict[Op, DecodedHandler]
+    # Pre-decoded instruction handlers (see `install_hooks()`) & handler of invalid words
+    _handlers: dict[Op, DecodedHandler]
+    _invalid: DecodedHandler
+    # Installed instrumentation hooks (see `install_hooks()`)
+    hooks: Hooks
+    # Pre-decoded program (see `predecode()`)
+    _decoded: list[DecodedEntry]
+    # Program words written by compiled blocks since the table was synced (see `sync_decoded()`)
+    _dirty: set[int]
+    # Drops compiled blocks containing the address (see `load_blocks()`)
+    _invalidate_blocks: Callable[[int], None]
+
+    def __init__(self, data_path: DataPath, program: Memory, start_addr: int = 0) -> None:
         self.data_path = data_path
         self.program = program
         self.instruction_pointer = start_addr
         self._counter = 0
         self._tick = 0
+        self.error = None
+        self.limit = None
+        self._decoded = []
+        self._dirty = set()
+        self._invalidate_blocks = _no_blocks
+        self.hooks = Hooks()
+        self._plain_handlers = {
+            Op.HLT: self._op_hlt,
+            Op.ADD: self._op_add,
+            Op.ADDI: self._op_addi,
+            Op.SUB: self._op_sub,
+            Op.SUBI: self._op_subi,
+            Op.SHR: self._op_shr,
+            Op.SHRI: self._op_shri,
+            Op.XOR: self._op_xor,
+            Op.XORI: self._op_xori,
+            Op.ST: self._op_st,
+            Op.LD: self._op_ld,
+            Op.IN: self._op_in,
+            Op.OUT: self._op_out,
+            Op.BEQ: self._op_beq,
+            Op.BNE: self._op_bne,
+            Op.BLT: self._op_blt,
+            Op.BLE: self._op_ble,
+            Op.BGT: self._op_bgt,
+            Op.BGE: self._op_bge,
+        }
+        if data_path.wrap is not None:
+            for op in CALC_OPS:
+                self._plain_handlers[op] = self._wrapped(self._plain_handlers[op], data_path.wrap)
+        self._handlers = dict(self._plain_handlers)
+        self._invalid = self._op_invalid
 
     def counter(self) -> int:
         """Gets current counter value."""
@@ -315,13 +514,17 @@ class ControlUnit:
 
         match op:
             case Op.LD:
-                self.data_path.signal_latch_data_address(reg2)
+                err = self.data_path.signal_latch_data_address(reg2)
+                if err is not None:
+                    return err
                 self.tick_inc()
 
                 self.data_path.signal_latch_register(SelRegValueSource.MEM, reg1)
                 self.tick_inc()
             case Op.ST:
-                self.data_path.signal_latch_data_address(reg2)
+                err = self.data_path.signal_latch_data_address(reg2)
+                if err is not None:
+                    return err
                 self.tick_inc()
 
                 self.data_path.signal_latch_mem_wr(reg1)
@@ -341,6 +544,10 @@ class ControlUnit:
 
         match op:
             case Op.IN:
+                err = self.data_path.check_input()
+                if err is not None:
+                    return err
+
                 self.data_path.signal_latch_register(SelRegValueSource.INPUT, reg)
                 self.tick_inc()
             case Op.OUT:
@@ -383,19 +590,24 @@ class ControlUnit:
     def execute_dummy(self, _op: Op, _raw_args: list[int]) -> Error:
         return None
 
+    def fault(self, err: Error) -> bool:
+        """Stops execution because of an error."""
+        self.error = err
+        return False
+
     def decode_and_execute(self) -> bool:
         """Decodes and executes instruction."""
         if self.instruction_pointer >= len(self.program):
             return False
 
-        raw = self.program[self.instruction_pointer]
-        raw_opcode = raw[0]
+        raw = self.program.word(self.instruction_pointer)
         raw_args = raw[1:]
 
-        op, err = Op.get_by_code(raw_opcode)
+        # data words have no (or wrong) arguments, fault on them the same way other modes do
+        decoded, err = decode_word(raw)
         if err is not None:
-            logger.error(err)
-            return False
+            return self.fault(err)
+        op = decoded.op
 
         execute: Callable[[Op, list[int]], Error] = self.execute_dummy
 
@@ -410,62 +622,817 @@ class ControlUnit:
         elif op == HALT_OP:
             return False
         else:
-            logger.fatal('programming error: unexpected valid op')
-            return False
+            return self.fault('programming error: unexpected valid op')
 
         err = execute(op, raw_args)
         if err is not None:
-            logger.error(err)
-            return False
+            return self.fault(err)
 
         self.counter_inc()
 
         return True
 
-    def get_state_string(self) -> str:
-        """Returns current state in string format."""
-        s = f'TICK={self.tick():4} '
-        s += f'IP={self.instruction_pointer:3} '
-        s += f'ADDR={self.data_path.data_address:3} '
-        s += f'MEM={self.data_path._read_from_memory():6} '
+    def _decode_entry(self, word: Word) -> DecodedEntry:
+        """Decodes word into table entry (handler + arguments)."""
+        decoded, err = decode_word(word)
+        if err is not None:
+            return self._invalid, 0, 0, 0
+
+        return self._handlers[decoded.op], decoded.a, decoded.b, decoded.c
+
+    def predecode(self) -> None:
+        """Decodes the whole program into a table, which is used by `execute_decoded()`."""
+        self._decoded = [
+            self._decode_entry(self.program.word(addr))
+            for addr in range(self.data_path.program_size)
+        ]
+
+    def sync_decoded(self) -> None:
+        """Re-decodes program words written past the pre-decoded table (by compiled blocks)."""
+        decoded = self._decoded
+        for addr in self._dirty:
+            if addr < len(decoded):
+                decoded[addr] = self._decode_entry(self.program.word(addr))
+        self._dirty.clear()
+
+    def execute_decoded(self) -> bool:
+        """Executes instruction from the pre-decoded table."""
+        ip = self.instruction_pointer
+        if ip < len(self._decoded):
+            handler, a, b, c = self._decoded[ip]
+        elif ip < len(self.program):
+            # outside of loaded program - decode on the fly
+            handler, a, b, c = self._decode_entry(self.program.word(ip))
+        else:
+            return False
+
+        if not handler(a, b, c):
+            return False
+
+        self._counter += 1
+
+        return True
+
+    def run_decoded(self, steps: Optional[int] = None) -> bool:
+        """
+        Executes instructions from the pre-decoded table until stop (no trace)
+        or at most `steps` instructions. Returns False if execution has stopped.
+        """
+        decoded = self._decoded
+        decoded_size = len(decoded)
+        counter = 0
+        running = True
+
+        for _ in repeat(None) if steps is None else repeat(None, steps):
+            ip = self.instruction_pointer
+            if ip < decoded_size:
+                handler, a, b, c = decoded[ip]
+            elif ip < len(self.program):
+                handler, a, b, c = self._decode_entry(self.program.word(ip))
+            else:
+                running = False
+                break
+
+            if not handler(a, b, c):
+                running = False
+                break
+            counter += 1
+
+        self._counter += counter
+        return running
+
+    def run_interpreted(self, steps: int) -> bool:
+        """Decodes & executes at most `steps` instructions. Returns False if stopped."""
+        step = self.decode_and_execute
+        for _ in repeat(None, steps):
+            if not step():
+                return False
+        return True
+
+    def run_profiled(
+        self,
+        executions: list[int],
+        ticks: list[int],
+        taken: list[int],
+        steps: Optional[int] = None,
+    ) -> bool:
+        """
+        Executes instructions from the pre-decoded table until stop (no trace)
+        or at most `steps` instructions, counting executions & ticks of every word and
+        executions after which control didn't go to the next word (see `Profile`).
+        Words outside of the lists aren't counted. Returns False if execution has stopped.
+
+        Counters are plain lists indexed by address, so counting is a few increments
+        per instruction.
+        """
+        size = len(executions)
+
+        for _ in repeat(None) if steps is None else repeat(None, steps):
+            ip = self.instruction_pointer
+            tick = self._tick
+            if not self.execute_decoded():
+                return False
+            if ip < size:
+                executions[ip] += 1
+                ticks[ip] += self._tick - tick
+                if self.instruction_pointer != ip + 1:
+                    taken[ip] += 1
+
+        return True
+
+    def _op_invalid(self, _a: int, _b: int, _c: int) -> bool:
+        _, err = decode_word(self.program.word(self.instruction_pointer))
+        return self.fault(err)
+
+    def _wrapped(self, handler: DecodedHandler, wrap: Wrap) -> DecodedHandler:
+        """Returns ALU handler that keeps destination register machine-sized."""
+        registers = self.data_path.registers
+
+        def f(dst: int, left: int, right: int) -> bool:
+            handler(dst, left, right)
+            registers[dst] = wrap(registers[dst])
+            return True
+
+        return f
+
+    def install_hooks(self, hooks: Hooks) -> None:
+        """
+        Instruments pre-decoded execution with the hooks (call before `predecode()`),
+        replacing previously installed ones.
+
+        Only handlers of ops that have hooks are wrapped, so execution loops stay
+        the same and hook kinds that aren't used cost nothing. Halt hooks are called
+        by `halted()`.
+        """
+        self.hooks = hooks
+        kinds = hooks.kinds()
+        handlers = dict(self._plain_handlers)
+        invalid: DecodedHandler = self._op_invalid
+
+        if HookKind.MEMORY_READ in kinds:
+            handlers[Op.LD] = self._hooked_load(handlers[Op.LD], hooks.memory_read)
+        if HookKind.MEMORY_WRITE in kinds:
+            handlers[Op.ST] = self._hooked_store(handlers[Op.ST], hooks.memory_write)
+        if HookKind.INPUT in kinds:
+            handlers[Op.IN] = self._hooked_io(handlers[Op.IN], hooks.input)
+        if HookKind.OUTPUT in kinds:
+            handlers[Op.OUT] = self._hooked_io(handlers[Op.OUT], hooks.output, 0xff)
+        if HookKind.BRANCH in kinds:
+            for op in BRANCH_OPS:
+                handlers[op] = self._hooked_branch(handlers[op], hooks.branch)
+        if HookKind.INSTRUCTION in kinds:
+            for op, handler in handlers.items():
+                handlers[op] = self._hooked_instruction(handler, hooks.instruction)
+            invalid = self._hooked_instruction(invalid, hooks.instruction)
+        self._handlers = handlers
+        self._invalid = invalid
+        self._decoded = []
+
+    def halted(self) -> None:
+        """Calls halt hooks (once the machine has stopped)."""
+        for hook in self.hooks.halt:
+            hook(self)
+
+    def _hooked_instruction(
+        self,
+        handler: DecodedHandler,
+        hooks: list[InstructionHook],
+    ) -> DecodedHandler:
+        def f(a: int, b: int, c: int) -> bool:
+            for hook in hooks:
+                hook(self, self.instruction_pointer)
+            return handler(a, b, c)
+
+        return f
+
+    def _hooked_branch(self, handler: DecodedHandler, hooks: list[BranchHook]) -> DecodedHandler:
+        data_path = self.data_path
+
+        def f(left: int, right: int, addr: int) -> bool:
+            ip = self.instruction_pointer
+            handler(left, right, addr)
+            for hook in hooks:
+                hook(self, ip, addr, data_path._zero)
+            return True
+
+        return f
+
+    def _hooked_load(self, handler: DecodedHandler, hooks: list[MemoryHook]) -> DecodedHandler:
+        data_path = self.data_path
+
+        def f(dst: int, addr: int, c: int) -> bool:
+            if not handler(dst, addr, c):
+                return False
+            for hook in hooks:
+                hook(self, data_path.data_address, data_path.registers[dst])
+            return True
+
+        return f
+
+    def _hooked_store(self, handler: DecodedHandler, hooks: list[MemoryHook]) -> DecodedHandler:
+        data_path = self.data_path
+
+        def f(src: int, addr: int, c: int) -> bool:
+            if not handler(src, addr, c):
+                return False
+            for hook in hooks:
+                hook(self, data_path.data_address, data_path._read_from_memory())
+            return True
+
+        return f
+
+    def _hooked_io(
+        self,
+        handler: DecodedHandler,
+        hooks: list[IoHook],
+        mask: int = -1,
+    ) -> DecodedHandler:
+        """Returns `IN` / `OUT` handler that calls hooks with the register value (masked)."""
+        registers = self.data_path.registers
+
+        def f(reg: int, b: int, c: int) -> bool:
+            if not handler(reg, b, c):
+                return False
+            for hook in hooks:
+                hook(self, registers[reg] & mask)
+            return True
+
+        return f
+
+    def _op_hlt(self, _a: int, _b: int, _c: int) -> bool:
+        return False
+
+    def _op_add(self, dst: int, left: int, right: int) -> bool:
+        registers = self.data_path.registers
+        registers[dst] = registers[left] + registers[right]
+        self._tick += 1
+        self.instruction_pointer += 1
+        return True
+
+    def _op_addi(self, dst: int, left: int, imm: int) -> bool:
+        registers = self.data_path.registers
+        registers[dst] = registers[left] + imm
+        self._tick += 1
+        self.instruction_pointer += 1
+        return True
 
-        for reg, value in self.data_path.registers.items():
-            s += f'{reg.value.name}={value:4} '
+    def _op_sub(self, dst: int, left: int, right: int) -> bool:
+        registers = self.data_path.registers
+        registers[dst] = registers[left] - registers[right]
+        self._tick += 1
+        self.instruction_pointer += 1
+        return True
+
+    def _op_subi(self, dst: int, left: int, imm: int) -> bool:
+        registers = self.data_path.registers
+        registers[dst] = registers[left] - imm
+        self._tick += 1
+        self.instruction_pointer += 1
+        return True
+
+    def _op_shr(self, dst: int, left: int, right: int) -> bool:
+        registers = self.data_path.registers
+        registers[dst] = registers[left] >> registers[right]
+        self._tick += 1
+        self.instruction_pointer += 1
+        return True
+
+    def _op_shri(self, dst: int, left: int, imm: int) -> bool:
+        registers = self.data_path.registers
+        registers[dst] = registers[left] >> imm
+        self._tick += 1
+        self.instruction_pointer += 1
+        return True
+
+    def _op_xor(self, dst: int, left: int, right: int) -> bool:
+        registers = self.data_path.registers
+        registers[dst] = registers[left] ^ registers[right]
+        self._tick += 1
+        self.instruction_pointer += 1
+        return True
+
+    def _op_xori(self, dst: int, left: int, imm: int) -> bool:
+        registers = self.data_path.registers
+        registers[dst] = registers[left] ^ imm
+        self._tick += 1
+        self.instruction_pointer += 1
+        return True
+
+    def _op_st(self, src: int, addr: int, _c: int) -> bool:
+        data_path = self.data_path
+        if not 0 <= data_path.registers[addr] < data_path.memory_capacity:
+            return self.fault(data_path.check_address(data_path.registers[addr]))
+
+        data_path.data_address = data_path.registers[addr]
+        self._tick += 1
+
+        data_path.signal_latch_mem_wr(REGISTERS_BY_CODE[src])
+        self._tick += 1
+
+        if data_path.data_address < len(self._decoded):
+            # self-modifying code: keep the table in sync with memory
+            self._decoded[data_path.data_address] = self._decode_entry(
+                self.program.word(data_path.data_address),
+            )
+            self._invalidate_blocks(data_path.data_address)
+
+        self.instruction_pointer += 1
+        return True
+
+    def _op_ld(self, dst: int, addr: int, _c: int) -> bool:
+        data_path = self.data_path
+        if not 0 <= data_path.registers[addr] < data_path.memory_capacity:
+            return self.fault(data_path.check_address(data_path.registers[addr]))
+
+        data_path.data_address = data_path.registers[addr]
+        self._tick += 1
+
+        data_path.registers[dst] = data_path._read_from_memory()
+        self._tick += 1
+
+        self.instruction_pointer += 1
+        return True
+
+    def _op_in(self, dst: int, _b: int, _c: int) -> bool:
+        data_path = self.data_path
+        if data_path.input_port.fault_on_eof and data_path.input_port.at_eof():
+            return self.fault(data_path.check_input())
+
+        data_path.registers[dst] = data_path._in()
+        self._tick += 1
+        self.instruction_pointer += 1
+        return True
+
+    def _op_out(self, src: int, _b: int, _c: int) -> bool:
+        self.data_path.signal_output(REGISTERS_BY_CODE[src])
+        self._tick += 1
+        self.instruction_pointer += 1
+        return True
+
+    def _branch(self, taken: bool, addr: int) -> bool:
+        self.data_path._zero = taken
+        self._tick += 1
+        if taken:
+            self.instruction_pointer = addr
+        else:
+            self.instruction_pointer += 1
+        return True
+
+    def _op_beq(self, left: int, right: int, addr: int) -> bool:
+        registers = self.data_path.registers
+        return self._branch(registers[left] == registers[right], addr)
+
+    def _op_bne(self, left: int, right: int, addr: int) -> bool:
+        registers = self.data_path.registers
+        return self._branch(registers[left] != registers[right], addr)
+
+    def _op_blt(self, left: int, right: int, addr: int) -> bool:
+        registers = self.data_path.registers
+        return self._branch(registers[left] < registers[right], addr)
+
+    def _op_ble(self, left: int, right: int, addr: int) -> bool:
+        registers = self.data_path.registers
+        return self._branch(registers[left] <= registers[right], addr)
+
+    def _op_bgt(self, left: int, right: int, addr: int) -> bool:
+        registers = self.data_path.registers
+        return self._branch(registers[left] > registers[right], addr)
+
+    def _op_bge(self, left: int, right: int, addr: int) -> bool:
+        registers = self.data_path.registers
+        return self._branch(registers[left] >= registers[right], addr)
+
+    def write_trace_record(self, writer: BinaryTraceWriter) -> None:
+        """Writes current state into binary trace."""
+        writer.record(
+            self._tick,
+            self.instruction_pointer,
+            self.data_path.data_address,
+            self.data_path._read_from_memory(),
+            self.data_path.registers,
+            self.program.word(self.instruction_pointer)[0],
+        )
 
-        instr = self.program[self.instruction_pointer]
+    def snapshot(self) -> MachineSnapshot:
+        """Captures machine state. Memory is copied."""
+        data_path = self.data_path
+        return MachineSnapshot(
+            memory=data_path.memory.copy(),
+            registers=data_path.registers.copy(),
+            instruction_pointer=self.instruction_pointer,
+            data_address=data_path.data_address,
+            zero=data_path._zero,
+            counter=self._counter,
+            tick=self._tick,
+            output=data_path.output_port.buffered(),
+        )
+
+    def restore(self, snapshot: MachineSnapshot) -> None:
+        """
+        Restores machine state.
 
-        formatted_instruction, err = fmt_instruction(instr)
+        Memory is copied, so the same snapshot could be restored many times.
+        Output from the snapshot is sent to the output port.
+        """
+        data_path = self.data_path
+        data_path.memory = snapshot.memory.copy()
+        data_path.registers[:] = snapshot.registers
+        data_path.data_address = snapshot.data_address
+        data_path._zero = snapshot.zero
+        data_path.output_port.write_bytes(snapshot.output)
+        self.program = data_path.memory
+        self.instruction_pointer = snapshot.instruction_pointer
+        self._counter = snapshot.counter
+        self._tick = snapshot.tick
+        self.error = None
+        self.limit = None
+        self._decoded = []
+        self._dirty.clear()
+
+    def get_state_string(self) -> str:
+        """Returns current state in string format."""
+        s, err = fmt_state(
+            self.tick(),
+            self.instruction_pointer,
+            self.data_path.data_address,
+            self.data_path._read_from_memory(),
+            self.data_path.registers,
+            self.program.word(self.instruction_pointer),
+        )
         if err is not None:
             logger.error('error while preparing state string: ' + err)
 
-        s += formatted_instruction
-
         return s
 
 
+class Watchdog:
+    """
+    Enforces run limits (see `Limits`) and calls the monitor.
+
+    Execution loops run in slices of `steps()` instructions and call `check()` between them,
+    so limits don't cost anything per instruction.
+    """
+    # Machine being watched
+    control_unit: ControlUnit
+    limits: Limits
+    # Called on every check (see `Monitor`)
+    monitor: Optional[Monitor]
+    # Max number of instructions between checks
+    interval: int
+    # Wall-clock time limit (`monotonic()`), None - unlimited
+    deadline: Optional[float]
+
+    def __init__(
+        self,
+        control_unit: ControlUnit,
+        limits: Limits,
+        monitor: Optional[Monitor] = None,
+        interval: int = LIMIT_CHECK_INTERVAL,
+    ) -> None:
+        self.control_unit = control_unit
+        self.limits = limits
+        self.monitor = monitor
+        self.interval = interval
+        self.deadline = None
+        if limits.seconds is not None:
+            self.deadline = monotonic() + limits.seconds
+
+    def steps(self) -> int:
+        """Returns number of instructions to execute before the next check."""
+        control_unit = self.control_unit
+        limits = self.limits
+        steps = self.interval
+        if limits.instructions is not None:
+            steps = min(steps, limits.instructions - control_unit._counter)
+        if limits.ticks is not None:
+            # every instruction takes at least a tick (except for halt, which stops anyway)
+            steps = min(steps, limits.ticks - control_unit._tick)
+        return max(steps, 1)
+
+    def _halting(self) -> bool:
+        """Checks whether the next step stops the machine without executing anything."""
+        control_unit = self.control_unit
+        ip = control_unit.instruction_pointer
+        if ip >= len(control_unit.program):
+            return True
+        instruction, err = decode_word(control_unit.program.word(ip))
+        return err is None and instruction.op == HALT_OP
+
+    def _exceeded(self) -> Optional[tuple[LimitKind, str]]:
+        control_unit = self.control_unit
+        limits = self.limits
+        if limits.instructions is not None and control_unit._counter >= limits.instructions:
+            if not self._halting():
+                return LimitKind.INSTRUCTIONS, f'{limits.instructions}'
+        if limits.ticks is not None and control_unit._tick >= limits.ticks:
+            if not self._halting():
+                return LimitKind.TICKS, f'{limits.ticks}'
+        if self.deadline is not None and monotonic() >= self.deadline:
+            return LimitKind.TIME, f'{limits.seconds} s'
+        return None
+
+    def check(self) -> bool:
+        """
+        Checks limits & calls the monitor. Returns False if the machine should stop
+        (if a limit is exceeded, the machine is stopped with an error).
+        """
+        exceeded = self._exceeded()
+        if exceeded is not None:
+            kind, limit = exceeded
+            self.control_unit.limit = kind
+            return self.control_unit.fault(f'limit exceeded: {kind.value} ({limit})')
+
+        if self.monitor is not None:
+            return self.monitor(self.control_unit)
+        return True
+
+
+def make_watchdog(
+    control_unit: ControlUnit,
+    limits: Optional[Limits],
+    monitor: Optional[Monitor] = None,
+    interval: int = LIMIT_CHECK_INTERVAL,
+) -> Optional[Watchdog]:
+    """Returns watchdog of the limits & monitor (None if there is nothing to watch)."""
+    if (limits is None or limits.unlimited()) and monitor is None:
+        return None
+    return Watchdog(control_unit, limits if limits is not None else Limits(), monitor, interval)
+
+
+def code_modified(program: Program, snapshot: MachineSnapshot) -> bool:
+    """Checks whether the program has been modified (compiled blocks can't be used then)."""
+    return any(snapshot.memory.word(addr) != word for addr, word in enumerate(program))
+
+
+def make_control_unit(
+    program: Program,
+    start: int = 0,
+    input_data: Iterable[int] | InputPort = list(),
+    output_port: Optional[OutputPort] = None,
+    memory_kind: MemoryKind = MemoryKind.LIST,
+    word_bits: Optional[int] = None,
+    memory_capacity: Optional[int] = None,
+) -> ControlUnit:
+    """
+    Creates machine (control unit + data path) with the program loaded.
+
+    `memory_capacity` (words) should fit the program, by default it's
+    `DEFAULT_MEMORY_CAPACITY_FACTOR` program sizes.
+    """
+    if memory_capacity is None:
+        memory_capacity = len(program) * DEFAULT_MEMORY_CAPACITY_FACTOR
+
+    data_path = DataPath(
+        memory_capacity,
+        program,
+        input_data,
+        memory_kind=memory_kind,
+        word_bits=word_bits,
+        output_port=output_port,
+    )
+    return ControlUnit(data_path, data_path.memory, start)
+
+
+def run_untraced(
+    control_unit: ControlUnit,
+    mode: ExecutionMode = ExecutionMode.INTERPRET,
+    blocks_code: Optional[CodeType] = None,
+    limits: Optional[Limits] = None,
+    monitor: Optional[Monitor] = None,
+    check_interval: int = LIMIT_CHECK_INTERVAL,
+) -> None:
+    """
+    Executes program until stop without any tracing.
+
+    Block mode runs `blocks_code` (see `compile_blocks()`), code that isn't compiled
+    is executed from the pre-decoded table (see `run_blocks()`).
+
+    With `limits` or `monitor` execution is run in slices of at most `check_interval`
+    instructions (see `Watchdog`), a run stopped by a limit has `control_unit.limit` set.
+    """
+    watchdog = make_watchdog(control_unit, limits, monitor, check_interval)
+
+    if mode == ExecutionMode.BLOCKS and blocks_code is not None:
+        run_blocks(control_unit, load_blocks(control_unit, blocks_code), watchdog)
+        return
+
+    if watchdog is None:
+        if mode == ExecutionMode.INTERPRET:
+            while control_unit.decode_and_execute():
+                pass
+        else:
+            control_unit.predecode()
+            control_unit.run_decoded()
+        return
+
+    run = control_unit.run_interpreted
+    if mode != ExecutionMode.INTERPRET:
+        control_unit.predecode()
+        run = control_unit.run_decoded
+
+    while watchdog.check() and run(watchdog.steps()):
+        pass
+
+
 def exec_program(
     program: Program,
     output_format: OutputFormat,
     start: int = 0,
-    input_data: Iterable[int] = list(),
+    input_data: Iterable[int] | InputPort = list(),
+    mode: ExecutionMode = ExecutionMode.INTERPRET,
+    cache_dir: Optional[str] = None,
+    memory_kind: MemoryKind = MemoryKind.LIST,
+    word_bits: Optional[int] = None,
+    memory_capacity: Optional[int] = None,
+    trace_level: Optional[TraceLevel] = None,
+    trace_writer: Optional[BinaryTraceWriter] = None,
+    output_port: Optional[OutputPort] = None,
+    profile: Optional[Profile] = None,
+    symbolizer: Optional[Symbolizer] = None,
+    limits: Optional[Limits] = None,
+    snapshot: Optional[MachineSnapshot] = None,
+    monitor: Optional[Monitor] = None,
+    hooks: Optional[Hooks] = None,
 ) -> str:
-    """Executes a program. Returns formatted output."""
-    data_path = DataPath(len(program) * 5, program, input_data)
-    control_unit = ControlUnit(data_path, data_path.memory, start)
-
-    logger.debug(control_unit.get_state_string())
-
-    while control_unit.decode_and_execute():
-        logger.debug(control_unit.get_state_string())
+    """
+    Executes a program. Returns formatted output.
+
+    `input_data` is either an input port or values to read (`IN` reads 0 after them).
+    If `output_port` is provided, output is streamed there (it's closed on halt),
+    and the returned output is empty.
+
+    Trace is written to the debug log. If `trace_level` isn't provided,
+    it's micro-op if debug logging is enabled and off otherwise. Trace level is
+    checked once: with trace off, execution loop doesn't do any tracing work at all.
+    If `trace_writer` is provided, instruction-level binary trace is written there as well.
+
+    Block mode doesn't support tracing, so it falls back to the pre-decoded
+    execution if trace is on. `cache_dir` is used to cache compiled blocks.
+
+    `word_bits` enables fixed-width (wrapping) words.
+
+    If `profile` is provided, execution counts are added to it. Profiled run uses
+    the pre-decoded execution in any mode and isn't traced.
+
+    If `symbolizer` is provided, text trace lines and the error are annotated with
+    source locations (`file:line label+offset`).
+
+    `limits` stop the machine with an error if exceeded (see `Limits`).
+
+    If `snapshot` is provided, execution is resumed from it (compiled blocks aren't used
+    if it has modified the program). `monitor` is called between execution slices.
+
+    `hooks` instrument execution (see `ControlUnit.install_hooks()`), instrumented run
+    uses the pre-decoded execution in any mode.
+    """
+    control_unit = make_control_unit(
+        program,
+        start,
+        input_data,
+        output_port=output_port if output_port is not None else OutputPort(output_format),
+        memory_kind=memory_kind,
+        word_bits=word_bits,
+        memory_capacity=memory_capacity,
+    )
+    data_path = control_unit.data_path
+    if snapshot is not None:
+        control_unit.restore(snapshot)
+    if hooks is not None:
+        control_unit.install_hooks(hooks)
+        if hooks.instruments():
+            mode = ExecutionMode.DECODED
+
+    if trace_level is None:
+        trace_level = TraceLevel.MICRO_OP if logger.isEnabledFor(DEBUG) else TraceLevel.OFF
+    data_path.trace_micro_ops = trace_level == TraceLevel.MICRO_OP
+
+    tracing = trace_level != TraceLevel.OFF or trace_writer is not None
+
+    watchdog = make_watchdog(control_unit, limits, monitor)
+
+    if profile is not None:
+        control_unit.predecode()
+        counts = profile.executions, profile.ticks, profile.taken
+        if watchdog is None:
+            control_unit.run_profiled(*counts)
+        else:
+            while watchdog.check() and control_unit.run_profiled(*counts, watchdog.steps()):
+                pass
+    elif not tracing:
+        blocks_code = None
+        if mode == ExecutionMode.BLOCKS and (
+            snapshot is None or not code_modified(program, snapshot)
+        ):
+            blocks_code = compile_blocks(program, start, data_path.word_bits, cache_dir)
+        run_untraced(control_unit, mode, blocks_code, limits, monitor)
+    else:
+        step = control_unit.decode_and_execute
+        if mode in (ExecutionMode.DECODED, ExecutionMode.BLOCKS):
+            control_unit.predecode()
+            step = control_unit.execute_decoded
+
+        trace_text = trace_level != TraceLevel.OFF
+        running = True
+        check_at = control_unit._counter if watchdog is not None else -1
+
+        while running:
+            if control_unit._counter == check_at:
+                assert watchdog is not None
+                if not watchdog.check():
+                    break
+                check_at = control_unit._counter + watchdog.steps()
+
+            if trace_text:
+                state = control_unit.get_state_string()
+                if symbolizer is not None:
+                    state = symbolizer.annotate(state, control_unit.instruction_pointer)
+                logger.debug(state)
+            if trace_writer is not None:
+                control_unit.write_trace_record(trace_writer)
+
+            running = step()
+
+    control_unit.halted()
+
+    if control_unit.error is not None:
+        error = control_unit.error
+        if symbolizer is not None:
+            location = symbolizer.describe(control_unit.instruction_pointer)
+            if location is not None:
+                error += f' at {location}'
+        logger.error(error)
 
     logger.info(f'{control_unit.counter()} instructions executed')
 
-    output_data = []
-    while not control_unit.data_path.output_buffer.empty():
-        output_data.append(control_unit.data_path.output_buffer.get())
+    data_path.output_port.close()
+
+    if output_port is not None:
+        logger.info(f'{output_port.written} bytes sent to output')
+        return ''
 
-    formatted_output = output_format.value.fmt_output_data(output_data)
+    formatted_output = data_path.output_port.getvalue()
 
     logger.info(f'Output: {formatted_output}')
 
     return formatted_output
+
+
+def execute(
+    exe: Executable,
+    input_data: bytes = b'',
+    mode: ExecutionMode = ExecutionMode.DECODED,
+    cache_dir: Optional[str] = None,
+    memory_kind: MemoryKind = MemoryKind.LIST,
+    word_bits: Optional[int] = None,
+    memory_capacity: Optional[int] = None,
+    eof_policy: EofPolicy = EofPolicy.VALUE,
+    eof_value: int = 0,
+    strip_input: bool = False,
+    limits: Optional[Limits] = None,
+    hooks: Optional[Hooks] = None,
+) -> ExecutionResult:
+    """
+    Executes a program on in-memory input.
+
+    Nothing is logged or written to files (except for `cache_dir`, used to cache
+    compiled blocks), `exe` isn't modified. `strip_input` - skip whitespace around input.
+
+    If the run is stopped by one of `limits`, the result holds the limit & the final state.
+
+    `hooks` instrument the run (in the pre-decoded mode, see `ControlUnit.install_hooks()`).
+    """
+    output_port = OutputPort(OutputFormat.BYTESS)
+    control_unit = make_control_unit(
+        exe.program,
+        exe.start,
+        InputPort(input_data, eof_policy=eof_policy, eof_value=eof_value, strip=strip_input),
+        output_port=output_port,
+        memory_kind=memory_kind,
+        word_bits=word_bits,
+        memory_capacity=memory_capacity,
+    )
+    if hooks is not None:
+        control_unit.install_hooks(hooks)
+        if hooks.instruments():
+            mode = ExecutionMode.DECODED
+
+    blocks_code = None
+    if mode == ExecutionMode.BLOCKS:
+        blocks_code = compile_blocks(
+            exe.program,
+            exe.start,
+            control_unit.data_path.word_bits,
+            cache_dir,
+        )
+    run_untraced(control_unit, mode, blocks_code, limits)
+    control_unit.halted()
+
+    # output port keeps everything until it's closed
+    return ExecutionResult(
+        output_port.buffered(),
+        control_unit.counter(),
+        control_unit.tick(),
+        control_unit.error,
+        control_unit.limit,
+        control_unit.snapshot() if control_unit.limit is not None else None,
+    )
@@ -0,0 +1,266 @@
+from array import array
+from enum import Enum
+from typing import Callable, Iterable, Optional
+
+from drum.common.arch import Program, Word
+from drum.util.error import Result
+
+# Value wrapper (used to keep values machine-sized)
+Wrap = Callable[[int], int]
+
+# Supported fixed word widths (bits) and corresponding array typecodes
+WORD_TYPECODES = {
+    32: 'i',
+    64: 'q',
+}
+
+# Size of array item for each supported word width (bytes)
+WORD_SIZES = {bits: array(typecode).itemsize for bits, typecode in WORD_TYPECODES.items()}
+
+# Word width used by compact memory if it's not set explicitly
+DEFAULT_COMPACT_WORD_BITS = 64
+
+# Paged memory: page size (words) is 2 ** PAGE_BITS
+PAGE_BITS = 12
+PAGE_SIZE = 1 << PAGE_BITS
+PAGE_MASK = PAGE_SIZE - 1
+
+
+def make_wrap(word_bits: int) -> Wrap:
+    """Returns function that wraps value into a signed word of the given width."""
+    half = 1 << (word_bits - 1)
+    mask = (1 << word_bits) - 1
+
+    def wrap(value: int) -> int:
+        return ((value + half) & mask) - half
+
+    return wrap
+
+
+def wrap_expression(word_bits: int, expr: str) -> str:
+    """Returns Python expression that wraps `expr` (same as `make_wrap()`, but inline)."""
+    half = 1 << (word_bits - 1)
+    mask = (1 << word_bits) - 1
+    return f'((({expr}) + {half}) & {mask}) - {half}'
+
+
+class MemoryKind(Enum):
+    """Memory representation."""
+    # List of words (each word is a list of ints)
+    LIST = 'list'
+    # Data words in a flat array, instructions in a separate side table
+    COMPACT = 'compact'
+    # Like compact, but pages are allocated on first write
+    PAGED = 'paged'
+
+    @staticmethod
+    def get_by_alias(alias: str) -> Result['MemoryKind']:
+        """Returns memory kind with provided alias. Error if it doesn't exist."""
+        for kind in MemoryKind:
+            if kind.value == alias:
+                return kind, None
+
+        return MemoryKind.LIST, f"memory kind {alias} doesn\'t exist"
+
+
+class ListMemory:
+    """Memory, represented as a list of words."""
+    # Words
+    words: list[Word]
+
+    def __init__(self, capacity: int, program: Program, wrap: Optional[Wrap] = None) -> None:
+        if wrap is not None:
+            program = [[wrap(word[0])] if len(word) == 1 else word for word in program]
+        self.words = program + [[0]] * (capacity - len(program))
+
+    def __len__(self) -> int:
+        return len(self.words)
+
+    def read(self, addr: int) -> int:
+        """Reads data word."""
+        return self.words[addr][0]
+
+    def write(self, addr: int, value: int) -> None:
+        """Writes data word."""
+        self.words[addr] = [value]
+
+    def word(self, addr: int) -> Word:
+        """Returns the whole word (used to fetch instructions)."""
+        return self.words[addr]
+
+    def addresses(self) -> Iterable[int]:
+        """Returns addresses of words that may be non-zero."""
+        return range(len(self.words))
+
+    def copy(self) -> 'ListMemory':
+        """Returns a copy of memory."""
+        memory = ListMemory(0, [])
+        memory.words = self.words.copy()
+        return memory
+
+
+class CompactMemory:
+    """
+    Memory, represented as an array of fixed-width data words.
+
+    Each cell of `data` holds the first number of the word - the value that `LD` reads.
+    Full instruction words are kept in a side table (`code`), which covers the loaded program only.
+    Once an instruction is overwritten by `ST`, its side table entry is dropped.
+    """
+    # Data plane
+    data: 'array[int]'
+    # Instruction side table (None - cell is a data word)
+    code: list[Optional[Word]]
+
+    def __init__(self, capacity: int, program: Program, word_bits: int) -> None:
+        wrap = make_wrap(word_bits)
+
+        self.data = array(WORD_TYPECODES[word_bits], bytes(capacity * WORD_SIZES[word_bits]))
+        self.code = []
+        for addr, word in enumerate(program):
+            self.data[addr] = wrap(word[0])
+            self.code.append(word if len(word) > 1 else None)
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    def read(self, addr: int) -> int:
+        """Reads data word."""
+        return self.data[addr]
+
+    def write(self, addr: int, value: int) -> None:
+        """Writes data word."""
+        self.data[addr] = value
+        if 0 <= addr < len(self.code):
+            self.code[addr] = None
+
+    def word(self, addr: int) -> Word:
+        """Returns the whole word (used to fetch instructions)."""
+        if 0 <= addr < len(self.code):
+            word = self.code[addr]
+            if word is not None:
+                return word
+        return [self.data[addr]]
+
+    def addresses(self) -> Iterable[int]:
+        """Returns addresses of words that may be non-zero."""
+        return range(len(self.data))
+
+    def copy(self) -> 'CompactMemory':
+        """Returns a copy of memory (data plane is copied as a plain buffer)."""
+        # bypass `__init__`: nothing is allocated or loaded besides the copies
+        memory = CompactMemory.__new__(CompactMemory)
+        memory.data = self.data[:]
+        memory.code = self.code.copy()
+        return memory
+
+    def tobytes(self) -> bytes:
+        """Returns raw data plane."""
+        return self.data.tobytes()
+
+
+class PagedMemory:
+    """
+    Sparse memory, split into pages that are allocated on first write.
+
+    Reading untouched page returns 0 without allocation. Pages are arrays
+    if word width is fixed, lists of ints otherwise. Instructions are kept
+    in a side table (the same way as in `CompactMemory`).
+    """
+    # Memory capacity (words)
+    capacity: int
+    # Allocated pages (page number -> page)
+    pages: dict[int, 'list[int] | array[int]']
+    # Instruction side table (None - cell is a data word)
+    code: list[Optional[Word]]
+    # Page array typecode (None - pages are lists)
+    typecode: Optional[str]
+
+    def __init__(self, capacity: int, program: Program, word_bits: Optional[int] = None) -> None:
+        self.capacity = capacity
+        self.pages = {}
+        self.code = []
+        self.typecode = WORD_TYPECODES[word_bits] if word_bits is not None else None
+
+        wrap = make_wrap(word_bits) if word_bits is not None else None
+        for addr, word in enumerate(program):
+            value = word[0] if wrap is None else wrap(word[0])
+            if value != 0:
+                self._page(addr)[addr & PAGE_MASK] = value
+            self.code.append(word if len(word) > 1 else None)
+
+    def _page(self, addr: int) -> 'list[int] | array[int]':
+        """Returns page that contains address (allocates it if needed)."""
+        number = addr >> PAGE_BITS
+        page = self.pages.get(number)
+        if page is None:
+            if self.typecode is None:
+                page = [0] * PAGE_SIZE
+            else:
+                page = array(self.typecode, bytes(PAGE_SIZE * array(self.typecode).itemsize))
+            self.pages[number] = page
+        return page
+
+    def __len__(self) -> int:
+        return self.capacity
+
+    def read(self, addr: int) -> int:
+        """Reads data word."""
+        page = self.pages.get(addr >> PAGE_BITS)
+        if page is None:
+            return 0
+        return page[addr & PAGE_MASK]
+
+    def write(self, addr: int, value: int) -> None:
+        """Writes data word."""
+        self._page(addr)[addr & PAGE_MASK] = value
+        if addr < len(self.code):
+            self.code[addr] = None
+
+    def word(self, addr: int) -> Word:
+        """Returns the whole word (used to fetch instructions)."""
+        if 0 <= addr < len(self.code):
+            word = self.code[addr]
+            if word is not None:
+                return word
+        return [self.read(addr)]
+
+    def addresses(self) -> Iterable[int]:
+        """Returns addresses of words that may be non-zero (the program & allocated pages)."""
+        addresses = set(range(len(self.code)))
+        for number in self.pages:
+            start = number << PAGE_BITS
+            addresses.update(range(start, min(start + PAGE_SIZE, self.capacity)))
+        return sorted(addresses)
+
+    def copy(self) -> 'PagedMemory':
+        """Returns a copy of memory."""
+        memory = PagedMemory.__new__(PagedMemory)
+        memory.capacity = self.capacity
+        memory.typecode = self.typecode
+        memory.pages = {number: page[:] for number, page in self.pages.items()}
+        memory.code = self.code.copy()
+        return memory
+
+
+Memory = ListMemory | CompactMemory | PagedMemory
+
+
+def make_memory(
+    kind: MemoryKind,
+    capacity: int,
+    program: Program,
+    word_bits: Optional[int] = None,
+) -> Memory:
+    """Creates memory of the given kind."""
+    match kind:
+        case MemoryKind.COMPACT:
+            return CompactMemory(capacity, program, word_bits or DEFAULT_COMPACT_WORD_BITS)
+        case MemoryKind.PAGED:
+            return PagedMemory(capacity, program, word_bits)
+        case _:
+            return ListMemory(
+                capacity,
+                program,
+                make_wrap(word_bits) if word_bits is not None else None,
+            )
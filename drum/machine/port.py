@@ -0,0 +1,323 @@
+import os
+import stat
+import sys
+from enum import Enum
+from io import BufferedIOBase, StringIO
+from mmap import ACCESS_READ, mmap
+from typing import Optional, TextIO, cast
+
+from drum.machine.io import OutputEncoder, OutputFormat
+from drum.util.error import Result
+
+# Size of chunks streamed input is read by (bytes)
+INPUT_CHUNK_SIZE = 64 * 1024
+
+# Regular files bigger than that are memory-mapped instead of being read by chunks
+INPUT_MMAP_THRESHOLD = 1 << 20
+
+# Input file name that stands for stdin
+STDIN = '-'
+
+# Output buffer size (bytes) used by flushing output ports
+OUTPUT_BUFFER_SIZE = 64 * 1024
+
+# Byte that triggers flush with line flush policy
+NEWLINE = ord('\n')
+
+# Whitespace, stripped around input in strip mode (the same as `bytes.strip()`)
+WHITESPACE = b' \t\n\r\x0b\x0c'
+
+
+class EofPolicy(Enum):
+    """What `IN` does after the end of input."""
+    # Read EOF value
+    VALUE = 'value'
+    # Stop the machine with input fault
+    FAULT = 'fault'
+
+    @staticmethod
+    def get_by_alias(alias: str) -> Result['EofPolicy']:
+        """Returns EOF policy with provided alias. Error if it doesn't exist."""
+        for policy in EofPolicy:
+            if policy.value == alias:
+                return policy, None
+
+        return EofPolicy.VALUE, f"EOF policy {alias} doesn\'t exist"
+
+
+class InputPort:
+    """
+    Machine input port.
+
+    Input is either in-memory data or a binary file (regular file, pipe, stdin),
+    which is streamed by chunks, so memory usage doesn't depend on input size.
+    After the end of input `read()` returns `eof_value`.
+
+    In strip mode whitespace around input is skipped: leading whitespace is dropped
+    from the first chunks, trailing whitespace of a chunk is held back until it's known
+    whether more data follows.
+    """
+    # Value read after the end of input
+    eof_value: int
+    # Reading after the end of input is a fault (see `EofPolicy`)
+    fault_on_eof: bool
+    # Skip whitespace around input
+    strip: bool
+    # Streamed file (None - there is nothing left to stream)
+    _file: Optional[BufferedIOBase]
+    # Close the file when it's over (stdin is left open)
+    _owned: bool
+    # Memory map of the file (if it's mapped)
+    _mmap: Optional[mmap]
+    # Current chunk & read position in it
+    _chunk: 'bytes | mmap | list[int]'
+    _pos: int
+    _end: int
+    # Whitespace held back at the end of the previous chunk (strip mode)
+    _pending: bytes
+    # Leading whitespace has been stripped
+    _started: bool
+    # Number of bytes read (not counting EOF values)
+    consumed: int
+
+    def __init__(
+        self,
+        data: 'bytes | list[int]' = b'',
+        file: Optional[BufferedIOBase] = None,
+        eof_policy: EofPolicy = EofPolicy.VALUE,
+        eof_value: int = 0,
+        strip: bool = False,
+        owned: bool = True,
+    ) -> None:
+        self.eof_value = eof_value
+        self.fault_on_eof = eof_policy == EofPolicy.FAULT
+        self.strip = strip
+        self._file = file
+        self._owned = owned
+        self._mmap = None
+        self._chunk = data
+        self._pos = 0
+        self._end = len(data)
+        self._pending = b''
+        self._started = False
+        self.consumed = 0
+
+        if file is not None and self._should_map(file):
+            self._mmap = mmap(file.fileno(), 0, access=ACCESS_READ)
+            self._chunk = self._mmap
+            self._end = len(self._mmap)
+            self._release_file()
+
+        if strip and self._file is None:
+            self._strip_whole()
+
+    @staticmethod
+    def _should_map(file: BufferedIOBase) -> bool:
+        try:
+            st = os.fstat(file.fileno())
+        except (OSError, ValueError):
+            return False
+        return stat.S_ISREG(st.st_mode) and st.st_size >= INPUT_MMAP_THRESHOLD
+
+    def _strip_whole(self) -> None:
+        """Strips data that is already in memory (there is nothing to stream)."""
+        chunk = self._chunk
+        while self._pos < self._end and chunk[self._pos] in WHITESPACE:
+            self._pos += 1
+        while self._end > self._pos and chunk[self._end - 1] in WHITESPACE:
+            self._end -= 1
+        self._started = True
+
+    def _refill(self) -> bool:
+        """Loads the next chunk. False if input is over."""
+        while self._file is not None:
+            data = self._file.read1(INPUT_CHUNK_SIZE)
+            if not data:
+                self._release_file()
+                break
+
+            if self.strip:
+                if not self._started:
+                    data = data.lstrip(WHITESPACE)
+                    self._started = len(data) > 0
+                data = self._pending + data
+                stripped = data.rstrip(WHITESPACE)
+                self._pending = data[len(stripped):]
+                data = stripped
+
+            if data:
+                self._chunk = data
+                self._pos = 0
+                self._end = len(data)
+                return True
+
+        return False
+
+    def _release_file(self) -> None:
+        if self._file is not None and self._owned:
+            self._file.close()
+        self._file = None
+        self._pending = b''
+
+    def read(self) -> int:
+        """Reads byte. `eof_value` if input is over."""
+        if self._pos == self._end and not self._refill():
+            return self.eof_value
+
+        value = self._chunk[self._pos]
+        self._pos += 1
+        self.consumed += 1
+        return value
+
+    def skip(self, count: int) -> int:
+        """Skips bytes (as if they were read). Returns the number of skipped bytes."""
+        skipped = 0
+        while skipped < count and (self._pos < self._end or self._refill()):
+            step = min(count - skipped, self._end - self._pos)
+            self._pos += step
+            skipped += step
+        self.consumed += skipped
+        return skipped
+
+    def at_eof(self) -> bool:
+        """Checks whether input is over (may block waiting for streamed data)."""
+        return self._pos == self._end and not self._refill()
+
+    def close(self) -> None:
+        """Releases the file (and its memory map)."""
+        if self._mmap is not None:
+            self._chunk = b''
+            self._pos = self._end = 0
+            self._mmap.close()
+            self._mmap = None
+        self._release_file()
+
+
+def open_input_port(
+    file: str,
+    eof_policy: EofPolicy = EofPolicy.VALUE,
+    eof_value: int = 0,
+    strip: bool = False,
+) -> InputPort:
+    """Opens input port that streams the file (`STDIN` - standard input)."""
+    if file == STDIN:
+        return InputPort(
+            file=cast(BufferedIOBase, sys.stdin.buffer),
+            eof_policy=eof_policy,
+            eof_value=eof_value,
+            strip=strip,
+            owned=False,
+        )
+
+    return InputPort(
+        file=open(file, 'rb'),
+        eof_policy=eof_policy,
+        eof_value=eof_value,
+        strip=strip,
+    )
+
+
+class FlushPolicy(Enum):
+    """When output port writes buffered output."""
+    # Output is kept until the machine halts (flushed ahead if it outgrows the buffer)
+    HALT = 'halt'
+    # Buffer is flushed when it's full
+    FULL = 'full'
+    # Buffer is flushed on every newline byte (and when it's full)
+    LINE = 'line'
+
+    @staticmethod
+    def get_by_alias(alias: str) -> Result['FlushPolicy']:
+        """Returns flush policy with provided alias. Error if it doesn't exist."""
+        for policy in FlushPolicy:
+            if policy.value == alias:
+                return policy, None
+
+        return FlushPolicy.HALT, f"flush policy {alias} doesn\'t exist"
+
+
+class OutputPort:
+    """
+    Machine output port.
+
+    Bytes are buffered and written (formatted) into the sink as the flush policy says,
+    `buffer_size` bounds the buffer with any policy. Without sink, output is kept in memory
+    (see `getvalue()`), with the halt policy - as raw bytes (see `buffered()`).
+    """
+    # Formats output incrementally
+    encoder: OutputEncoder
+    # Formatted output destination
+    sink: TextIO
+    # Flush policy
+    flush_policy: FlushPolicy
+    # Buffer is flushed as soon as it reaches this size (bytes)
+    buffer_size: int
+    # Byte that triggers flush (-1 - none)
+    flush_byte: int
+    # Number of bytes sent to output
+    written: int
+    # Buffered bytes
+    _buffer: bytearray
+
+    def __init__(
+        self,
+        output_format: OutputFormat,
+        sink: Optional[TextIO] = None,
+        flush_policy: FlushPolicy = FlushPolicy.HALT,
+        buffer_size: int = OUTPUT_BUFFER_SIZE,
+    ) -> None:
+        self.encoder = OutputEncoder(output_format)
+        self.sink = sink if sink is not None else StringIO()
+        self.flush_policy = flush_policy
+        self.buffer_size = buffer_size
+        self.flush_byte = NEWLINE if flush_policy == FlushPolicy.LINE else -1
+        self.written = 0
+        self._buffer = bytearray()
+
+        if flush_policy == FlushPolicy.HALT and sink is None:
+            # in-memory output is the result, there is nowhere to flush it ahead
+            self.buffer_size = sys.maxsize
+
+    def write(self, value: int) -> None:
+        """Sends byte to output."""
+        buffer = self._buffer
+        buffer.append(value)
+        if len(buffer) >= self.buffer_size or value == self.flush_byte:
+            self.flush()
+
+    def write_bytes(self, data: bytes) -> None:
+        """Sends bytes to output."""
+        for value in data:
+            self.write(value)
+
+    def buffered(self) -> bytes:
+        """Returns bytes that haven't been written into the sink yet."""
+        return bytes(self._buffer)
+
+    def unformatted(self) -> bytes:
+        """Returns bytes that haven't been formatted into the sink (incomplete group + buffer)."""
+        return self.encoder.pending() + bytes(self._buffer)
+
+    def flush(self) -> None:
+        """Writes buffered bytes into the sink."""
+        self.written += len(self._buffer)
+        self.sink.write(self.encoder.encode(bytes(self._buffer)))
+        self.sink.flush()
+        self._buffer.clear()
+
+    def discard(self) -> None:
+        """Drops bytes that haven't been formatted into the sink (see `unformatted()`)."""
+        self.encoder.discard()
+        self._buffer.clear()
+
+    def close(self) -> None:
+        """Writes the rest of the output."""
+        self.flush()
+        self.sink.write(self.encoder.finish())
+        self.sink.flush()
+
+    def getvalue(self) -> str:
+        """Returns formatted output (if it's kept in memory)."""
+        if isinstance(self.sink, StringIO):
+            return self.sink.getvalue()
+        return ''
@@ -0,0 +1,66 @@
+from argparse import ArgumentParser
+
+from drum.common.debug import Symbolizer
+from drum.common.io import read_compiled
+from drum.common.profile import program_hash, read_profile
+from drum.machine.profiler import build_report, dumps_report, fmt_report
+from drum.util.io import eprint
+
+
+def get_parser() -> ArgumentParser:
+    parser = ArgumentParser(
+        description='Reports execution profile by instruction, op class & label',
+    )
+
+    parser.add_argument(
+        'compiled_file',
+        type=str,
+        help='Compiled (.drc) file the profile was collected for',
+    )
+    parser.add_argument(
+        'profile_file',
+        type=str,
+        help='Profile file (see drumr.py --profile)',
+    )
+    parser.add_argument(
+        '--json',
+        action='store_true',
+        help='Print report as JSON instead of text tables',
+    )
+    parser.add_argument(
+        '--top',
+        type=int,
+        default=None,
+        help='Number of the hottest instructions to print (all by default)',
+    )
+
+    return parser
+
+
+def cli() -> None:
+    parser = get_parser()
+
+    args = parser.parse_args()
+
+    exe = read_compiled(args.compiled_file, symbols=True)
+
+    try:
+        profile = read_profile(args.profile_file)
+    except (OSError, ValueError, KeyError) as e:
+        eprint(f'failed to read profile: {e}')
+        return
+
+    if profile.program_hash != program_hash(exe):
+        eprint(f'profile {args.profile_file} is of another program')
+        return
+
+    report = build_report(exe, profile, Symbolizer(exe))
+
+    try:
+        print(dumps_report(report) if args.json else fmt_report(report, args.top))
+    except BrokenPipeError:
+        pass
+
+
+if __name__ == '__main__':
+    cli()
@@ -0,0 +1,136 @@
+from dataclasses import asdict, dataclass
+from json import dumps
+from typing import Optional
+
+from drum.common.arch import BRANCH_OPS, CALC_OPS, IO_OPS, MEMORY_OPS, Executable, Op
+from drum.common.debug import Symbolizer
+from drum.common.io import disassemble
+from drum.common.profile import Profile
+from drum.machine.decode import decode_word
+
+
+def op_class(op: Op) -> str:
+    """Returns op class name (report group)."""
+    if op in CALC_OPS:
+        return 'calc'
+    if op in MEMORY_OPS:
+        return 'memory'
+    if op in IO_OPS:
+        return 'io'
+    if op in BRANCH_OPS:
+        return 'branch'
+    return 'other'
+
+
+@dataclass
+class ProfileRow:
+    """Counts of an instruction or a group of instructions."""
+    name: str
+    # Instruction address (None for groups)
+    address: Optional[int] = None
+    executions: int = 0
+    ticks: int = 0
+    # Executions of branches & how many of them were taken
+    branches: int = 0
+    taken: int = 0
+
+    def add(self, row: 'ProfileRow') -> None:
+        self.executions += row.executions
+        self.ticks += row.ticks
+        self.branches += row.branches
+        self.taken += row.taken
+
+
+@dataclass
+class ProfileReport:
+    """Profile aggregated by instruction, op class & enclosing label (rows sorted by ticks)."""
+    total: ProfileRow
+    instructions: list[ProfileRow]
+    op_classes: list[ProfileRow]
+    labels: list[ProfileRow]
+
+
+def _sorted(rows: list[ProfileRow]) -> list[ProfileRow]:
+    return sorted(rows, key=lambda row: (-row.ticks, -row.executions, row.name))
+
+
+def build_report(exe: Executable, profile: Profile, symbolizer: Symbolizer) -> ProfileReport:
+    """Aggregates profile of the program (labels & source lines are taken from `symbolizer`)."""
+    disassembly = disassemble(exe.program)
+
+    total = ProfileRow('total')
+    instructions = []
+    op_classes: dict[str, ProfileRow] = dict()
+    by_label: dict[str, ProfileRow] = dict()
+
+    for addr, executions in enumerate(profile.executions):
+        if executions == 0:
+            continue
+
+        row = ProfileRow(
+            f'{symbolizer.location(addr)}: {disassembly[addr]}',
+            addr,
+            executions,
+            profile.ticks[addr],
+        )
+
+        instruction, err = decode_word(exe.program[addr])
+        op = instruction.op if err is None else None
+        if op in BRANCH_OPS:
+            row.branches = executions
+            row.taken = profile.taken[addr]
+
+        instructions.append(row)
+        total.add(row)
+
+        class_name = op_class(op) if op is not None else 'other'
+        op_classes.setdefault(class_name, ProfileRow(class_name)).add(row)
+
+        label = symbolizer.label(addr)
+        label_name = label[0] if label is not None else '-'
+        by_label.setdefault(label_name, ProfileRow(label_name)).add(row)
+
+    return ProfileReport(
+        total,
+        _sorted(instructions),
+        _sorted(list(op_classes.values())),
+        _sorted(list(by_label.values())),
+    )
+
+
+def _fmt_rows(title: str, rows: list[ProfileRow], total: ProfileRow) -> list[str]:
+    names = [
+        f'{row.address:>4} {row.name}' if row.address is not None else row.name
+        for row in rows
+    ]
+    width = max([len(title), *(len(name) for name in names)])
+
+    lines = [f'{title:<{width}} {"ticks":>10} {"%":>6} {"executions":>10} {"taken%":>6}']
+    for name, row in zip(names, rows):
+        share = 100 * row.ticks / total.ticks if total.ticks else 0
+        taken = f'{100 * row.taken / row.branches:.1f}' if row.branches else '-'
+        lines.append(
+            f'{name:<{width}} {row.ticks:>10} {share:>6.1f} {row.executions:>10} {taken:>6}',
+        )
+    return lines
+
+
+def fmt_report(report: ProfileReport, top: Optional[int] = None) -> str:
+    """
+    Formats report as text tables (the hottest rows first, `top` - limit of instruction rows).
+
+    `taken%` - percent of taken branches.
+    """
+    total = report.total
+    lines = [f'{total.executions} instructions executed, {total.ticks} ticks', '']
+    lines += _fmt_rows('label', report.labels, total)
+    lines.append('')
+    lines += _fmt_rows('op class', report.op_classes, total)
+    lines.append('')
+    lines += _fmt_rows('instruction', report.instructions[:top], total)
+    return '\n'.join(lines)
+
+
+def dumps_report(report: ProfileReport) -> str:
+    """Serializes report (JSON)."""
+    return dumps(asdict(report), indent=2)
@@ -1,16 +1,49 @@
+import os
+import sys
 from logging import DEBUG
+from typing import Optional, TextIO
 
+from drum.common.arch import Executable
+from drum.common.debug import Symbolizer
 from drum.common.io import read_compiled
+from drum.common.profile import Profile, new_profile, program_hash, read_profile, write_profile
+from drum.machine.checkpoint import Checkpointer, read_checkpoint, restore_snapshot
 from drum.machine.io import OutputFormat
-from drum.machine.machine import exec_program
-from drum.util.error import Error
-from drum.util.io import read_from_file
+from drum.machine.machine import ExecutionMode, Limits, exec_program
+from drum.machine.memory import MemoryKind
+from drum.machine.port import (
+    OUTPUT_BUFFER_SIZE,
+    EofPolicy,
+    FlushPolicy,
+    OutputPort,
+    open_input_port,
+)
+from drum.machine.trace import BinaryTraceWriter, TraceCompression, TraceLevel
+from drum.util.error import Error, Result
 from drum.util.log import setup_logger
 
 
-def str_to_input_data(s: str) -> list[int]:
-    """Transforms string to input data."""
-    return [ord(c) for c in s] + [0]
+def _open_profile(profile_file: str, exe: Executable) -> Result[Profile]:
+    """Returns existing profile of the program (to add counts to) or a new one."""
+    if not os.path.exists(profile_file):
+        return new_profile(exe), None
+
+    profile = read_profile(profile_file)
+    if profile.program_hash != program_hash(exe):
+        return profile, f'profile {profile_file} is of another program'
+
+    return profile, None
+
+
+def _open_output(output_file: str, size: Optional[int]) -> TextIO:
+    """Opens output file. If `size` is provided, output is continued from that position."""
+    if size is None or not os.path.exists(output_file):
+        return open(output_file, 'w', encoding='utf-8')
+
+    sink = open(output_file, 'r+', encoding='utf-8')
+    sink.seek(size)
+    sink.truncate()
+    return sink
 
 
 def run(
@@ -19,17 +52,116 @@ def run(
     output_format: OutputFormat,
     logfile: str,
     log_level: int | str = DEBUG,
+    mode: ExecutionMode = ExecutionMode.INTERPRET,
+    cache_dir: Optional[str] = None,
+    memory_kind: MemoryKind = MemoryKind.LIST,
+    word_bits: Optional[int] = None,
+    memory_capacity: Optional[int] = None,
+    trace_level: Optional[TraceLevel] = None,
+    trace_file: Optional[str] = None,
+    trace_compression: TraceCompression = TraceCompression.NONE,
+    eof_policy: EofPolicy = EofPolicy.VALUE,
+    eof_value: int = 0,
+    strip_input: bool = True,
+    output_file: Optional[str] = None,
+    flush_policy: FlushPolicy = FlushPolicy.HALT,
+    output_buffer_size: int = OUTPUT_BUFFER_SIZE,
+    profile_file: Optional[str] = None,
+    limits: Optional[Limits] = None,
+    checkpoint_file: Optional[str] = None,
+    checkpoint_interval: Optional[float] = None,
+    resume_file: Optional[str] = None,
 ) -> Error:
     exe = read_compiled(compiled_file)
-    input_data = str_to_input_data(read_from_file(input_file))
 
     program = exe.program
     start = exe.start
 
+    checkpoint = None
+    if resume_file is not None:
+        checkpoint = read_checkpoint(resume_file)
+        if checkpoint.program_hash != program_hash(exe):
+            return f'checkpoint {resume_file} is of another program'
+        # the state is restored into the same machine
+        memory_kind = checkpoint.memory_kind
+        word_bits = checkpoint.word_bits
+        memory_capacity = checkpoint.memory_capacity
+
+    if memory_capacity is not None and memory_capacity < len(program):
+        return f'memory capacity ({memory_capacity}) is less than program size ({len(program)})'
+
     setup_logger('machine', logfile=logfile, log_level=log_level)
 
-    output = exec_program(program, output_format, start=start, input_data=input_data)
+    input_port = open_input_port(input_file, eof_policy, eof_value, strip=strip_input)
+    if checkpoint is not None:
+        if input_port.skip(checkpoint.input_position) < checkpoint.input_position:
+            return f'input is shorter than at the checkpoint ({checkpoint.input_position} bytes)'
+
+    # output is streamed unless it's printed as a whole after halt (the default)
+    sink: Optional[TextIO] = None
+    output_port = None
+    if output_file is not None or flush_policy != FlushPolicy.HALT:
+        sink = sys.stdout
+        if output_file is not None:
+            sink = _open_output(output_file, checkpoint.output_size if checkpoint else None)
+        output_port = OutputPort(output_format, sink, flush_policy, output_buffer_size)
+        if checkpoint is not None and checkpoint.output_size:
+            output_port.encoder.mark_started()
+
+    trace_writer = None
+    if trace_file is not None:
+        trace_writer = BinaryTraceWriter(trace_file, trace_compression)
+
+    profile = None
+    if profile_file is not None:
+        profile, err = _open_profile(profile_file, exe)
+        if err is not None:
+            return err
+
+    checkpointer = None
+    if checkpoint_file is not None:
+        checkpointer = Checkpointer(checkpoint_file, exe, memory_kind, checkpoint_interval)
+        checkpointer.install()
+
+    output = exec_program(
+        program,
+        output_format,
+        start=start,
+        input_data=input_port,
+        mode=mode,
+        cache_dir=cache_dir,
+        memory_kind=memory_kind,
+        word_bits=word_bits,
+        memory_capacity=memory_capacity,
+        trace_level=trace_level,
+        trace_writer=trace_writer,
+        output_port=output_port,
+        profile=profile,
+        symbolizer=Symbolizer(exe, compiled_file),
+        limits=limits,
+        snapshot=restore_snapshot(exe, checkpoint) if checkpoint is not None else None,
+        monitor=checkpointer,
+    )
+    if checkpointer is not None:
+        checkpointer.uninstall()
+
+    input_port.close()
+    if trace_writer is not None:
+        trace_writer.close()
+
+    if profile_file is not None and profile is not None:
+        write_profile(profile_file, profile)
+
+    if checkpointer is not None and checkpointer.stopped:
+        if sink is not None and sink is not sys.stdout:
+            sink.close()
+        return f'stopped, resume with --resume {checkpoint_file}'
 
-    print(output)
+    if output_port is None:
+        print(output)
+    elif output_file is None:
+        print()
+    elif sink is not None:
+        sink.close()
 
     return None
@@ -0,0 +1,281 @@
+from bisect import bisect_right
+from dataclasses import dataclass
+from typing import Optional
+
+from drum.common.arch import Executable
+from drum.machine.blocks import OP_TICKS, compile_blocks
+from drum.machine.decode import decode_word
+from drum.machine.io import OutputFormat
+from drum.machine.machine import (
+    LIMIT_CHECK_INTERVAL,
+    ControlUnit,
+    ExecutionMode,
+    ExecutionResult,
+    Limits,
+    MachineSnapshot,
+    make_control_unit,
+    run_untraced,
+)
+from drum.machine.memory import MemoryKind
+from drum.machine.port import EofPolicy, InputPort, OutputPort
+
+# Default limit of memory held by keyframes (bytes, estimated)
+DEFAULT_RECORDING_MEMORY = 256 << 20
+
+# Estimated size of a memory word in a keyframe (bytes)
+_WORD_SIZE = 8
+
+
+@dataclass(frozen=True)
+class Keyframe:
+    """Full machine state at some point of the recorded run."""
+    snapshot: MachineSnapshot
+    # Number of input values read before that point
+    input_position: int
+
+
+class _TapeInputPort(InputPort):
+    """Input port that logs every value read (the only input the run depends on)."""
+    # Values read
+    tape: list[int]
+
+    def __init__(self, data: bytes, eof_policy: EofPolicy, eof_value: int, strip: bool) -> None:
+        super().__init__(data, eof_policy=eof_policy, eof_value=eof_value, strip=strip)
+        self.tape = []
+
+    def read(self) -> int:
+        consumed = self.consumed
+        value = super().read()
+        if self.consumed != consumed:
+            self.tape.append(value)
+        return value
+
+
+@dataclass
+class Recording:
+    """Recorded run (see `record()`)."""
+    exe: Executable
+    memory_kind: MemoryKind
+    word_bits: Optional[int]
+    memory_capacity: int
+    eof_policy: EofPolicy
+    eof_value: int
+    # Keyframes, ordered by instruction counter (the first one is the initial state)
+    keyframes: list[Keyframe]
+    # Input values read by the run (I/O log)
+    input: list[int]
+    # How the run ended
+    result: ExecutionResult
+
+
+class Recorder:
+    """
+    Machine monitor (see `Monitor`) that takes keyframes every `interval` instructions
+    (at the first check after that, see `Watchdog`).
+
+    If keyframes take more than `memory_limit` bytes, every other one is dropped
+    and the interval is doubled.
+    """
+    # Keyframes taken so far
+    keyframes: list[Keyframe]
+    # Instructions between keyframes
+    interval: int
+    # Limit of memory held by keyframes (bytes)
+    memory_limit: int
+    # Counter value the next keyframe is taken at
+    next_counter: int
+    # Memory held by keyframes (bytes, estimated)
+    size: int
+
+    def __init__(self, control_unit: ControlUnit, interval: int, memory_limit: int) -> None:
+        self.keyframes = []
+        self.interval = interval
+        self.memory_limit = memory_limit
+        self.next_counter = 0
+        self.size = 0
+        self(control_unit)
+
+    @staticmethod
+    def _size(keyframe: Keyframe) -> int:
+        snapshot = keyframe.snapshot
+        return len(snapshot.memory) * _WORD_SIZE + len(snapshot.output)
+
+    def __call__(self, control_unit: ControlUnit) -> bool:
+        if control_unit.counter() < self.next_counter:
+            return True
+
+        keyframe = Keyframe(control_unit.snapshot(), control_unit.data_path.input_port.consumed)
+        self.keyframes.append(keyframe)
+        self.size += self._size(keyframe)
+        self.next_counter = control_unit.counter() + self.interval
+
+        if self.size > self.memory_limit and len(self.keyframes) > 2:
+            self.keyframes = self.keyframes[::2]
+            self.size = sum(map(self._size, self.keyframes))
+            self.interval *= 2
+        return True
+
+
+def record(
+    exe: Executable,
+    input_data: bytes = b'',
+    mode: ExecutionMode = ExecutionMode.DECODED,
+    cache_dir: Optional[str] = None,
+    memory_kind: MemoryKind = MemoryKind.LIST,
+    word_bits: Optional[int] = None,
+    memory_capacity: Optional[int] = None,
+    eof_policy: EofPolicy = EofPolicy.VALUE,
+    eof_value: int = 0,
+    strip_input: bool = False,
+    limits: Optional[Limits] = None,
+    interval: int = LIMIT_CHECK_INTERVAL,
+    memory_limit: int = DEFAULT_RECORDING_MEMORY,
+) -> Recording:
+    """
+    Executes a program on in-memory input (see `execute()`), recording it
+    for `TimeTravelDebugger`.
+
+    Keyframes are taken every `interval` instructions (at block exits in block mode),
+    between them only input is logged:
+    the machine is deterministic, so any other state is restored by replaying
+    from the nearest keyframe (at most `interval` instructions).
+    """
+    input_port = _TapeInputPort(input_data, eof_policy, eof_value, strip_input)
+    output_port = OutputPort(OutputFormat.BYTESS)
+    control_unit = make_control_unit(
+        exe.program,
+        exe.start,
+        input_port,
+        output_port=output_port,
+        memory_kind=memory_kind,
+        word_bits=word_bits,
+        memory_capacity=memory_capacity,
+    )
+    data_path = control_unit.data_path
+    recorder = Recorder(control_unit, interval, memory_limit)
+
+    blocks_code = None
+    if mode == ExecutionMode.BLOCKS:
+        blocks_code = compile_blocks(exe.program, exe.start, data_path.word_bits, cache_dir)
+    run_untraced(
+        control_unit,
+        mode,
+        blocks_code,
+        limits,
+        recorder,
+        min(interval, LIMIT_CHECK_INTERVAL),
+    )
+
+    return Recording(
+        exe,
+        memory_kind,
+        data_path.word_bits,
+        data_path.memory_capacity,
+        eof_policy,
+        eof_value,
+        recorder.keyframes,
+        input_port.tape,
+        ExecutionResult(
+            output_port.buffered(),
+            control_unit.counter(),
+            control_unit.tick(),
+            control_unit.error,
+            control_unit.limit,
+        ),
+    )
+
+
+class TimeTravelDebugger:
+    """
+    Moves machine state of a recorded run back and forth.
+
+    Seeking restores the nearest keyframe before the target (unless the target is ahead
+    of the current state and closer than that) and replays the rest in the pre-decoded
+    mode, so any point is reached by replaying at most a keyframe interval.
+    """
+    recording: Recording
+    # Machine in the current state
+    control_unit: ControlUnit
+
+    def __init__(self, recording: Recording) -> None:
+        self.recording = recording
+        self.control_unit = make_control_unit(
+            recording.exe.program,
+            recording.exe.start,
+            memory_kind=recording.memory_kind,
+            word_bits=recording.word_bits,
+            memory_capacity=recording.memory_capacity,
+        )
+        self._restore(recording.keyframes[0])
+
+    def _restore(self, keyframe: Keyframe) -> None:
+        recording = self.recording
+        data_path = self.control_unit.data_path
+        data_path.input_port = InputPort(
+            recording.input,
+            eof_policy=recording.eof_policy,
+            eof_value=recording.eof_value,
+        )
+        data_path.input_port.skip(keyframe.input_position)
+        data_path.output_port = OutputPort(OutputFormat.BYTESS)
+        self.control_unit.restore(keyframe.snapshot)
+        self.control_unit.predecode()
+
+    def _rewind(self, keyframe: Keyframe, forward: bool) -> None:
+        """
+        Restores the keyframe before the target, unless the target is ahead
+        and the current state is closer to it.
+        """
+        if not forward or keyframe.snapshot.counter > self.control_unit.counter():
+            self._restore(keyframe)
+
+    def position(self) -> int:
+        """Returns the current point (number of executed instructions)."""
+        return self.control_unit.counter()
+
+    def end(self) -> int:
+        """Returns the last point of the run."""
+        return self.recording.result.instructions
+
+    def seek(self, counter: int) -> None:
+        """Moves to the state after `counter` instructions (clamped to the run)."""
+        counter = max(0, min(counter, self.end()))
+        control_unit = self.control_unit
+        keyframes = self.recording.keyframes
+        i = bisect_right(keyframes, counter, key=lambda keyframe: keyframe.snapshot.counter)
+        self._rewind(keyframes[max(i - 1, 0)], counter >= control_unit.counter())
+
+        if counter > control_unit.counter():
+            control_unit.run_decoded(counter - control_unit.counter())
+
+    def seek_tick(self, tick: int) -> None:
+        """Moves to the last instruction boundary at or before the tick."""
+        control_unit = self.control_unit
+        keyframes = self.recording.keyframes
+        i = bisect_right(keyframes, tick, key=lambda keyframe: keyframe.snapshot.tick)
+        self._rewind(keyframes[max(i - 1, 0)], tick >= control_unit.tick())
+
+        # every instruction takes 1-2 ticks: run in bulk while it can't overshoot
+        while tick - control_unit.tick() >= 4 and control_unit.counter() < self.end():
+            steps = min((tick - control_unit.tick()) // 2, self.end() - control_unit.counter())
+            control_unit.run_decoded(steps)
+
+        while control_unit.counter() < self.end():
+            instruction, err = decode_word(
+                control_unit.program.word(control_unit.instruction_pointer),
+            )
+            if err is not None or control_unit.tick() + OP_TICKS[instruction.op] > tick:
+                break
+            control_unit.run_decoded(1)
+
+    def step(self, count: int = 1) -> None:
+        """Executes `count` instructions forward."""
+        self.seek(self.position() + count)
+
+    def step_back(self, count: int = 1) -> None:
+        """Moves `count` instructions back."""
+        self.seek(self.position() - count)
+
+    def state(self) -> MachineSnapshot:
+        """Returns the current state (memory is copied)."""
+        return self.control_unit.snapshot()
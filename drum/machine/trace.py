@@ -0,0 +1,240 @@
+from dataclasses import dataclass
+from enum import Enum
+from gzip import GzipFile
+from lzma import LZMAFile
+from struct import Struct
+from typing import BinaryIO, Iterable, Iterator, Optional
+
+from drum.common.arch import REGISTER_COUNT, Program
+from drum.common.debug import Symbolizer
+from drum.common.fmt import fmt_state
+from drum.machine.memory import make_wrap
+from drum.util.error import Result
+
+
+class TraceLevel(Enum):
+    """Machine execution trace level."""
+    # No trace, the fastest execution loop is used
+    OFF = 'off'
+    # Machine state after every instruction
+    INSTRUCTION = 'instruction'
+    # Machine state after every instruction + memory writes and output
+    MICRO_OP = 'micro-op'
+
+    @staticmethod
+    def get_by_alias(alias: str) -> Result['TraceLevel']:
+        """Returns trace level with provided alias. Error if it doesn't exist."""
+        for level in TraceLevel:
+            if level.value == alias:
+                return level, None
+
+        return TraceLevel.OFF, f"trace level {alias} doesn\'t exist"
+
+
+class TraceCompression(Enum):
+    """Binary trace compression."""
+    NONE = 'none'
+    GZIP = 'gzip'
+    LZMA = 'lzma'
+
+    @staticmethod
+    def get_by_alias(alias: str) -> Result['TraceCompression']:
+        """Returns trace compression with provided alias. Error if it doesn't exist."""
+        for compression in TraceCompression:
+            if compression.value == alias:
+                return compression, None
+
+        return TraceCompression.NONE, f"trace compression {alias} doesn\'t exist"
+
+
+# Binary trace file magic & format version
+TRACE_MAGIC = b'DRTR'
+TRACE_VERSION = 1
+
+# Header: magic, version, compression (index in TraceCompression)
+TRACE_HEADER = Struct('<4sHB')
+
+# Record: tick, IP, data address, memory value (at data address),
+# changed register index (NO_REGISTER if none), new register value, opcode (at IP)
+TRACE_RECORD = Struct('<QqqqBqq')
+NO_REGISTER = 0xff
+
+# How many records are buffered before being written
+TRACE_BUFFER_RECORDS = 4096
+
+_COMPRESSIONS = list(TraceCompression)
+
+# Values are stored as 64-bit words
+_wrap64 = make_wrap(64)
+
+
+@dataclass(frozen=True, slots=True)
+class TraceRecord:
+    """Binary trace record (machine state after an instruction)."""
+    tick: int
+    instruction_pointer: int
+    data_address: int
+    memory_value: int
+    register: int
+    register_value: int
+    opcode: int
+
+
+def _open_compressed(raw: BinaryIO, compression: TraceCompression, mode: str) -> BinaryIO:
+    match compression:
+        case TraceCompression.GZIP:
+            return GzipFile(fileobj=raw, mode=mode)  # type: ignore
+        case TraceCompression.LZMA:
+            return LZMAFile(raw, mode=mode)  # type: ignore
+        case _:
+            return raw
+
+
+class BinaryTraceWriter:
+    """
+    Streaming binary trace writer.
+
+    Records have fixed size. Only register delta is stored (at most one register
+    changes per instruction), the full state is restored by the reader.
+    """
+    # Underlying file
+    _raw: BinaryIO
+    # Stream records are written to (possibly compressing)
+    _stream: BinaryIO
+    # Record buffer
+    _buffer: bytearray
+    # Number of records in the buffer
+    _buffered: int
+    # Registers at the moment of previous record
+    _registers: list[int]
+
+    def __init__(self, file: str, compression: TraceCompression = TraceCompression.NONE) -> None:
+        self._raw = open(file, 'wb')
+        self._raw.write(TRACE_HEADER.pack(
+            TRACE_MAGIC,
+            TRACE_VERSION,
+            _COMPRESSIONS.index(compression),
+        ))
+        self._stream = _open_compressed(self._raw, compression, 'wb')
+        self._buffer = bytearray(TRACE_RECORD.size * TRACE_BUFFER_RECORDS)
+        self._buffered = 0
+        self._registers = [0] * REGISTER_COUNT
+
+    def record(
+        self,
+        tick: int,
+        instruction_pointer: int,
+        data_address: int,
+        memory_value: int,
+        registers: list[int],
+        opcode: int,
+    ) -> None:
+        """Appends record."""
+        register = NO_REGISTER
+        register_value = 0
+        if registers != self._registers:
+            for index, (old, new) in enumerate(zip(self._registers, registers)):
+                if old != new:
+                    register = index
+                    register_value = new
+                    break
+            self._registers[:] = registers
+
+        TRACE_RECORD.pack_into(
+            self._buffer,
+            self._buffered * TRACE_RECORD.size,
+            tick,
+            instruction_pointer,
+            data_address,
+            _wrap64(memory_value),
+            register,
+            _wrap64(register_value),
+            _wrap64(opcode),
+        )
+        self._buffered += 1
+        if self._buffered == TRACE_BUFFER_RECORDS:
+            self.flush()
+
+    def flush(self) -> None:
+        """Writes buffered records."""
+        self._stream.write(memoryview(self._buffer)[:self._buffered * TRACE_RECORD.size])
+        self._buffered = 0
+
+    def close(self) -> None:
+        """Flushes records and closes the file."""
+        self.flush()
+        if self._stream is not self._raw:
+            self._stream.close()
+        self._raw.close()
+
+
+def read_trace(file: str) -> Iterator[TraceRecord]:
+    """Reads binary trace records one by one (streaming)."""
+    with open(file, 'rb') as raw:
+        magic, version, compression_index = TRACE_HEADER.unpack(raw.read(TRACE_HEADER.size))
+        if magic != TRACE_MAGIC:
+            raise ValueError(f'{file} is not a drum trace')
+        if version != TRACE_VERSION:
+            raise ValueError(f'unsupported trace version: {version}')
+
+        stream = _open_compressed(raw, _COMPRESSIONS[compression_index], 'rb')
+        chunk_size = TRACE_RECORD.size * TRACE_BUFFER_RECORDS
+        tail = b''
+        while True:
+            chunk = stream.read(chunk_size)
+            if not chunk:
+                break
+
+            chunk = tail + chunk
+            complete_size = len(chunk) - len(chunk) % TRACE_RECORD.size
+            tail = chunk[complete_size:]
+
+            for fields in TRACE_RECORD.iter_unpack(chunk[:complete_size]):
+                yield TraceRecord(*fields)
+
+
+def render_trace(
+    records: Iterable[TraceRecord],
+    program: Program,
+    from_tick: int = 0,
+    to_tick: Optional[int] = None,
+    symbolizer: Optional[Symbolizer] = None,
+) -> Iterator[str]:
+    """
+    Renders records into text trace (the same format, as in the machine log).
+
+    Registers are restored from deltas, so records are replayed from the beginning,
+    but only the ones in [from_tick, to_tick] are formatted. Instructions are taken
+    from the program (opcode from the record is used if the program was modified).
+    `symbolizer` annotates lines with source locations.
+    """
+    registers = [0] * REGISTER_COUNT
+
+    for record in records:
+        if record.register != NO_REGISTER:
+            registers[record.register] = record.register_value
+
+        if record.tick < from_tick:
+            continue
+        if to_tick is not None and record.tick > to_tick:
+            break
+
+        ip = record.instruction_pointer
+        instruction = program[ip] if 0 <= ip < len(program) else [0]
+        if instruction[0] != record.opcode:
+            instruction = [record.opcode]
+
+        s, err = fmt_state(
+            record.tick,
+            ip,
+            record.data_address,
+            record.memory_value,
+            registers,
+            instruction,
+        )
+        if err is not None:
+            s += f'<{err}>'
+        if symbolizer is not None:
+            s = symbolizer.annotate(s, ip)
+
+        yield s
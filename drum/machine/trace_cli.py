@@ -0,0 +1,65 @@
+import os
+import sys
+from argparse import ArgumentParser
+
+from drum.common.debug import Symbolizer
+from drum.common.io import read_compiled
+from drum.machine.trace import read_trace, render_trace
+from drum.util.io import eprint
+
+
+def get_parser() -> ArgumentParser:
+    parser = ArgumentParser(description='Renders binary execution trace as text')
+
+    parser.add_argument(
+        'compiled_file',
+        type=str,
+        help='Compiled (.drc) file the trace was recorded for',
+    )
+    parser.add_argument(
+        'trace_file',
+        type=str,
+        help='Binary trace file',
+    )
+    parser.add_argument(
+        '--from-tick',
+        type=int,
+        default=0,
+        help='Render records starting from this tick',
+    )
+    parser.add_argument(
+        '--to-tick',
+        type=int,
+        default=None,
+        help='Render records up to this tick (inclusive)',
+    )
+
+    return parser
+
+
+def cli() -> None:
+    parser = get_parser()
+
+    args = parser.parse_args()
+
+    exe = read_compiled(args.compiled_file)
+
+    try:
+        for line in render_trace(
+            read_trace(args.trace_file),
+            exe.program,
+            from_tick=args.from_tick,
+            to_tick=args.to_tick,
+            symbolizer=Symbolizer(exe, args.compiled_file),
+        ):
+            print(line)
+    except BrokenPipeError:
+        # reader has gone (e.g. `drumt ... | head`), keep interpreter from flushing into it
+        devnull = os.open(os.devnull, os.O_WRONLY)
+        os.dup2(devnull, sys.stdout.fileno())
+    except (OSError, ValueError) as e:
+        eprint(f'failed to read trace: {e}')
+
+
+if __name__ == '__main__':
+    cli()
@@ -0,0 +1,76 @@
+import os
+import tempfile
+
+import pytest
+
+from drum.compiler import compile
+from drum.machine.batch import BatchOptions, BatchResult, run_batch, run_prefix
+from drum.machine.machine import ExecutionMode
+from drum.util.io import write_to_file
+
+# Prints '>' & echoes input
+SOURCE = '''_start:
+    ADDI %R1, %R0, 62
+    OUT %R1
+LOOP:
+    IN %R1
+    BEQ %R1, %R0, END
+    OUT %R1
+    BEQ %R0, %R0, LOOP
+END:
+    HLT
+'''
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_batch_results(workers) -> None:
+    """Every input should get its own result, in the order of inputs."""
+    translation_result, error = compile.compile_source(SOURCE)
+    assert error is None
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        files = [os.path.join(tmpdir, f'{i}.txt') for i in range(3)]
+        for file, data in zip(files, ['ab', '', 'xyz']):
+            write_to_file(file, data)
+        missing = os.path.join(tmpdir, 'missing.txt')
+
+        results = list(run_batch(
+            translation_result.exe,
+            [*files, missing],
+            BatchOptions(),
+            workers=workers,
+        ))
+
+    assert results[:3] == [
+        BatchResult(files[0], '>ab', 12, 12, None),
+        BatchResult(files[1], '>', 4, 4, None),
+        BatchResult(files[2], '>xyz', 16, 16, None),
+    ]
+    assert results[3] == BatchResult(
+        missing,
+        '',
+        0,
+        0,
+        f"failed to open input: [Errno 2] No such file or directory: '{missing}'",
+    )
+
+
+def test_prefix_snapshot() -> None:
+    """Prefix should stop right before the first `IN`, inputs resumed from it run the rest."""
+    translation_result, error = compile.compile_source(SOURCE)
+    assert error is None
+    exe = translation_result.exe
+
+    snapshot = run_prefix(exe, BatchOptions())
+    assert (snapshot.instruction_pointer, snapshot.counter, snapshot.tick) == (2, 2, 2)
+    assert (snapshot.registers[1], snapshot.output) == (62, b'>')
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        file = os.path.join(tmpdir, 'input.txt')
+        write_to_file(file, 'ab')
+        results = [
+            list(run_batch(exe, [file], BatchOptions(mode=mode, snapshot=True), workers=1))
+            for mode in ExecutionMode
+        ]
+
+    assert results == [[BatchResult(file, '>ab', 12, 12, None)]] * len(ExecutionMode)
@@ -0,0 +1,80 @@
+import os
+import tempfile
+
+import pytest
+
+from drum.common.arch import Executable
+from drum.common.binary import (
+    BINARY_HEADER,
+    BINARY_MAGIC,
+    BINARY_VERSION,
+    WORD_SLOTS,
+    encode_binary,
+    is_binary,
+    read_binary,
+    read_binary_disassembly,
+)
+
+# Program of an instruction, a data word and a zero data word
+PROGRAM = [[12, 1], [-7], [0]]
+
+
+@pytest.mark.parametrize('big, size', [(0, 4), (1 << 31, 8)], ids=['int32', 'int64'])
+def test_binary_round_trip(big, size) -> None:
+    """Values should take the smallest size that fits them all, words should be read back."""
+    exe = Executable(1, [*PROGRAM, [big]])
+    data, error = encode_binary(exe)
+    assert error is None
+
+    count = len(exe.program)
+    header = BINARY_HEADER.unpack_from(data)
+    assert header == (BINARY_MAGIC, BINARY_VERSION, size, 1, count, 0)
+    # word lengths are padded to the value size
+    lengths = bytes([2, 1, 1, 1]).ljust(size, b'\0')
+    assert data[BINARY_HEADER.size:BINARY_HEADER.size + size] == lengths
+    assert len(data) == BINARY_HEADER.size + size + count * WORD_SLOTS * size
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        file = os.path.join(tmpdir, 'exe.drc')
+        with open(file, 'wb') as f:
+            f.write(data)
+
+        assert is_binary(file)
+        assert read_binary(file) == exe
+        assert read_binary_disassembly(file) is None
+
+        with open(file, 'wb') as f:
+            f.write(data[:-1])
+        with pytest.raises(ValueError, match='truncated'):
+            read_binary(file)
+
+        version = BINARY_VERSION + 1
+        with open(file, 'wb') as f:
+            f.write(data[:4] + bytes([version]) + data[5:])
+        with pytest.raises(ValueError, match=f'unsupported binary executable version: {version}'):
+            read_binary(file)
+
+
+def test_binary_disassembly() -> None:
+    """Disassembly should be kept in the symbol section."""
+    exe = Executable(0, PROGRAM)
+    data, error = encode_binary(exe, ['OUT %R1', '#-7', '#0'])
+    assert error is None
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        file = os.path.join(tmpdir, 'exe.drc')
+        with open(file, 'wb') as f:
+            f.write(data)
+
+        assert read_binary(file) == exe
+        assert read_binary_disassembly(file) == ['OUT %R1', '#-7', '#0']
+
+
+@pytest.mark.parametrize('program, message', [
+    ([[12, 1], []], 'invalid word: []'),
+    ([[1, 2, 3, 4, 5]], 'invalid word: [1, 2, 3, 4, 5]'),
+    ([[1 << 63]], "value doesn't fit into 64 bits"),
+], ids=['empty', 'long', 'big'])
+def test_binary_errors(program, message) -> None:
+    """Words that can't be encoded should give an error."""
+    assert encode_binary(Executable(0, program)) == (b'', message)
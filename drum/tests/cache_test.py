@@ -0,0 +1,57 @@
+from concurrent.futures import ThreadPoolExecutor
+import os
+import tempfile
+
+from drum.util.cache import evict, hash_key, read_cached, write_cached
+
+
+def test_hash_key() -> None:
+    """Parts should be delimited: moving bytes between parts changes the key."""
+    assert hash_key(b'ab', b'c') != hash_key(b'a', b'bc')
+    assert hash_key(b'ab', b'c') == hash_key(b'ab', b'c')
+
+
+def test_lru_eviction() -> None:
+    """Least recently used entries should be removed first (reading an entry is a use)."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        files = [os.path.join(tmpdir, name) for name in 'abcd']
+        for i, file in enumerate(files[:3]):
+            write_cached(file, bytes(10))
+            os.utime(file, (i, i))
+
+        assert read_cached(files[0]) == bytes(10)
+        assert read_cached(os.path.join(tmpdir, 'missing')) is None
+
+        # 'b' is the least recently used now, then 'c'
+        write_cached(files[3], bytes(10), max_size=25)
+        assert sorted(os.listdir(tmpdir)) == ['a', 'd']
+
+        evict(tmpdir, 0)
+        assert os.listdir(tmpdir) == []
+
+
+def test_concurrent_writes() -> None:
+    """Concurrent readers should only ever see complete entries."""
+    size = 1 << 20
+    entries = [bytes([i]) * size for i in range(8)]
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        file = os.path.join(tmpdir, 'entry')
+        write_cached(file, entries[0])
+
+        def write(data: bytes) -> None:
+            write_cached(file, data, max_size=2 * size)
+
+        def read(_: int) -> bytes | None:
+            return read_cached(file)
+
+        with ThreadPoolExecutor(8) as pool:
+            writes = [pool.submit(write, data) for data in entries * 4]
+            reads = list(pool.map(read, range(64)))
+            for future in writes:
+                future.result()
+
+        assert all(data in entries for data in reads)
+        assert read_cached(file) in entries
+        # no temporary files are left behind
+        assert os.listdir(tmpdir) == ['entry']
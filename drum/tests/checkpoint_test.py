@@ -0,0 +1,185 @@
+from contextlib import redirect_stdout
+from io import BytesIO, StringIO
+import os
+import signal
+import sys
+import tempfile
+from types import SimpleNamespace
+import zlib
+
+import pytest
+
+from drum.common.profile import program_hash
+from drum.compiler import compile
+from drum.machine import run as machine
+from drum.machine.checkpoint import (
+    CHECKPOINT_HEADER,
+    CHECKPOINT_MAGIC,
+    STOP_SIGNAL,
+    Checkpoint,
+    decode_checkpoint,
+    encode_checkpoint,
+    make_checkpoint,
+    restore_snapshot,
+)
+from drum.machine.io import OutputFormat
+from drum.machine.machine import ExecutionMode, Limits, make_control_unit, run_untraced
+from drum.machine.memory import MemoryKind
+from drum.machine.port import FlushPolicy, InputPort, OutputPort
+from drum.util.io import write_to_file
+
+# Reads a byte & outputs it 10000 times
+SOURCE = '''_start:
+    IN %R1
+    ADDI %R2, %R0, 10000
+LOOP:
+    OUT %R1
+    SUBI %R2, %R2, 1
+    BNE %R2, %R0, LOOP
+    HLT
+'''
+
+
+class _Pipe(StringIO):
+    """Standard output redirected into a pipe (isn't seekable)."""
+
+    def seekable(self) -> bool:
+        return False
+
+
+class _StoppingInput(BytesIO):
+    """Standard input that sends the stop signal when it's read."""
+
+    def read1(self, size: int = -1) -> bytes:
+        signal.raise_signal(STOP_SIGNAL)
+        return super().read1(size)
+
+
+def _run(compiled_file: str, stdin: BytesIO, tmp_dir: str, **options) -> tuple[str, str]:
+    """Runs the machine on the standard streams, returns the error & the output."""
+    stdout = _Pipe()
+    saved_stdin = sys.stdin
+    sys.stdin = SimpleNamespace(buffer=stdin)  # type: ignore
+    try:
+        with redirect_stdout(stdout):
+            error = machine.run(
+                compiled_file,
+                '-',
+                OutputFormat.BYTESS,
+                os.path.join(tmp_dir, 'machine.log'),
+                log_level='WARNING',
+                mode=ExecutionMode.DECODED,
+                flush_policy=FlushPolicy.FULL,
+                output_buffer_size=100,
+                **options,
+            )
+    finally:
+        sys.stdin = saved_stdin
+    return error, stdout.getvalue()
+
+
+def test_stop_and_resume_stdout() -> None:
+    """Output of a run stopped mid-output & resumed shouldn't lose or repeat anything."""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        source_file = os.path.join(tmp_dir, 'source.dr')
+        compiled_file = os.path.join(tmp_dir, 'source.drc')
+        checkpoint_file = os.path.join(tmp_dir, 'run.drck')
+        write_to_file(source_file, SOURCE)
+        assert compile.run(source_file, compiled_file) is None
+
+        error, stopped_output = _run(
+            compiled_file,
+            _StoppingInput(b'x'),
+            tmp_dir,
+            checkpoint_file=checkpoint_file,
+        )
+        assert error == f'stopped, resume with --resume {checkpoint_file}'
+        # stopped at the first limit check (3333 bytes output), output is written by 100 bytes,
+        # the rest is held by the checkpoint
+        assert stopped_output == ', '.join(['120'] * 3300)
+
+        error, resumed_output = _run(
+            compiled_file,
+            BytesIO(b'x'),
+            tmp_dir,
+            resume_file=checkpoint_file,
+        )
+        assert error is None
+
+    assert stopped_output + resumed_output == ', '.join(['120'] * 10000) + '\n'
+
+
+def test_checkpoint() -> None:
+    """Checkpoint should capture the exact machine state & survive encoding."""
+    translation_result, error = compile.compile_source(SOURCE)
+    assert error is None
+    exe = translation_result.exe
+
+    control_unit = make_control_unit(
+        exe.program,
+        exe.start,
+        InputPort(b'x'),
+        OutputPort(OutputFormat.BYTESS),
+    )
+    run_untraced(control_unit, limits=Limits(5))
+    checkpoint = make_checkpoint(exe, control_unit, MemoryKind.LIST)
+
+    assert checkpoint == Checkpoint(
+        program_hash(exe),
+        MemoryKind.LIST,
+        None,
+        5 * len(exe.program),
+        [],
+        [0, 120, 9999, 0, 0, 0, 0, 0],
+        2,
+        0,
+        True,
+        5,
+        5,
+        b'x',
+        0,
+        1,
+    )
+    assert decode_checkpoint(encode_checkpoint(checkpoint)) == checkpoint
+
+    snapshot = restore_snapshot(exe, checkpoint)
+    assert (snapshot.registers, snapshot.instruction_pointer, snapshot.counter) == (
+        checkpoint.registers,
+        2,
+        5,
+    )
+    assert [snapshot.memory.word(addr) for addr in range(len(exe.program))] == exe.program
+
+
+def test_checkpoint_writes() -> None:
+    """Memory writes, negative values & unknown output size should be encoded."""
+    checkpoint = Checkpoint(
+        'hash',
+        MemoryKind.COMPACT,
+        32,
+        1 << 20,
+        [(3, -5), (100, 7), (1 << 19, -(1 << 31))],
+        [0, -1, 2, -3, 4, -5, 6, -7],
+        10,
+        -2,
+        False,
+        1 << 40,
+        1 << 41,
+        b'',
+        None,
+        0,
+    )
+    assert decode_checkpoint(encode_checkpoint(checkpoint)) == checkpoint
+
+
+@pytest.mark.parametrize('data, message', [
+    (b'DRC', 'not a checkpoint'),
+    (b'DRCX' + bytes(2), 'not a checkpoint'),
+    (CHECKPOINT_HEADER.pack(CHECKPOINT_MAGIC, 2), 'unsupported checkpoint version 2'),
+    (CHECKPOINT_HEADER.pack(CHECKPOINT_MAGIC, 1) + b'garbage', 'corrupted checkpoint'),
+    (CHECKPOINT_HEADER.pack(CHECKPOINT_MAGIC, 1) + zlib.compress(bytes(3)), 'corrupted checkpoint'),
+], ids=['short', 'magic', 'version', 'compression', 'truncated'])
+def test_corrupted_checkpoint(data, message) -> None:
+    """Data that isn't a valid checkpoint should be rejected."""
+    with pytest.raises(ValueError, match=message):
+        decode_checkpoint(data)
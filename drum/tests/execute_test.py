@@ -0,0 +1,88 @@
+import pytest
+
+from drum.compiler import compile
+from drum.machine.machine import ExecutionMode, LimitKind, Limits, execute
+
+# Loop that outputs 3, 2, 1 (14 instructions)
+LOOP_SOURCE = '''_start:
+    ADDI %R1, %R0, 3
+LOOP:
+    BEQ %R1, %R0, END
+    OUT %R1
+    SUBI %R1, %R1, 1
+    BEQ %R0, %R0, LOOP
+END:
+    HLT
+'''
+
+
+@pytest.mark.parametrize('mode', list(ExecutionMode), ids=lambda mode: mode.value)
+def test_data_word_fault(mode) -> None:
+    """Executing a data word should fault with the decoding error in every mode."""
+    translation_result, error = compile.compile_source('_start:\n    ADDI %R1, %R0, 1\n#7\n')
+    assert error is None
+
+    result = execute(translation_result.exe, mode=mode)
+
+    assert result.error == 'unexpected number of arguments: expected 3, got 0'
+    assert result.instructions == 1
+    assert result.output == b''
+
+
+@pytest.mark.parametrize('mode', list(ExecutionMode), ids=lambda mode: mode.value)
+def test_no_side_effects(mode, tmp_path, monkeypatch, caplog, capsys) -> None:
+    """Execution should neither write files nor log nor print, the executable stays intact."""
+    translation_result, error = compile.compile_source(
+        '_start:\n    IN %R1\n    ADDI %R1, %R1, 1\n    OUT %R1\n    HLT\n',
+    )
+    assert error is None
+    exe = translation_result.exe
+    program = [list(word) for word in exe.program]
+    monkeypatch.chdir(tmp_path)
+    caplog.set_level('DEBUG')
+
+    result = execute(exe, b'a', mode=mode)
+
+    assert (result.output, result.instructions, result.error) == (b'b', 3, None)
+    assert exe.program == program
+    assert list(tmp_path.iterdir()) == []
+    assert caplog.records == []
+    assert capsys.readouterr() == ('', '')
+
+
+@pytest.mark.parametrize('mode', list(ExecutionMode), ids=lambda mode: mode.value)
+@pytest.mark.parametrize('limits, kind, instructions, instruction_pointer', [
+    (Limits(5), LimitKind.INSTRUCTIONS, 5, 1),
+    (Limits(4), LimitKind.INSTRUCTIONS, 4, 4),
+    (Limits(ticks=6), LimitKind.TICKS, 6, 2),
+], ids=['instructions', 'mid-block', 'ticks'])
+def test_limits(mode, limits, kind, instructions, instruction_pointer) -> None:
+    """Run stopped by a limit should hold the exact final state."""
+    translation_result, error = compile.compile_source(LOOP_SOURCE)
+    assert error is None
+    exe = translation_result.exe
+
+    if mode == ExecutionMode.BLOCKS and limits == Limits(4):
+        # instruction limit is checked at block exits: the loop body is finished
+        instructions, instruction_pointer = 5, 1
+
+    result = execute(exe, mode=mode, limits=limits)
+
+    limit = limits.instructions if kind == LimitKind.INSTRUCTIONS else limits.ticks
+    assert result.error == f'limit exceeded: {kind.value} ({limit})'
+    assert (result.limit, result.output, result.instructions, result.ticks) == (
+        kind,
+        b'\x03',
+        instructions,
+        instructions,
+    )
+    assert result.state is not None
+    assert (result.state.instruction_pointer, result.state.counter, result.state.output) == (
+        instruction_pointer,
+        instructions,
+        b'\x03',
+    )
+    assert result.state.registers[1] == 2
+
+    # limit that isn't reached changes nothing
+    assert execute(exe, mode=mode, limits=Limits(14, 14)) == execute(exe, mode=mode)
@@ -1,13 +1,45 @@
 from contextlib import redirect_stdout
+from dataclasses import replace
 from io import StringIO
 import os
 import tempfile
 
 import pytest
 
+from drum.common.arch import BRANCH_OPS, START_LABEL, ObjectFile, Op
+from drum.common.binary import read_binary_disassembly
+from drum.common.debug import Symbolizer
+from drum.common.io import disassemble, read_compiled
+from drum.common.profile import new_profile
 from drum.compiler import compile
+from drum.compiler.lexer import Lexer, lex_top, tokenize
+from drum.compiler.linker import link
 from drum.machine import run as machine
-from drum.machine.io import OutputFormat
+from drum.machine.batch import BatchOptions, run_batch
+from drum.machine.checkpoint import (
+    decode_checkpoint,
+    encode_checkpoint,
+    make_checkpoint,
+    restore_snapshot,
+)
+from drum.machine.decode import decode_word
+from drum.machine.hooks import Hooks
+from drum.machine.io import OutputFormat, fmt_output_data
+from drum.machine.machine import (
+    ExecutionMode,
+    LimitKind,
+    Limits,
+    MachineSnapshot,
+    exec_program,
+    execute,
+    make_control_unit,
+    run_untraced,
+)
+from drum.machine.memory import MemoryKind
+from drum.machine.port import EofPolicy, InputPort, OutputPort
+from drum.machine.profiler import build_report
+from drum.machine.timetravel import TimeTravelDebugger, record
+from drum.machine.trace import TraceCompression, TraceLevel, read_trace, render_trace
 from drum.util.io import read_from_file, write_to_file
 
 SOURCE = 'code.dr'
@@ -15,21 +47,28 @@ COMPILED = 'code.drc'
 LOGFILE = 'log.log'
 INPUT = 'input.txt'
 OUTPUT = 'output.txt'
+TRACE = 'trace.bin'
 
 
+@pytest.mark.parametrize('memory_kind', list(MemoryKind), ids=lambda kind: kind.value)
+@pytest.mark.parametrize('mode', list(ExecutionMode), ids=lambda mode: mode.value)
 @pytest.mark.golden_test('golden/*.yaml')
-def test_compiler_and_machine(golden) -> None:
+def test_compiler_and_machine(golden, mode, memory_kind) -> None:
     """
     Golden tests that cover translator and machine.
 
     Input:
     - `in_source_code`: source code to compile and execute (`.dr`)
     - `in_input_data`: data directed to stdin
+    - `in_eof` (optional): EOF policy
 
     Expected output:
     - `out_compiled`: compiled code (`.drc`)
     - `out_log`: execution log
     - `out_output`: translation&execution ouput
+
+    Every execution mode and memory representation is expected to produce
+    exactly the same result.
     """
     with tempfile.TemporaryDirectory() as tmpdir:
         source_code = os.path.join(tmpdir, SOURCE)
@@ -55,9 +94,473 @@ def test_compiler_and_machine(golden) -> None:
                 output_format=OutputFormat.get_by_alias(golden['in_output_format'])[0],
                 logfile=logfile,
                 log_level=golden['in_log_level'],
+                mode=mode,
+                memory_kind=memory_kind,
+                eof_policy=EofPolicy.get_by_alias(golden.get('in_eof', 'value'))[0],
             )
             assert error is None
 
         assert read_from_file(target) == golden['out_compiled']
         assert read_from_file(logfile) == golden['out_log']
         assert stdout.getvalue() == golden['out_output']
+
+
+@pytest.mark.golden_test('golden/*.yaml')
+def test_binary_trace(golden) -> None:
+    """Binary trace rendered back into text should match the text trace from the log."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        source_code = os.path.join(tmpdir, SOURCE)
+        input_data = os.path.join(tmpdir, INPUT)
+        target = os.path.join(tmpdir, COMPILED)
+        logfile = os.path.join(tmpdir, LOGFILE)
+        trace_file = os.path.join(tmpdir, TRACE)
+
+        write_to_file(source_code, golden['in_source_code'])
+        write_to_file(input_data, golden['in_input_data'])
+        eof_policy, _ = EofPolicy.get_by_alias(golden.get('in_eof', 'value'))
+
+        with redirect_stdout(StringIO()):
+            assert compile.run(source_code, target) is None
+            assert machine.run(
+                target,
+                input_data,
+                output_format=OutputFormat.STR,
+                logfile=logfile,
+                log_level='INFO',
+                trace_level=TraceLevel.INSTRUCTION,
+                trace_file=trace_file,
+                trace_compression=TraceCompression.GZIP,
+                eof_policy=eof_policy,
+            ) is None
+
+            # text trace is logged on the debug level only
+            if golden['in_log_level'] != 'DEBUG':
+                assert machine.run(
+                    target,
+                    input_data,
+                    output_format=OutputFormat.STR,
+                    logfile=logfile,
+                    log_level='DEBUG',
+                    eof_policy=eof_policy,
+                ) is None
+
+        exe = read_compiled(target, symbols=True)
+        rendered = list(render_trace(read_trace(trace_file), exe.program, symbolizer=Symbolizer(exe)))
+        log = read_from_file(logfile) if golden['in_log_level'] != 'DEBUG' else golden['out_log']
+
+    expected = [
+        line.split('\t')[2]
+        for line in log.splitlines()
+        if line.startswith('DEBUG\tmachine:exec_program\t')
+    ]
+    assert len(expected) > 0
+    assert rendered == expected
+
+
+@pytest.mark.parametrize('snapshot', [False, True], ids=['fresh', 'snapshot'])
+@pytest.mark.parametrize('mode', list(ExecutionMode), ids=lambda mode: mode.value)
+@pytest.mark.golden_test('golden/*.yaml')
+def test_batch(golden, mode, snapshot) -> None:
+    """
+    Batch run (in a process pool) should produce the same output and counters as a single run,
+    including runs resumed from the snapshot of the input-independent prefix.
+    """
+    expected_output = golden['out_output'].split('============\n', 1)[1][:-1]
+    expected_instructions = next(
+        int(line.split('\t')[2].split()[0])
+        for line in golden['out_log'].splitlines()
+        if line.endswith(' instructions executed')
+    )
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        source_code = os.path.join(tmpdir, SOURCE)
+        input_data = os.path.join(tmpdir, INPUT)
+        target = os.path.join(tmpdir, COMPILED)
+
+        write_to_file(source_code, golden['in_source_code'])
+        write_to_file(input_data, golden['in_input_data'])
+
+        with redirect_stdout(StringIO()):
+            assert compile.run(source_code, target) is None
+
+        options = BatchOptions(
+            output_format=OutputFormat.get_by_alias(golden['in_output_format'])[0],
+            mode=mode,
+            eof_policy=EofPolicy.get_by_alias(golden.get('in_eof', 'value'))[0],
+            snapshot=snapshot,
+        )
+        results = list(run_batch(read_compiled(target), [input_data] * 3, options, workers=2))
+
+    assert len(results) == 3
+    for result in results:
+        assert result.output == expected_output
+        assert result.instructions == expected_instructions
+
+
+@pytest.mark.golden_test('golden/*.yaml')
+def test_lexer(golden) -> None:
+    """Single-pass lexer should produce exactly the same tokens as the reference one."""
+    text = golden['in_source_code']
+
+    assert list(tokenize(text)) == Lexer(text, lex_top).lex()
+
+    # the same with labels exported
+    exported = text.replace(':\n', '::\n')
+    assert list(tokenize(exported)) == Lexer(exported, lex_top).lex()
+
+    # every prefix covers errors and unterminated tokens
+    for end in range(0, len(text), 7):
+        assert list(tokenize(text[:end] + '$')) == Lexer(text[:end] + '$', lex_top).lex()
+
+
+@pytest.mark.parametrize('symbols', [False, True], ids=['no-symbols', 'symbols'])
+@pytest.mark.golden_test('golden/*.yaml')
+def test_binary_executable(golden, symbols) -> None:
+    """Binary executable should be loaded into exactly the same program as JSON one."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        source_code = os.path.join(tmpdir, SOURCE)
+        target = os.path.join(tmpdir, COMPILED)
+        binary_target = os.path.join(tmpdir, 'binary.drc')
+
+        write_to_file(source_code, golden['in_source_code'])
+
+        with redirect_stdout(StringIO()):
+            assert compile.run(source_code, target) is None
+            assert compile.run(source_code, binary_target, binary=True, symbols=symbols) is None
+
+        exe = read_compiled(target)
+        assert read_compiled(binary_target) == exe
+
+        disassembly = read_binary_disassembly(binary_target)
+        assert disassembly == (disassemble(exe.program) if symbols else None)
+
+
+@pytest.mark.golden_test('golden/*.yaml')
+def test_compile_cache(golden) -> None:
+    """Translation taken from the cache should produce exactly the same output."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        source_code = os.path.join(tmpdir, SOURCE)
+        cache_dir = os.path.join(tmpdir, 'cache')
+        targets = [os.path.join(tmpdir, f'{i}.drc') for i in range(2)]
+
+        write_to_file(source_code, golden['in_source_code'])
+
+        outputs = []
+        for target in targets:
+            with redirect_stdout(StringIO()) as stdout:
+                error = compile.run(source_code, target, cache_dir=cache_dir)
+            outputs.append((error, stdout.getvalue()))
+
+        assert outputs[0] == outputs[1]
+        if outputs[0][0] is None:
+            assert len(os.listdir(os.path.join(cache_dir, 'compiled'))) == 1
+            assert read_from_file(targets[0]) == read_from_file(targets[1])
+
+
+@pytest.mark.golden_test('golden/*.yaml')
+def test_in_memory_api(golden) -> None:
+    """In-memory compile & execute should produce the same output and counters as the CLI."""
+    expected_output = golden['out_output'].split('============\n', 1)[1][:-1]
+    expected_instructions = next(
+        int(line.split('\t')[2].split()[0])
+        for line in golden['out_log'].splitlines()
+        if line.endswith(' instructions executed')
+    )
+
+    translation_result, error = compile.compile_source(golden['in_source_code'])
+    assert error is None
+
+    result = execute(
+        translation_result.exe,
+        golden['in_input_data'].encode(),
+        eof_policy=EofPolicy.get_by_alias(golden.get('in_eof', 'value'))[0],
+        strip_input=True,
+    )
+    output_format, _ = OutputFormat.get_by_alias(golden['in_output_format'])
+
+    assert fmt_output_data(output_format, result.output) == expected_output
+    assert result.instructions == expected_instructions
+
+
+@pytest.mark.golden_test('golden/*.yaml')
+def test_linker(golden) -> None:
+    """Relocated object (placed after another one) should run exactly the same."""
+    translation_result, error = compile.compile_source(golden['in_source_code'])
+    assert error is None
+    obj, error = compile.compile_object(golden['in_source_code'])
+    assert error is None
+
+    # the same local labels in another object don't clash
+    lib, error = compile.compile_object(golden['in_source_code'].replace(START_LABEL, 'lib'))
+    assert error is None
+
+    padding = ObjectFile([[0]] * 3, {'PADDING': 0}, [], [], [(0, 3)], 0)
+    exe, error = link([padding, obj, lib])
+    assert error is None
+    assert exe.start == translation_result.exe.start + 3
+
+    input_data = golden['in_input_data'].encode()
+    eof_policy, _ = EofPolicy.get_by_alias(golden.get('in_eof', 'value'))
+    # the same memory capacity, so that memory faults are reported the same way
+    capacity = 5 * len(translation_result.exe.program)
+    expected = execute(
+        translation_result.exe,
+        input_data,
+        eof_policy=eof_policy,
+        memory_capacity=capacity,
+    )
+    result = execute(exe, input_data, eof_policy=eof_policy, memory_capacity=capacity)
+
+    assert (result.output, result.instructions, result.error) == (
+        expected.output,
+        expected.instructions,
+        expected.error,
+    )
+
+
+@pytest.mark.parametrize('mode', list(ExecutionMode), ids=lambda mode: mode.value)
+@pytest.mark.golden_test('golden/*.yaml')
+def test_optimizer(golden, mode) -> None:
+    """
+    Optimized program should produce the same output.
+
+    Expected output:
+    - `out_optimized_instructions`: number of instructions the optimized program executes
+    """
+    translation_result, error = compile.compile_source(golden['in_source_code'])
+    assert error is None
+    optimized, error = compile.compile_source(golden['in_source_code'], optimize=True)
+    assert error is None
+
+    input_data = golden['in_input_data'].encode()
+    eof_policy, _ = EofPolicy.get_by_alias(golden.get('in_eof', 'value'))
+    expected = execute(translation_result.exe, input_data, eof_policy=eof_policy)
+    result = execute(optimized.exe, input_data, mode=mode, eof_policy=eof_policy)
+
+    assert (result.output, result.error) == (expected.output, expected.error)
+    assert result.instructions == golden['out_optimized_instructions']
+
+
+@pytest.mark.golden_test('golden/*.yaml')
+def test_profile_layout(golden) -> None:
+    """
+    Program laid out by its profile should produce the same output.
+
+    Expected output:
+    - `out_laid_out_instructions`: number of instructions the laid out program executes
+    """
+    translation_result, error = compile.compile_source(golden['in_source_code'])
+    assert error is None
+
+    input_data = golden['in_input_data'].encode()
+    eof_policy, _ = EofPolicy.get_by_alias(golden.get('in_eof', 'value'))
+    capacity = 5 * len(translation_result.exe.program)
+
+    profile = new_profile(translation_result.exe)
+    exec_program(
+        translation_result.exe.program,
+        OutputFormat.STR,
+        start=translation_result.exe.start,
+        input_data=InputPort(input_data, eof_policy=eof_policy),
+        memory_capacity=capacity,
+        profile=profile,
+    )
+    laid_out, error = compile.compile_source(golden['in_source_code'], profile=profile)
+    assert error is None
+
+    expected = execute(
+        translation_result.exe,
+        input_data,
+        eof_policy=eof_policy,
+        memory_capacity=capacity,
+    )
+    result = execute(laid_out.exe, input_data, eof_policy=eof_policy, memory_capacity=capacity)
+
+    assert (result.output, result.error) == (expected.output, expected.error)
+    assert result.instructions == golden['out_laid_out_instructions']
+
+
+@pytest.mark.golden_test('golden/*.yaml')
+def test_profiler(golden) -> None:
+    """Profile totals should match the machine counters."""
+    translation_result, error = compile.compile_source(golden['in_source_code'])
+    assert error is None
+    exe = translation_result.exe
+
+    input_data = golden['in_input_data'].encode()
+    eof_policy, _ = EofPolicy.get_by_alias(golden.get('in_eof', 'value'))
+    expected = execute(exe, input_data, eof_policy=eof_policy)
+
+    profile = new_profile(exe)
+    exec_program(
+        exe.program,
+        OutputFormat.STR,
+        start=exe.start,
+        input_data=InputPort(input_data, eof_policy=eof_policy),
+        profile=profile,
+    )
+    report = build_report(exe, profile, Symbolizer(exe))
+
+    assert report.total.executions == expected.instructions
+    assert sum(row.executions for row in report.labels) == expected.instructions
+    assert sum(row.ticks for row in report.op_classes) == report.total.ticks
+    assert [row.ticks for row in report.instructions] == sorted(
+        (row.ticks for row in report.instructions),
+        reverse=True,
+    )
+
+
+def _comparable(snapshot: MachineSnapshot) -> MachineSnapshot:
+    """Returns snapshot with memory as a list of words (memory objects aren't compared)."""
+    memory = snapshot.memory
+    return replace(snapshot, memory=[memory.word(addr) for addr in range(len(memory))])
+
+
+@pytest.mark.parametrize('mode', list(ExecutionMode), ids=lambda mode: mode.value)
+@pytest.mark.golden_test('golden/*.yaml')
+def test_limits(golden, mode) -> None:
+    """Run stopped by a limit should report it with the final state, a sufficient limit is a no-op."""
+    translation_result, error = compile.compile_source(golden['in_source_code'])
+    assert error is None
+    exe = translation_result.exe
+
+    input_data = golden['in_input_data'].encode()
+    eof_policy, _ = EofPolicy.get_by_alias(golden.get('in_eof', 'value'))
+    expected = execute(exe, input_data, mode=mode, eof_policy=eof_policy)
+
+    result = execute(
+        exe,
+        input_data,
+        mode=mode,
+        eof_policy=eof_policy,
+        limits=Limits(instructions=expected.instructions + 1, ticks=expected.ticks + 1),
+    )
+    assert result == expected
+
+    limit = expected.instructions // 2
+    result = execute(exe, input_data, mode=mode, eof_policy=eof_policy, limits=Limits(limit))
+    assert result.limit == LimitKind.INSTRUCTIONS
+    assert result.error == f'limit exceeded: instructions ({limit})'
+    assert result.state is not None
+
+    # the same state as the exact stop in the pre-decoded mode (at the block exit in block mode)
+    stop = result.instructions if mode == ExecutionMode.BLOCKS else limit
+    reference = execute(exe, input_data, eof_policy=eof_policy, limits=Limits(stop))
+    assert reference.instructions == stop
+    assert reference.state is not None
+    assert (result.instructions, result.ticks, result.output) == (
+        reference.instructions,
+        reference.ticks,
+        reference.output,
+    )
+    assert _comparable(result.state) == _comparable(reference.state)
+
+
+@pytest.mark.golden_test('golden/*.yaml')
+def test_checkpoint(golden) -> None:
+    """Run resumed from a checkpoint (taken halfway) should produce the same output."""
+    expected_output = golden['out_output'].split('============\n', 1)[1][:-1]
+
+    translation_result, error = compile.compile_source(golden['in_source_code'])
+    assert error is None
+    exe = translation_result.exe
+
+    input_data = golden['in_input_data'].encode()
+    eof_policy, _ = EofPolicy.get_by_alias(golden.get('in_eof', 'value'))
+    output_format, _ = OutputFormat.get_by_alias(golden['in_output_format'])
+    expected = execute(exe, input_data, eof_policy=eof_policy, strip_input=True)
+
+    control_unit = make_control_unit(
+        exe.program,
+        exe.start,
+        InputPort(input_data, eof_policy=eof_policy, strip=True),
+        OutputPort(output_format),
+    )
+    run_untraced(control_unit, limits=Limits(expected.instructions // 2))
+    checkpoint = make_checkpoint(exe, control_unit, MemoryKind.LIST)
+    assert decode_checkpoint(encode_checkpoint(checkpoint)) == checkpoint
+
+    input_port = InputPort(input_data, eof_policy=eof_policy, strip=True)
+    input_port.skip(checkpoint.input_position)
+    output = exec_program(
+        exe.program,
+        output_format,
+        start=exe.start,
+        input_data=input_port,
+        trace_level=TraceLevel.OFF,
+        snapshot=restore_snapshot(exe, checkpoint),
+    )
+    assert output == expected_output
+
+
+@pytest.mark.golden_test('golden/*.yaml')
+def test_time_travel(golden) -> None:
+    """Seeking a recorded run back and forth should reach the same state as a fresh run."""
+    translation_result, error = compile.compile_source(golden['in_source_code'])
+    assert error is None
+    exe = translation_result.exe
+
+    input_data = golden['in_input_data'].encode()
+    eof_policy, _ = EofPolicy.get_by_alias(golden.get('in_eof', 'value'))
+    recording = record(exe, input_data, eof_policy=eof_policy, strip_input=True, interval=50)
+    end = recording.result.instructions
+
+    debugger = TimeTravelDebugger(recording)
+    for point in [end, end // 3, end // 2, 0, end - 1, end]:
+        debugger.seek(point)
+        limits = Limits(instructions=point) if point < end else None
+        expected = execute(exe, input_data, eof_policy=eof_policy, strip_input=True, limits=limits)
+        state = debugger.state()
+
+        assert state.counter == expected.instructions
+        assert state.tick == expected.ticks
+        assert state.output == expected.output
+        if expected.state is not None:
+            assert state.registers == expected.state.registers
+            assert state.instruction_pointer == expected.state.instruction_pointer
+
+    # no 2-tick instruction spans the middle of the golden runs
+    debugger.seek_tick(recording.result.ticks // 2)
+    assert debugger.state().tick == recording.result.ticks // 2
+
+
+@pytest.mark.golden_test('golden/*.yaml')
+def test_hooks(golden) -> None:
+    """Hooks should see every instruction, branch & I/O of the run."""
+    translation_result, error = compile.compile_source(golden['in_source_code'])
+    assert error is None
+    exe = translation_result.exe
+    input_data = golden['in_input_data'].encode()
+    eof_policy, _ = EofPolicy.get_by_alias(golden.get('in_eof', 'value'))
+
+    addresses, branches, accesses, inputs, outputs, halts = [], [], [], [], [], []
+    hooks = Hooks()
+    hooks.instruction.append(lambda _cu, addr: addresses.append(addr))
+    hooks.branch.append(lambda _cu, addr, target, taken: branches.append(addr))
+    hooks.memory_read.append(lambda _cu, addr, value: accesses.append((Op.LD, addr)))
+    hooks.memory_write.append(lambda _cu, addr, value: accesses.append((Op.ST, addr)))
+    hooks.input.append(lambda _cu, value: inputs.append(value))
+    hooks.output.append(lambda _cu, value: outputs.append(value))
+    hooks.halt.append(lambda cu: halts.append(cu.error))
+
+    result = execute(exe, input_data, eof_policy=eof_policy, strip_input=True, hooks=hooks)
+
+    # the instruction the machine stopped at (`HLT` or a faulting one) is seen as well
+    assert len(addresses) == result.instructions + 1
+    ops = [decode_word(exe.program[addr])[0].op for addr in addresses[:result.instructions]]
+    assert branches == [addr for addr, op in zip(addresses, ops) if op in BRANCH_OPS]
+    assert [op for op, _ in accesses] == [op for op in ops if op in (Op.LD, Op.ST)]
+    assert bytes(outputs) == result.output
+    # EOF values are read after the input
+    stripped = input_data.strip()
+    assert bytes(inputs[:len(stripped)]) == stripped[:len(inputs)]
+    assert halts == [result.error]
+
+    # installing hooks again replaces them, an invalid word is seen before it faults
+    control_unit = make_control_unit([*exe.program, [99, 0, 0, 0]], len(exe.program))
+    control_unit.install_hooks(hooks)
+    control_unit.install_hooks(hooks)
+    addresses.clear()
+    run_untraced(control_unit, ExecutionMode.DECODED)
+    assert addresses == [len(exe.program)]
+    assert control_unit.error is not None
@@ -0,0 +1,77 @@
+import pytest
+
+from drum.compiler import compile
+from drum.machine.hooks import HookKind, Hooks
+from drum.machine.machine import ExecutionMode, execute
+
+# Echoes input through memory
+SOURCE = '''_start:
+    ADDI %R2, %R0, 20
+LOOP:
+    IN %R1
+    BEQ %R1, %R0, END
+    ST %R1, %R2
+    LD %R3, %R2
+    OUT %R3
+    BEQ %R0, %R0, LOOP
+END:
+    HLT
+'''
+
+
+def _hooks(events: list) -> Hooks:
+    """Returns hooks that log every event."""
+    hooks = Hooks()
+    hooks.instruction.append(lambda _cu, addr: events.append(('instruction', addr)))
+    hooks.branch.append(lambda _cu, *args: events.append(('branch', *args)))
+    hooks.memory_read.append(lambda _cu, addr, value: events.append(('read', addr, value)))
+    hooks.memory_write.append(lambda _cu, addr, value: events.append(('write', addr, value)))
+    hooks.input.append(lambda _cu, value: events.append(('input', value)))
+    hooks.output.append(lambda _cu, value: events.append(('output', value)))
+    hooks.halt.append(lambda cu: events.append(('halt', cu.error)))
+    return hooks
+
+
+@pytest.mark.parametrize('mode', list(ExecutionMode), ids=lambda mode: mode.value)
+def test_events(mode) -> None:
+    """Hooks should be called on every event, in the order of events."""
+    translation_result, error = compile.compile_source(SOURCE)
+    assert error is None
+
+    events: list = []
+    hooks = _hooks(events)
+    assert hooks.kinds() == set(HookKind)
+    result = execute(translation_result.exe, b'a', mode=mode, hooks=hooks)
+
+    assert (result.output, result.instructions, result.error) == (b'a', 9, None)
+    assert events == [
+        ('instruction', 0),
+        ('instruction', 1), ('input', 97),
+        ('instruction', 2), ('branch', 2, 7, False),
+        ('instruction', 3), ('write', 20, 97),
+        ('instruction', 4), ('read', 20, 97),
+        ('instruction', 5), ('output', 97),
+        ('instruction', 6), ('branch', 6, 1, True),
+        ('instruction', 1), ('input', 0),
+        ('instruction', 2), ('branch', 2, 7, True),
+        # `HLT` is seen, but isn't counted
+        ('instruction', 7),
+        ('halt', None),
+    ]
+
+
+@pytest.mark.parametrize('mode', list(ExecutionMode), ids=lambda mode: mode.value)
+def test_halt_hook(mode) -> None:
+    """Halt hook should be called once with the error, without instrumenting the run."""
+    translation_result, error = compile.compile_source(SOURCE.replace('20', '100000'))
+    assert error is None
+
+    hooks = Hooks()
+    errors = []
+    hooks.halt.append(lambda cu: errors.append(cu.error))
+    assert not hooks.instruments()
+
+    result = execute(translation_result.exe, b'a', mode=mode, hooks=hooks)
+
+    assert result.error == 'memory fault: address 100000 is out of range [0, 40)'
+    assert (result.instructions, errors) == (3, [result.error])
@@ -0,0 +1,40 @@
+from json import loads
+import os
+import tempfile
+
+import pytest
+
+from drum.common.io import read_compiled, write_compiled
+from drum.compiler import compile
+from drum.util.io import read_from_file
+
+SOURCE = '''_start:
+    ADDI %R1, %R0, 49
+LOOP:
+    OUT %R1
+    HLT
+'''
+
+
+@pytest.mark.parametrize('symbols', [False, True], ids=['no-symbols', 'symbols'])
+def test_json_debug_information(symbols) -> None:
+    """JSON executable should hold labels & source map only if they're requested."""
+    translation_result, error = compile.compile_source(SOURCE, file='loop.dr')
+    assert error is None
+    exe = translation_result.exe
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        target = os.path.join(tmpdir, 'loop.drc')
+        assert write_compiled(target, exe, symbols=symbols) is None
+        data = loads(read_from_file(target))
+        loaded = read_compiled(target)
+
+    assert loaded.program == exe.program
+    if symbols:
+        assert data['symbols'] == {'_start': 0, 'LOOP': 1}
+        assert data['files'] == ['loop.dr']
+        assert data['source_map'] == [[0, 0, 2, 5], [1, 0, 4, 5], [2, 0, 5, 5]]
+        assert loaded == exe
+    else:
+        assert sorted(data) == ['program', 'start']
+        assert (loaded.symbols, loaded.files, loaded.source_map) == ({}, [], [])
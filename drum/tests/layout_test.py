@@ -0,0 +1,70 @@
+from drum.common.profile import new_profile
+from drum.compiler import compile
+from drum.compiler.layout import layout
+from drum.machine.io import OutputFormat
+from drum.machine.machine import exec_program, execute
+from drum.machine.port import InputPort
+
+# Loop with the exit at the top & the back-edge at the bottom
+SOURCE = '''_start:
+    ADDI %R1, %R0, 3
+LOOP:
+    BEQ %R1, %R0, END
+    OUT %R1
+    SUBI %R1, %R1, 1
+    BEQ %R0, %R0, LOOP
+END:
+    HLT
+'''
+
+
+def test_loop_layout() -> None:
+    """Loop condition should be moved to the bottom & inverted, so that the body falls through."""
+    translation_result, error = compile.compile_source(SOURCE)
+    assert error is None
+    exe = translation_result.exe
+
+    profile = new_profile(exe)
+    exec_program(
+        exe.program,
+        OutputFormat.STR,
+        start=exe.start,
+        input_data=InputPort(b''),
+        profile=profile,
+    )
+    assert (profile.executions, profile.taken) == ([1, 4, 3, 3, 3, 0], [0, 1, 0, 0, 3, 0])
+
+    obj, error = compile.compile_object(SOURCE)
+    assert error is None
+    laid_out = layout(obj, profile)
+
+    assert laid_out.program == [
+        [2, 1, 0, 3],
+        # jump into the loop condition
+        [13, 0, 0, 4],
+        [12, 1],
+        [4, 1, 1, 1],
+        # BNE %R1, %R0, 2
+        [14, 1, 0, 2],
+        [0],
+    ]
+    assert laid_out.symbols == {'_start': 0, 'LOOP': 4, 'END': 5}
+    assert laid_out.relocations == [(1, 3), (4, 3)]
+    assert laid_out.instruction_count == obj.instruction_count
+
+    translation_result, error = compile.compile_source(SOURCE, profile=profile)
+    assert error is None
+    result = execute(translation_result.exe)
+    assert (result.output, result.instructions, result.error) == (b'\x03\x02\x01', 12, None)
+    assert execute(exe).instructions == 14
+
+
+def test_profile_mismatch() -> None:
+    """Profile of another program should be ignored."""
+    obj, error = compile.compile_object(SOURCE)
+    assert error is None
+
+    translation_result, error = compile.compile_source('_start:\n    HLT\n')
+    assert error is None
+
+    assert layout(obj, new_profile(translation_result.exe)) is obj
@@ -0,0 +1,56 @@
+import pytest
+
+from drum.compiler.lexer import Lexer, lex_top, tokenize
+from drum.compiler.tokens import TokenType
+
+SOURCE = '''; comment
+exp:: L:
+  ADDI %R1, %R0, -3
+  BEQ %R0, %R0, L
+"hi"
+#+5
+  OUT "s"
+'''
+
+
+def _lex(text: str) -> list[tuple[str, TokenType, int]]:
+    """Lexes text with the reference lexer, checks `tokenize()` gives the same tokens."""
+    tokens = [(token.value, token.type, token.position) for token in Lexer(text, lex_top).lex()]
+    assert [(token.value, token.type, token.position) for token in tokenize(text)] == tokens
+    return tokens
+
+
+def test_tokens() -> None:
+    """Both lexers should give the same tokens at the same positions."""
+    assert _lex(SOURCE) == [
+        ('exp', TokenType.LABEL_EXPORT, 10),
+        ('L', TokenType.LABEL, 16),
+        ('ADDI', TokenType.INSTRUCTION, 21),
+        ('R1', TokenType.ARGUMENT_REGISTER, 27),
+        ('R0', TokenType.ARGUMENT_REGISTER, 32),
+        ('-3', TokenType.ARGUMENT_NUMBER, 36),
+        ('BEQ', TokenType.INSTRUCTION, 41),
+        ('R0', TokenType.ARGUMENT_REGISTER, 46),
+        ('R0', TokenType.ARGUMENT_REGISTER, 51),
+        ('L', TokenType.ARGUMENT_LABEL, 55),
+        ('hi', TokenType.LITERAL_STRING, 58),
+        ('+5', TokenType.LITERAL_NUMBER, 63),
+        ('OUT', TokenType.INSTRUCTION, 68),
+        ('s', TokenType.ARGUMENT_STRING, 73),
+    ]
+
+
+@pytest.mark.parametrize('text, tokens', [
+    ('ADD %1', [
+        ('ADD', TokenType.INSTRUCTION, 0),
+        ('invalid symbol while lexing register: \0 (position 6)', TokenType.ERROR, 0),
+    ]),
+    ('x $', [
+        ('x', TokenType.INSTRUCTION, 0),
+        ('unexpected symbol while lexing top-level: $ (position 2)', TokenType.ERROR, 0),
+    ]),
+    ('"abc', []),
+], ids=['register', 'top-level', 'unterminated-string'])
+def test_errors(text, tokens) -> None:
+    """Lexing should stop at the first error."""
+    assert _lex(text) == tokens
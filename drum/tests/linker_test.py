@@ -0,0 +1,94 @@
+from copy import deepcopy
+
+import pytest
+
+from drum.compiler import compile
+from drum.compiler.linker import link, merge
+from drum.machine.machine import execute
+
+MAIN = '''_start::
+    ADDI %R1, %R0, 49
+    BEQ %R0, %R0, print
+LOOP:
+    BEQ %R0, %R0, LOOP
+'''
+
+LIB = '''print::
+    OUT %R1
+LOOP:
+    HLT
+    BEQ %R0, %R0, LOOP
+'''
+
+
+def _objects():
+    main, error = compile.compile_object(MAIN, file='main.dr')
+    assert error is None
+    lib, error = compile.compile_object(LIB, file='lib.dr')
+    assert error is None
+    return main, lib
+
+
+def test_object() -> None:
+    """Object should hold exports, imports & relocations of local labels."""
+    main, _ = _objects()
+
+    assert main.program == [[2, 1, 0, 49], [13, 0, 0, 0], [13, 0, 0, 2]]
+    assert main.symbols == {'_start': 0, 'LOOP': 2}
+    assert main.exports == ['_start']
+    assert main.imports == [(1, 3, 'print')]
+    assert main.relocations == [(2, 3)]
+
+
+def test_merge() -> None:
+    """Objects should be placed one after another with addresses fixed up."""
+    main, lib = _objects()
+    objects = deepcopy([main, lib])
+
+    merged, error = merge([main, lib])
+    assert error is None
+
+    assert merged.program == [
+        [2, 1, 0, 49], [13, 0, 0, 3], [13, 0, 0, 2],
+        [12, 1], [0], [13, 0, 0, 4],
+    ]
+    # clashing local label is renamed after its file
+    assert merged.symbols == {'_start': 0, 'LOOP': 2, 'print': 3, 'LOOP@lib.dr': 4}
+    assert merged.relocations == [(2, 3), (1, 3), (5, 3)]
+    assert merged.imports == []
+    assert merged.exports == ['_start', 'print']
+    assert merged.instruction_count == 6
+    assert merged.files == ['main.dr', 'lib.dr']
+    assert merged.source_map[3:] == [(3, 1, 2, 5), (4, 1, 4, 5), (5, 1, 5, 5)]
+    # objects aren't modified
+    assert [main, lib] == objects
+
+
+def test_link() -> None:
+    """Linked program should start at `_start` wherever it is placed."""
+    main, lib = _objects()
+
+    exe, error = link([lib, main])
+    assert error is None
+    assert exe.start == 3
+    assert exe.program == [
+        [12, 1], [0], [13, 0, 0, 1],
+        [2, 1, 0, 49], [13, 0, 0, 0], [13, 0, 0, 5],
+    ]
+
+    result = execute(exe)
+    assert (result.output, result.instructions, result.error) == (b'1', 3, None)
+
+
+@pytest.mark.parametrize('objects, message', [
+    ('main main', 'label redefinition: _start'),
+    ('main', 'label resolution error: undefined label: print'),
+    ('lib', 'start label (_start) not found'),
+], ids=['redefinition', 'undefined', 'no-start'])
+def test_link_errors(objects, message) -> None:
+    """Linking should fail on duplicate exports, unresolved imports & missing start."""
+    main, lib = _objects()
+    named = dict(main=main, lib=lib)
+
+    exe, error = link([named[name] for name in objects.split()])
+    assert (exe.program, error) == ([], message)
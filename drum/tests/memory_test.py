@@ -0,0 +1,51 @@
+from array import array
+
+import pytest
+
+from drum.machine.memory import PAGE_SIZE, PagedMemory
+
+# Program of an instruction, a data word and a zero data word
+PROGRAM = [[12, 1], [7], [0]]
+
+
+@pytest.mark.parametrize('word_bits', [None, 32], ids=['lists', 'arrays'])
+def test_paged_memory_lazy_pages(word_bits) -> None:
+    """Pages should be allocated on the first write only, reads of untouched pages are 0."""
+    memory = PagedMemory(1 << 30, PROGRAM, word_bits)
+
+    # only the page of the non-zero program word
+    assert list(memory.pages) == [0]
+    assert len(memory) == 1 << 30
+    assert [memory.word(addr) for addr in range(3)] == [[12, 1], [7], [0]]
+
+    assert memory.read(5 * PAGE_SIZE + 3) == 0
+    assert list(memory.pages) == [0]
+
+    memory.write(5 * PAGE_SIZE + 3, 42)
+    assert list(memory.pages) == [0, 5]
+    assert memory.read(5 * PAGE_SIZE + 3) == 42
+    assert isinstance(memory.pages[5], list if word_bits is None else array)
+
+    # an instruction overwritten with data is a data word from now on
+    memory.write(0, 9)
+    assert memory.word(0) == [9]
+
+    assert list(memory.addresses()) == [
+        *range(PAGE_SIZE),
+        *range(5 * PAGE_SIZE, 6 * PAGE_SIZE),
+    ]
+
+
+def test_paged_memory_copy() -> None:
+    """Copy should have its own pages & side table."""
+    memory = PagedMemory(4 * PAGE_SIZE, PROGRAM, 64)
+    memory.write(PAGE_SIZE, 1)
+
+    copy = memory.copy()
+    copy.write(PAGE_SIZE, 2)
+    copy.write(0, 3)
+    copy.write(2 * PAGE_SIZE, 4)
+
+    assert (memory.read(PAGE_SIZE), memory.word(0), list(memory.pages)) == (1, [12, 1], [0, 1])
+    assert (copy.read(PAGE_SIZE), copy.word(0), list(copy.pages)) == (2, [3], [0, 1, 2])
+    assert (copy.capacity, copy.typecode) == (memory.capacity, memory.typecode)
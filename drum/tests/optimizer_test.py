@@ -0,0 +1,90 @@
+import pytest
+
+from drum.compiler import compile
+from drum.compiler.optimizer import optimize
+from drum.machine.machine import execute
+
+
+@pytest.mark.parametrize('source, program, removed, output, instructions', [
+    (
+        # constant propagation: R2 is a constant, R1 isn't read any more
+        '_start:\n    ADDI %R1, %R0, 2\n    ADDI %R2, %R1, 3\n    OUT %R2\n    HLT\n',
+        [[2, 2, 0, 5], [12, 2], [0], [0]],
+        1,
+        b'\x05',
+        2,
+    ),
+    (
+        # never taken branch is removed
+        '_start:\n    ADDI %R1, %R0, 1\n    BEQ %R1, %R0, END\n    OUT %R1\nEND:\n    HLT\n',
+        [[2, 1, 0, 1], [12, 1], [0], [0]],
+        1,
+        b'\x01',
+        2,
+    ),
+    (
+        # dead store: the first result is overwritten before it's read
+        '_start:\n    IN %R1\n    ADDI %R3, %R1, 7\n    ADDI %R3, %R1, 8\n    OUT %R3\n    HLT\n',
+        [[11, 1], [2, 3, 1, 8], [12, 3], [0], [0]],
+        1,
+        b'\x80',
+        3,
+    ),
+    (
+        # jump threading: branch to the jump goes to its target, jump to the next word is removed
+        '''_start:
+    IN %R1
+    BEQ %R1, %R0, A
+    OUT %R1
+A:
+    BEQ %R0, %R0, B
+    OUT %R1
+B:
+    HLT
+''',
+        [[11, 1], [13, 1, 0, 3], [12, 1], [0], [0], [0]],
+        2,
+        b'x',
+        3,
+    ),
+], ids=['constants', 'branch', 'dead-store', 'jump-threading'])
+def test_transforms(source, program, removed, output, instructions) -> None:
+    """Optimized program should be exactly as expected, removed words become zero data words."""
+    obj, error = compile.compile_object(source)
+    assert error is None
+
+    optimized = optimize(obj)
+    assert optimized.program == program
+    assert optimized.data == [(len(program) - removed, len(program))]
+    assert optimized.instruction_count == obj.instruction_count - removed
+
+    translation_result, error = compile.compile_source(source, optimize=True)
+    assert error is None
+    result = execute(translation_result.exe, b'x')
+    assert (result.output, result.instructions, result.error) == (output, instructions, None)
+
+
+def test_memory_capacity_kept() -> None:
+    """Optimized program should keep the default memory capacity (scratch words past the code)."""
+    source = '''_start:
+    XOR %R0, %R0, %R0
+    XOR %R1, %R1, %R1
+    ADDI %R1, %R0, 49
+    ADDI %R2, %R0, 39
+    ST %R1, %R2
+    LD %R3, %R2
+    OUT %R3
+    HLT
+'''
+    translation_result, error = compile.compile_source(source)
+    assert error is None
+    optimized, error = compile.compile_source(source, optimize=True)
+    assert error is None
+
+    assert len(optimized.exe.program) == len(translation_result.exe.program) == 8
+    assert optimized.instruction_count == 6
+
+    result = execute(optimized.exe)
+    assert result.error is None
+    assert result.output == b'1'
+    assert result.instructions == 5
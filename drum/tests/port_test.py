@@ -0,0 +1,106 @@
+from io import BytesIO, StringIO
+import os
+import tempfile
+
+from drum.machine.io import OutputFormat
+from drum.machine.port import (
+    INPUT_CHUNK_SIZE,
+    INPUT_MMAP_THRESHOLD,
+    FlushPolicy,
+    InputPort,
+    OutputPort,
+)
+
+
+def test_input_port_mmap() -> None:
+    """Regular file of at least `INPUT_MMAP_THRESHOLD` bytes should be memory-mapped."""
+    data = bytes(range(256)) * (INPUT_MMAP_THRESHOLD // 256) + b'end'
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        big = os.path.join(tmpdir, 'big.bin')
+        small = os.path.join(tmpdir, 'small.bin')
+        with open(big, 'wb') as f:
+            f.write(data)
+        with open(small, 'wb') as f:
+            f.write(data[:INPUT_MMAP_THRESHOLD - 1])
+
+        port = InputPort(file=open(big, 'rb'), eof_value=-1)
+        assert port._mmap is not None
+        assert port.skip(INPUT_MMAP_THRESHOLD) == INPUT_MMAP_THRESHOLD
+        assert [port.read() for _ in range(4)] == [ord('e'), ord('n'), ord('d'), -1]
+        assert port.consumed == len(data)
+        port.close()
+
+        port = InputPort(file=open(small, 'rb'))
+        assert port._mmap is None
+        assert port.read() == 0
+        port.close()
+
+
+def test_input_port_streaming_strip() -> None:
+    """Streamed input should be stripped across chunk boundaries."""
+    data = b'  \n' + b'a' * (INPUT_CHUNK_SIZE - 3) + b' \n ' + b'b' + b' \n'
+    port = InputPort(file=BytesIO(data), eof_value=0, strip=True)
+
+    read = []
+    while not port.at_eof():
+        read.append(port.read())
+
+    assert bytes(read) == data.strip()
+    assert port.read() == 0
+    assert port.consumed == len(data.strip())
+
+
+def _write(port: OutputPort, sink: StringIO, data: bytes) -> list[str]:
+    """Writes bytes one by one, returns the sink contents after every byte."""
+    contents = []
+    for value in data:
+        port.write(value)
+        contents.append(sink.getvalue())
+    return contents
+
+
+def test_output_port_halt() -> None:
+    """Halt policy should write output on close only (unless it outgrows the buffer)."""
+    sink = StringIO()
+    port = OutputPort(OutputFormat.STR, sink, FlushPolicy.HALT)
+    assert _write(port, sink, b'ab\nc') == ['', '', '', '']
+    port.close()
+    assert sink.getvalue() == 'ab\nc'
+
+    sink = StringIO()
+    port = OutputPort(OutputFormat.STR, sink, FlushPolicy.HALT, buffer_size=2)
+    assert _write(port, sink, b'abc') == ['', 'ab', 'ab']
+
+    # without sink the whole output is kept
+    port = OutputPort(OutputFormat.STR, flush_policy=FlushPolicy.HALT, buffer_size=2)
+    port.write_bytes(b'abc')
+    assert (port.buffered(), port.getvalue()) == (b'abc', '')
+
+
+def test_output_port_full() -> None:
+    """Full policy should write output whenever the buffer is full."""
+    sink = StringIO()
+    port = OutputPort(OutputFormat.STR, sink, FlushPolicy.FULL, buffer_size=2)
+    assert _write(port, sink, b'a\nbcd') == ['', 'a\n', 'a\n', 'a\nbc', 'a\nbc']
+    port.close()
+    assert (sink.getvalue(), port.written) == ('a\nbcd', 5)
+
+
+def test_output_port_line() -> None:
+    """Line policy should write output on every newline (and when the buffer is full)."""
+    sink = StringIO()
+    port = OutputPort(OutputFormat.STR, sink, FlushPolicy.LINE, buffer_size=3)
+    assert _write(port, sink, b'a\nbcde') == ['', 'a\n', 'a\n', 'a\n', 'a\nbcd', 'a\nbcd']
+    port.close()
+    assert sink.getvalue() == 'a\nbcde'
+
+
+def test_output_port_groups() -> None:
+    """Incomplete groups should be held back until they are complete (or output is closed)."""
+    sink = StringIO()
+    port = OutputPort(OutputFormat.INTS, sink, FlushPolicy.FULL, buffer_size=3)
+    port.write_bytes(bytes([1, 0, 0, 0, 2, 0]))
+    assert (sink.getvalue(), port.unformatted()) == ('1', bytes([2, 0]))
+    port.close()
+    assert sink.getvalue() == '1, 2'
@@ -0,0 +1,76 @@
+from drum.common.debug import Symbolizer
+from drum.common.profile import new_profile
+from drum.compiler import compile
+from drum.machine.io import OutputFormat
+from drum.machine.machine import exec_program
+from drum.machine.port import InputPort
+from drum.machine.profiler import ProfileRow, build_report, fmt_report
+
+# Loop that outputs 3, 2, 1
+SOURCE = '''_start:
+    ADDI %R1, %R0, 3
+LOOP:
+    BEQ %R1, %R0, END
+    OUT %R1
+    SUBI %R1, %R1, 1
+    BEQ %R0, %R0, LOOP
+END:
+    HLT
+'''
+
+
+def _report():
+    translation_result, error = compile.compile_source(SOURCE, file='loop.dr')
+    assert error is None
+    exe = translation_result.exe
+
+    profile = new_profile(exe)
+    exec_program(
+        exe.program,
+        OutputFormat.STR,
+        start=exe.start,
+        input_data=InputPort(b''),
+        profile=profile,
+    )
+    return build_report(exe, profile, Symbolizer(exe))
+
+
+def test_report_rows() -> None:
+    """Rows should be grouped by instruction, op class & label, the hottest first."""
+    report = _report()
+
+    assert report.total == ProfileRow('total', None, 14, 14, 7, 4)
+    assert report.instructions == [
+        ProfileRow('loop.dr:4 LOOP: BEQ %R1, %R0, 5', 1, 4, 4, 4, 1),
+        ProfileRow('loop.dr:5 LOOP+1: OUT %R1', 2, 3, 3),
+        ProfileRow('loop.dr:6 LOOP+2: SUBI %R1, %R1, 1', 3, 3, 3),
+        ProfileRow('loop.dr:7 LOOP+3: BEQ %R0, %R0, 1', 4, 3, 3, 3, 3),
+        ProfileRow('loop.dr:2 _start: ADDI %R1, %R0, 3', 0, 1, 1),
+    ]
+    assert report.op_classes == [
+        ProfileRow('branch', None, 7, 7, 7, 4),
+        ProfileRow('calc', None, 4, 4),
+        ProfileRow('io', None, 3, 3),
+    ]
+    assert report.labels == [
+        ProfileRow('LOOP', None, 13, 13, 7, 4),
+        ProfileRow('_start', None, 1, 1),
+    ]
+
+
+def test_fmt_report() -> None:
+    """Report should be formatted as tables, `top` limits the instructions shown (not widths)."""
+    assert fmt_report(_report(), top=2) == '''14 instructions executed, 14 ticks
+
+label       ticks      % executions taken%
+LOOP           13   92.9         13   57.1
+_start          1    7.1          1      -
+
+op class      ticks      % executions taken%
+branch            7   50.0          7   57.1
+calc              4   28.6          4      -
+io                3   21.4          3      -
+
+instruction                               ticks      % executions taken%
+   1 loop.dr:4 LOOP: BEQ %R1, %R0, 5          4   28.6          4   25.0
+   2 loop.dr:5 LOOP+1: OUT %R1                3   21.4          3      -'''
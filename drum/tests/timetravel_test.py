@@ -0,0 +1,66 @@
+import pytest
+
+from drum.compiler import compile
+from drum.machine.timetravel import TimeTravelDebugger, record
+
+# Stores & loads a word (2 ticks each), outputs it: ticks 1, 2, 4, 6, 7
+SOURCE = '''_start:
+    ADDI %R2, %R0, 20
+    ADDI %R1, %R0, 49
+    ST %R1, %R2
+    LD %R3, %R2
+    OUT %R3
+    HLT
+'''
+
+
+def _debugger() -> TimeTravelDebugger:
+    translation_result, error = compile.compile_source(SOURCE)
+    assert error is None
+    recording = record(translation_result.exe, interval=2)
+    assert (recording.result.instructions, recording.result.ticks) == (5, 7)
+    return TimeTravelDebugger(recording)
+
+
+@pytest.mark.parametrize('tick, counter, expected_tick', [
+    (0, 0, 0),
+    (3, 2, 2),
+    (4, 3, 4),
+    # in the middle of `LD`
+    (5, 3, 4),
+    (6, 4, 6),
+    (100, 5, 7),
+])
+def test_seek_tick(tick, counter, expected_tick) -> None:
+    """Seeking a tick should stop at the last instruction boundary at or before it."""
+    debugger = _debugger()
+    debugger.seek(5)
+    debugger.seek_tick(tick)
+
+    state = debugger.state()
+    assert (state.counter, state.tick) == (counter, expected_tick)
+
+
+def test_seek() -> None:
+    """Seeking back and forth should restore registers, memory & output."""
+    debugger = _debugger()
+
+    debugger.seek(4)
+    state = debugger.state()
+    assert (state.instruction_pointer, state.registers[1:4], state.memory.read(20)) == (
+        4,
+        [49, 20, 49],
+        49,
+    )
+    assert state.output == b''
+
+    debugger.step_back(2)
+    state = debugger.state()
+    assert (state.counter, state.registers[1:4], state.memory.read(20)) == (2, [49, 20, 0], 0)
+
+    debugger.step(10)
+    state = debugger.state()
+    assert (state.counter, state.tick, state.output) == (5, 7, b'1')
+
+    debugger.seek(-1)
+    assert (debugger.position(), debugger.state().registers[1:4]) == (0, [0, 0, 0])
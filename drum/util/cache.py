@@ -0,0 +1,101 @@
+import os
+from hashlib import sha256
+from tempfile import NamedTemporaryFile
+from typing import Optional
+
+# Environment variable that overrides the default cache directory
+CACHE_DIR_ENV = 'DRUM_CACHE_DIR'
+
+# Default size limit of a cache directory (bytes)
+DEFAULT_CACHE_SIZE = 64 * 1024 * 1024
+
+# Prefix of temporary files (they are never evicted)
+_TMP_PREFIX = '.'
+
+
+def default_cache_dir() -> str:
+    """Returns cache directory ($DRUM_CACHE_DIR or ~/.cache/drum)."""
+    cache_dir = os.environ.get(CACHE_DIR_ENV)
+    if cache_dir:
+        return cache_dir
+
+    xdg_cache_home = os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache')
+    return os.path.join(xdg_cache_home, 'drum')
+
+
+def hash_key(*parts: bytes) -> str:
+    """Returns a hex digest that identifies all the parts together."""
+    h = sha256()
+    for part in parts:
+        h.update(len(part).to_bytes(8, 'little'))
+        h.update(part)
+    return h.hexdigest()
+
+
+def read_cached(file: str) -> Optional[bytes]:
+    """
+    Reads cache entry. None if it doesn't exist.
+
+    Modification time of the entry is updated: it's the last use time for LRU eviction.
+    """
+    try:
+        with open(file, 'rb') as f:
+            data = f.read()
+    except OSError:
+        return None
+
+    try:
+        os.utime(file)
+    except OSError:
+        pass
+
+    return data
+
+
+def evict(directory: str, max_size: int) -> None:
+    """
+    Removes least recently used entries until the directory fits into `max_size` bytes.
+
+    Entries may be removed by other processes at the same time, such entries are skipped.
+    """
+    entries = []
+    with os.scandir(directory) as it:
+        for entry in it:
+            if entry.name.startswith(_TMP_PREFIX):
+                continue
+            try:
+                st = entry.stat()
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, entry.path))
+
+    total = sum(size for _, size, _ in entries)
+    entries.sort()
+    for _, size, path in entries:
+        if total <= max_size:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        total -= size
+
+
+def write_cached(file: str, data: bytes, max_size: Optional[int] = None) -> None:
+    """
+    Writes cache entry atomically.
+
+    Data is written into a temporary file in the same directory and then renamed,
+    so concurrent readers never see a partially written entry.
+    If `max_size` is provided, the directory is then shrunk to it (see `evict()`).
+    """
+    directory = os.path.dirname(file)
+    os.makedirs(directory, exist_ok=True)
+
+    with NamedTemporaryFile('wb', dir=directory, prefix=_TMP_PREFIX, delete=False) as f:
+        f.write(data)
+
+    os.replace(f.name, file)
+
+    if max_size is not None:
+        evict(directory, max_size)
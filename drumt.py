@@ -0,0 +1,6 @@
+#!/usr/bin/env python
+
+from drum.machine.trace_cli import cli
+
+if __name__ == '__main__':
+    cli()